@@ -12,6 +12,7 @@ from apps.core.views import (
     sales_offers_list_view,
     logout_view
 )
+from apps.newsletter.views import track_open, track_click
 
 urlpatterns = [
     # Admin panel
@@ -50,6 +51,10 @@ urlpatterns = [
 
     # docnum
     path('docnum/', include('apps.docnum.urls')),
+
+    # Śledzenie otwarć i kliknięć newsletterów (bez logowania)
+    path('track/open/<uuid:tracking_id>/', track_open, name='track_open'),
+    path('track/click/<uuid:tracking_id>/', track_click, name='track_click'),
 ]
 
 # Dodaj obsługę plików media w trybie deweloperskim
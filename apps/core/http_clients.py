@@ -0,0 +1,168 @@
+# apps/core/http_clients.py
+
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_breakers = {}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# VIES zwraca każdy błąd SOAP (także INVALID_INPUT) z kodem 500 - takich
+# odpowiedzi nie ponawiamy, a o awarii decyduje treść błędu (apps.core.vies)
+CLIENT_RETRY_STATUSES = {
+    'vies': (429, 502, 503, 504),
+}
+
+
+class CircuitOpenError(requests.RequestException):
+    """Zapytanie odrzucone bez wysyłania, bo bezpiecznik jest otwarty"""
+
+
+def get_session(name):
+    """
+    Zwraca współdzieloną sesję HTTP dla zewnętrznego API
+
+    Sesja utrzymuje połączenia (keep-alive) w puli o rozmiarze
+    ``HTTP_CLIENT_POOL_SIZE``, więc kolejne zapytania do MF / VIES nie
+    otwierają nowego połączenia TCP+TLS. Błędy połączenia i odpowiedzi
+    429/5xx (dla VIES bez 500) są ponawiane ``HTTP_CLIENT_RETRIES`` razy
+    z wykładniczo rosnącym odstępem (``HTTP_CLIENT_BACKOFF`` sekund * 2^n).
+
+    Args:
+        name (str): Nazwa klienta, np. ``mf`` lub ``vies``
+
+    Returns:
+        requests.Session: Sesja współdzielona przez wątki procesu
+    """
+    session = _sessions.get(name)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        if name not in _sessions:
+            retry = Retry(
+                total=getattr(settings, 'HTTP_CLIENT_RETRIES', 2),
+                backoff_factor=getattr(settings, 'HTTP_CLIENT_BACKOFF', 0.5),
+                status_forcelist=CLIENT_RETRY_STATUSES.get(name, RETRY_STATUSES),
+                # checkVat w VIES jest zapytaniem SOAP (POST), ale niczego nie zmienia
+                allowed_methods=frozenset({'GET', 'POST'}),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            pool_size = getattr(settings, 'HTTP_CLIENT_POOL_SIZE', 10)
+            adapter = HTTPAdapter(
+                pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[name] = session
+        return _sessions[name]
+
+
+class CircuitBreaker:
+    """
+    Bezpiecznik dla zawodnych usług zewnętrznych.
+
+    Po ``failure_threshold`` kolejnych błędach dla danego klucza (np. kraju
+    w VIES) zapytania są od razu odrzucane przez ``reset_seconds``, zamiast
+    czekać na timeout. Po tym czasie przepuszczane jest jedno zapytanie
+    próbne - sukces zamyka bezpiecznik, błąd otwiera go ponownie.
+    """
+
+    def __init__(self, name, failure_threshold=None, reset_seconds=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or getattr(
+            settings, 'CIRCUIT_BREAKER_FAILURES', 5)
+        self.reset_seconds = reset_seconds or getattr(
+            settings, 'CIRCUIT_BREAKER_RESET_SECONDS', 60)
+        self._lock = threading.Lock()
+        self._failures = {}
+        self._opened_at = {}
+
+    def allow(self, key):
+        """
+        Sprawdza, czy można wykonać zapytanie dla klucza
+
+        Returns:
+            bool: False, gdy bezpiecznik jest otwarty
+        """
+        with self._lock:
+            opened_at = self._opened_at.get(key)
+            if opened_at is None:
+                return True
+            if time.monotonic() - opened_at >= self.reset_seconds:
+                # Zapytanie próbne - kolejne czekają na jego wynik
+                self._opened_at[key] = time.monotonic()
+                return True
+            return False
+
+    def record_success(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
+            self._opened_at.pop(key, None)
+
+    def record_failure(self, key):
+        with self._lock:
+            failures = self._failures.get(key, 0) + 1
+            self._failures[key] = failures
+            if failures >= self.failure_threshold:
+                if key not in self._opened_at:
+                    logger.warning(
+                        f"Circuit breaker {self.name} opened for {key} after {failures} failures")
+                self._opened_at[key] = time.monotonic()
+
+
+def get_circuit_breaker(name):
+    """Zwraca bezpiecznik współdzielony przez wątki procesu dla danego API"""
+    with _sessions_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def request(name, method, url, breaker_key='default', record_status=True, **kwargs):
+    """
+    Wysyła zapytanie przez współdzieloną sesję z bezpiecznikiem
+
+    Błąd połączenia lub odpowiedź 5xx (po ponowieniach) liczy się jako
+    awaria klucza ``breaker_key`` - dla VIES jest to kraj, więc niedostępny
+    węzeł jednego państwa nie blokuje weryfikacji w pozostałych.
+
+    Args:
+        record_status (bool): False, gdy o awarii decyduje wywołujący na
+            podstawie treści odpowiedzi (``get_circuit_breaker(name)``);
+            błędy połączenia są liczone zawsze
+
+    Raises:
+        CircuitOpenError: Bezpiecznik dla klucza jest otwarty
+        requests.RequestException: Błąd komunikacji
+
+    Returns:
+        requests.Response: Odpowiedź API
+    """
+    breaker = get_circuit_breaker(name)
+    if not breaker.allow(breaker_key):
+        raise CircuitOpenError(f"{name} API for {breaker_key} is temporarily unavailable")
+
+    try:
+        response = get_session(name).request(method, url, **kwargs)
+    except requests.RequestException:
+        breaker.record_failure(breaker_key)
+        raise
+
+    if not record_status:
+        return response
+    if response.status_code >= 500:
+        breaker.record_failure(breaker_key)
+    else:
+        breaker.record_success(breaker_key)
+    return response
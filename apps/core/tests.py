@@ -1,3 +1,139 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from .http_clients import CircuitBreaker, CircuitOpenError, get_circuit_breaker, request
+
+
+class CircuitBreakerTestCase(SimpleTestCase):
+    def test_opens_per_key_and_resets(self):
+        breaker = CircuitBreaker('test', failure_threshold=2, reset_seconds=0.05)
+        breaker.record_failure('DE')
+        self.assertTrue(breaker.allow('DE'))
+        breaker.record_failure('DE')
+
+        # Otwarty tylko dla kraju z błędami
+        self.assertFalse(breaker.allow('DE'))
+        self.assertTrue(breaker.allow('FR'))
+
+        # Po czasie resetu jedno zapytanie próbne, sukces zamyka bezpiecznik
+        import time
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow('DE'))
+        self.assertFalse(breaker.allow('DE'))
+        breaker.record_success('DE')
+        self.assertTrue(breaker.allow('DE'))
+
+    def test_open_breaker_rejects_without_request(self):
+        breaker = get_circuit_breaker('test-closed-port')
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure('IT')
+        with self.assertRaises(CircuitOpenError):
+            request('test-closed-port', 'GET', 'http://127.0.0.1:9/', breaker_key='IT', timeout=1)
+
+
+class VIESClientTestCase(SimpleTestCase):
+    """Klient VIES sprawdzany na lokalnym serwerze zastępczym"""
+
+    RESPONSE = (
+        '<env:Envelope xmlns:env="http://schemas.xmlsoap.org/soap/envelope/">'
+        '<env:Body><ns2:checkVatApproxResponse xmlns:ns2="urn:ec.europa.eu:taxud:vies:services:checkVat:types">'
+        '<ns2:countryCode>{country}</ns2:countryCode><ns2:vatNumber>{number}</ns2:vatNumber>'
+        '<ns2:requestDate>2026-10-18+02:00</ns2:requestDate><ns2:valid>{valid}</ns2:valid>'
+        '<ns2:traderName>FIRMA GMBH</ns2:traderName>'
+        '<ns2:traderAddress>HAUPTSTR 5\n10115 BERLIN</ns2:traderAddress>'
+        '<ns2:requestIdentifier>WAPIAAAA{number}</ns2:requestIdentifier>'
+        '</ns2:checkVatApproxResponse></env:Body></env:Envelope>'
+    )
+    FAULT = (
+        '<env:Envelope xmlns:env="http://schemas.xmlsoap.org/soap/envelope/"><env:Body>'
+        '<env:Fault><faultcode>env:Server</faultcode><faultstring>{fault}</faultstring>'
+        '</env:Fault></env:Body></env:Envelope>'
+    )
+
+    def setUp(self):
+        import re
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from django.core.cache import cache
+
+        cache.clear()
+        self.requests = requests = []
+        test_case = self
+
+        class StubHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length'])).decode()
+                country = re.search(r'countryCode>(\w+)<', body).group(1)
+                number = re.search(r'vatNumber>(\w+)<', body).group(1)
+                requests.append((country, number))
+                status = 200
+                if number == '333':
+                    status, payload = 500, test_case.FAULT.format(fault='MS_UNAVAILABLE')
+                elif number == '444':
+                    status, payload = 500, test_case.FAULT.format(fault='INVALID_INPUT')
+                else:
+                    payload = test_case.RESPONSE.format(
+                        country=country, number=number, valid='true' if number == '111' else 'false')
+                payload = payload.encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/xml')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_parse_in_chunks(self):
+        from .vies import parse_check_vat_response
+        payload = self.RESPONSE.format(country='DE', number='111', valid='true').encode()
+        result = parse_check_vat_response(payload[i:i + 7] for i in range(0, len(payload), 7))
+        self.assertTrue(result['valid'])
+        self.assertEqual(result['name'], 'FIRMA GMBH')
+        self.assertEqual(result['consultation_number'], 'WAPIAAAA111')
+        self.assertEqual(result['request_date'], '2026-10-18+02:00')
+
+    def test_concurrent_checks(self):
+        from django.test import override_settings
+        from .vat_verification import VIES_INVALID_MESSAGE, VATVerificationService
+
+        url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        numbers = [('DE', '111'), ('FR', '222'), ('AT', '333')]
+        with override_settings(VIES_API_URL=url, HTTP_CLIENT_BACKOFF=0):
+            results = VATVerificationService.verify_eu_vats(numbers)
+            self.assertEqual(
+                VATVerificationService.verify_vat('DE', '111'), results[('DE', '111')])
+
+        success, data, message, consultation_number = results[('DE', '111')]
+        self.assertTrue(success)
+        self.assertEqual((data['city'], data['postal_code']), ('BERLIN', '10115'))
+        self.assertEqual(consultation_number, 'WAPIAAAA111')
+        self.assertEqual(results[('FR', '222')][2], VIES_INVALID_MESSAGE)
+        self.assertIn('MS_UNAVAILABLE', results[('AT', '333')][2])
+
+        # Wynik dla DE został wzięty z cache
+        self.assertEqual(self.requests.count(('DE', '111')), 1)
+
+    def test_only_service_faults_open_breaker(self):
+        from django.test import override_settings
+        from .vies import check_vat
+
+        url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        threshold = get_circuit_breaker('vies').failure_threshold
+        with override_settings(VIES_API_URL=url, HTTP_CLIENT_BACKOFF=0):
+            # Błąd po stronie zapytania nie otwiera bezpiecznika
+            for _ in range(threshold + 1):
+                self.assertEqual(check_vat('IE', '444')['fault'], 'INVALID_INPUT')
+
+            # Niedostępność państwa członkowskiego - tak, bez ponawiania 500
+            for _ in range(threshold):
+                self.assertEqual(check_vat('LU', '333')['fault'], 'MS_UNAVAILABLE')
+            with self.assertRaises(CircuitOpenError):
+                check_vat('LU', '333')
+
+        self.assertEqual(self.requests.count(('IE', '444')), threshold + 1)
+        self.assertEqual(self.requests.count(('LU', '333')), threshold)
@@ -9,3 +9,23 @@ def set_current_request(request):
 
 def get_current_request():
     return getattr(_thread_locals, 'request', None)
+
+
+def iter_pk_batches(queryset, batch_size=1000):
+    """
+    Zwraca kolejne paczki kluczy głównych z querysetu
+
+    Paczki są pobierane po kluczu (``pk > ostatni``), więc operacja masowa
+    na całym przefiltrowanym querysecie nie wczytuje wszystkich
+    identyfikatorów naraz, a zmiana wierszy w trakcie (np. usunięcie z grupy,
+    po której filtrujemy) nie powoduje pominięcia kolejnych paczek.
+    """
+    queryset = queryset.order_by('pk').values_list('pk', flat=True)
+    last_pk = None
+    while True:
+        batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        pks = list(batch[:batch_size])
+        if not pks:
+            return
+        yield pks
+        last_pk = pks[-1]
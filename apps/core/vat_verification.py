@@ -1,9 +1,13 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from apps.core import http_clients, vies
 from apps.core.validators import validate_nip
-import xml.etree.ElementTree as ET
-from io import StringIO
+import asyncio
 import logging
+import threading
+import time
 import requests
 
 logger = logging.getLogger(__name__)
@@ -15,6 +19,21 @@ EU_COUNTRY_CODES = [
     'PL', 'PT', 'RO', 'SK', 'SI', 'ES', 'SE'
 ]
 
+# Odpowiedzi "nie znaleziono" - są pewne, więc trafiają do cache (krócej)
+MF_NOT_FOUND_MESSAGE = "Nie znaleziono podmiotu o podanym numerze NIP."
+VIES_INVALID_MESSAGE = "Nieprawidłowy numer VAT."
+NOT_FOUND_MESSAGES = (MF_NOT_FOUND_MESSAGE, VIES_INVALID_MESSAGE)
+
+# Zapytania o ten sam numer wykonywane w tej chwili w tym procesie
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+class _InFlightLookup:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
 
 class VATVerificationService:
     """
@@ -35,6 +54,10 @@ class VATVerificationService:
     def verify_vat(country_code, vat_number):
         """
         Weryfikuje numer VAT w odpowiednim API i zwraca dane
+
+        Wyniki z API MF i VIES są brane z cache (``cached_lookup``), więc ten
+        sam numer sprawdzany w formularzu, przy weryfikacji i w API kosztuje
+        jedno zapytanie zewnętrzne dziennie.
         """
         api_type = VATVerificationService.get_verification_api(country_code)
         success = False
@@ -48,11 +71,13 @@ class VATVerificationService:
                 return False, None, api_type.get('message', "Brak dostępnego API do weryfikacji."), None
 
             elif api_type == 'poland_vat_api':
-                success, data, message, verification_id = VATVerificationService._verify_polish_vat(
-                    vat_number)
+                success, data, message, verification_id = VATVerificationService.cached_lookup(
+                    'mf', country_code, vat_number,
+                    lambda: VATVerificationService._verify_polish_vat(vat_number))
             elif api_type == 'vies_vat_api':
-                success, data, message, verification_id = VATVerificationService._verify_eu_vat(
-                    country_code, vat_number)
+                success, data, message, verification_id = VATVerificationService.cached_lookup(
+                    'vies', country_code, vat_number,
+                    lambda: VATVerificationService._verify_eu_vat(country_code, vat_number))
             else:
                 message = "Brak dostępnego API do weryfikacji numerów VAT."
                 return False, None, message, None
@@ -63,6 +88,108 @@ class VATVerificationService:
             logger.exception(f"Błąd podczas weryfikacji VAT: {str(e)}")
             return False, None, str(e), None
 
+    @staticmethod
+    def cache_key(source, country_code, vat_number):
+        """
+        Klucz cache wyniku weryfikacji: źródło, kraj, znormalizowany numer i data
+
+        Numer jest sprowadzany do wielkich liter i cyfr bez prefiksu kraju,
+        więc "PL 526-025-02-74" i "5260250274" mają ten sam klucz.
+        """
+        country_code = str(country_code).upper()
+        number = ''.join(c for c in str(vat_number) if c.isalnum()).upper()
+        if number.startswith(country_code):
+            number = number[len(country_code):]
+        return f"vat_verification:{source}:{country_code}:{number}:{timezone.now().strftime('%Y-%m-%d')}"
+
+    @staticmethod
+    def cached_lookup(source, country_code, vat_number, lookup, not_found_messages=NOT_FOUND_MESSAGES):
+        """
+        Wynik weryfikacji z cache lub z jednego zapytania do API
+
+        Wynik pozytywny jest trzymany przez ``VAT_VERIFICATION_CACHE_SECONDS``,
+        a odpowiedź "nie znaleziono" przez ``VAT_VERIFICATION_NEGATIVE_CACHE_SECONDS``.
+        Błędy komunikacji nie trafiają do cache. Równoczesne zapytania o ten
+        sam numer czekają na wynik zapytania już wykonywanego - w tym samym
+        procesie przez wspólny obiekt, między procesami przez blokadę w cache.
+
+        Args:
+            source (str): Nazwa API (część klucza cache), np. ``mf`` lub ``vies``
+            country_code (str): Kod kraju
+            vat_number (str): Numer VAT
+            lookup (callable): Zapytanie do API zwracające krotkę
+                (success, data, message, verification_id)
+            not_found_messages (tuple): Komunikaty oznaczające pewny brak podmiotu
+
+        Returns:
+            tuple: (success, data, message, verification_id)
+        """
+        cache_key = VATVerificationService.cache_key(source, country_code, vat_number)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return tuple(cached)
+
+        with _in_flight_lock:
+            in_flight = _in_flight.get(cache_key)
+            leader = in_flight is None
+            if leader:
+                in_flight = _in_flight[cache_key] = _InFlightLookup()
+
+        if not leader:
+            # Ten sam numer jest już sprawdzany w tym procesie
+            if in_flight.done.wait(VATVerificationService._lock_seconds()) and in_flight.result:
+                return in_flight.result
+            return VATVerificationService._locked_lookup(cache_key, lookup, not_found_messages)
+
+        try:
+            in_flight.result = VATVerificationService._locked_lookup(
+                cache_key, lookup, not_found_messages)
+            return in_flight.result
+        finally:
+            with _in_flight_lock:
+                _in_flight.pop(cache_key, None)
+            in_flight.done.set()
+
+    @staticmethod
+    def _lock_seconds():
+        return getattr(settings, 'VAT_VERIFICATION_LOCK_SECONDS', 20)
+
+    @staticmethod
+    def _locked_lookup(cache_key, lookup, not_found_messages):
+        """Zapytanie do API z blokadą w cache chroniącą przed równoległymi procesami"""
+        lock_key = f"{cache_key}:lock"
+        lock_seconds = VATVerificationService._lock_seconds()
+        if not cache.add(lock_key, 1, lock_seconds):
+            # Inny proces sprawdza ten numer - czekamy na jego wynik w cache
+            deadline = time.monotonic() + lock_seconds
+            while time.monotonic() < deadline:
+                time.sleep(0.2)
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    return tuple(cached)
+                if cache.get(lock_key) is None:
+                    break
+            cache.add(lock_key, 1, lock_seconds)
+
+        try:
+            result = tuple(lookup())
+            VATVerificationService._store(cache_key, result, not_found_messages)
+            return result
+        finally:
+            cache.delete(lock_key)
+
+    @staticmethod
+    def _store(cache_key, result, not_found_messages=NOT_FOUND_MESSAGES):
+        """Zapisuje w cache wynik pozytywny lub pewną odpowiedź 'nie znaleziono'"""
+        success, data, message, verification_id = result
+        if success and data:
+            timeout = getattr(settings, 'VAT_VERIFICATION_CACHE_SECONDS', 3600)
+        elif message in not_found_messages:
+            timeout = getattr(settings, 'VAT_VERIFICATION_NEGATIVE_CACHE_SECONDS', 300)
+        else:
+            return
+        cache.set(cache_key, list(result), timeout)
+
     @staticmethod
     def _verify_polish_vat(vat_number):
         """
@@ -75,74 +202,25 @@ class VATVerificationService:
             validate_nip(vat_number)
 
             # Wywołanie API Ministerstwa Finansów
-            url = f"https://wl-api.mf.gov.pl/api/search/nip/{vat_number}?date={timezone.now().strftime('%Y-%m-%d')}"
+            url = f"{VATVerificationService._mf_api_url()}/api/search/nip/{vat_number}?date={timezone.now().strftime('%Y-%m-%d')}"
             headers = {'Accept': 'application/json'}
 
-            response = requests.get(url, headers=headers, timeout=10)
+            response = http_clients.request(
+                'mf', 'GET', url, headers=headers, timeout=(3.05, 10))
 
             if response.status_code == 200:
                 data = response.json()
 
                 # Sprawdź czy podmiot istnieje
                 if not data.get('result', {}).get('subject'):
-                    return False, None, "Nie znaleziono podmiotu o podanym numerze NIP.", None
+                    return False, None, MF_NOT_FOUND_MESSAGE, None
 
                 subject = data.get('result', {}).get('subject', {})
 
                 # Pobieranie identyfikatora weryfikacji
                 verification_id = data.get('result', {}).get('requestId')
 
-                # Parsowanie adresu - w API MF adres jest pojedynczym stringiem
-                working_address = subject.get('workingAddress', '')
-
-                # Próba rozparsowania adresu
-                city = ''
-                street_name = ''
-                building_number = ''
-                postal_code = ''
-
-                # Typowy format: "ULICA NUMER, KOD MIASTO"
-                if working_address:
-                    try:
-                        address_parts = working_address.split(',')
-
-                        # Część z ulicą i numerem
-                        if len(address_parts) > 0:
-                            street_parts = address_parts[0].strip().split(' ')
-                            if len(street_parts) > 1:
-                                # Ostatni element to numer
-                                building_number = street_parts[-1]
-                                # Reszta to nazwa ulicy
-                                street_name = ' '.join(street_parts[:-1])
-                            else:
-                                street_name = address_parts[0].strip()
-
-                        # Część z kodem i miastem
-                        if len(address_parts) > 1:
-                            city_parts = address_parts[1].strip().split(' ')
-                            if len(city_parts) > 1:
-                                # Pierwszy element to kod pocztowy
-                                postal_code = city_parts[0]
-                                # Reszta to nazwa miasta
-                                city = ' '.join(city_parts[1:])
-                    except Exception as e:
-                        print(f"Błąd parsowania adresu: {str(e)}")
-
-                # Pobieranie danych firmy
-                partner_data = {
-                    'name': subject.get('name', ''),
-                    'city': city,
-                    'street_name': street_name,
-                    'building_number': building_number,
-                    'postal_code': postal_code,
-                }
-
-                # Formatowanie danych - bez warunku 'if success and data', bo success nie jest zdefiniowane
-                for field in ['name', 'city', 'street_name']:
-                    if field in partner_data and partner_data[field]:
-                        # Konwersja na title case (pierwszy znak każdego słowa wielki)
-                        partner_data[field] = partner_data[field].lower(
-                        ).capitalize()
+                partner_data = VATVerificationService._parse_mf_subject(subject)
 
                 return True, partner_data, "Numer VAT został zweryfikowany pomyślnie.", verification_id
             else:
@@ -156,129 +234,272 @@ class VATVerificationService:
             print(f"Niespodziewany błąd: {str(e)}")
             return False, None, str(e), None
 
+    @staticmethod
+    def _mf_api_url():
+        """Adres API Wykazu Podatników VAT (do testów można wskazać lokalny serwer)"""
+        return getattr(settings, 'MF_WHITELIST_API_URL', 'https://wl-api.mf.gov.pl').rstrip('/')
+
+    @staticmethod
+    def _parse_mf_subject(subject):
+        """
+        Przekształca podmiot z odpowiedzi API MF na dane kontrahenta
+        """
+        # Parsowanie adresu - w API MF adres jest pojedynczym stringiem
+        working_address = subject.get('workingAddress', '')
+
+        # Próba rozparsowania adresu
+        city = ''
+        street_name = ''
+        building_number = ''
+        postal_code = ''
+
+        # Typowy format: "ULICA NUMER, KOD MIASTO"
+        if working_address:
+            try:
+                address_parts = working_address.split(',')
+
+                # Część z ulicą i numerem
+                if len(address_parts) > 0:
+                    street_parts = address_parts[0].strip().split(' ')
+                    if len(street_parts) > 1:
+                        # Ostatni element to numer
+                        building_number = street_parts[-1]
+                        # Reszta to nazwa ulicy
+                        street_name = ' '.join(street_parts[:-1])
+                    else:
+                        street_name = address_parts[0].strip()
+
+                # Część z kodem i miastem
+                if len(address_parts) > 1:
+                    city_parts = address_parts[1].strip().split(' ')
+                    if len(city_parts) > 1:
+                        # Pierwszy element to kod pocztowy
+                        postal_code = city_parts[0]
+                        # Reszta to nazwa miasta
+                        city = ' '.join(city_parts[1:])
+            except Exception as e:
+                print(f"Błąd parsowania adresu: {str(e)}")
+
+        # Pobieranie danych firmy
+        partner_data = {
+            'name': subject.get('name', ''),
+            'city': city,
+            'street_name': street_name,
+            'building_number': building_number,
+            'postal_code': postal_code,
+        }
+
+        # Formatowanie danych
+        for field in ['name', 'city', 'street_name']:
+            if field in partner_data and partner_data[field]:
+                # Konwersja na title case (pierwszy znak każdego słowa wielki)
+                partner_data[field] = partner_data[field].lower(
+                ).capitalize()
+
+        return partner_data
+
+    @staticmethod
+    def verify_polish_vats(vat_numbers):
+        """
+        Weryfikacja wielu polskich numerów NIP zapytaniami zbiorczymi
+
+        Numery nieobecne w cache są grupowane po ``MF_NIPS_PER_REQUEST``
+        (limit API: 30) w zapytania ``/api/search/nips/{nip1},{nip2},...``,
+        więc jedno zapytanie zużywa jedno wywołanie z dziennego limitu
+        zamiast trzydziestu. Pojedyncze zapytanie ``/search/nip/`` jest wykonywane
+        tylko dla numerów, których zapytanie zbiorcze nie obsłużyło
+        (błąd komunikacji, kod odpowiedzi inny niż 200, błąd dla pozycji).
+
+        Args:
+            vat_numbers (iterable): Numery NIP (mogą zawierać znaki formatujące)
+
+        Returns:
+            dict: Numer NIP w postaci przekazanej -> krotka
+                (success, data, message, verification_id) jak w ``verify_vat``
+        """
+        results = {}
+        by_nip = {}
+        for vat_number in vat_numbers:
+            nip = ''.join(c for c in vat_number if c.isdigit())
+            try:
+                validate_nip(nip)
+            except ValidationError as e:
+                results[vat_number] = (False, None, str(e), None)
+                continue
+            by_nip.setdefault(nip, []).append(vat_number)
+
+        # Numery sprawdzone dziś wcześniej są brane z cache
+        cache_keys = {
+            nip: VATVerificationService.cache_key('mf', 'PL', nip) for nip in by_nip}
+        cached = cache.get_many(list(cache_keys.values()))
+        nips = []
+        for nip, cache_key in cache_keys.items():
+            if cache_key in cached:
+                for vat_number in by_nip[nip]:
+                    results[vat_number] = tuple(cached[cache_key])
+            else:
+                nips.append(nip)
+
+        chunk_size = getattr(settings, 'MF_NIPS_PER_REQUEST', 30)
+        fallback = []
+        for start in range(0, len(nips), chunk_size):
+            chunk = nips[start:start + chunk_size]
+            chunk_results = VATVerificationService._search_nips(chunk)
+            for nip in chunk:
+                if nip in chunk_results:
+                    VATVerificationService._store(cache_keys[nip], chunk_results[nip])
+                    for vat_number in by_nip[nip]:
+                        results[vat_number] = chunk_results[nip]
+                else:
+                    fallback.append(nip)
+
+        if fallback:
+            logger.info(f"MF bulk lookup fallback to single requests for {len(fallback)} NIPs")
+        for nip in fallback:
+            result = VATVerificationService.cached_lookup(
+                'mf', 'PL', nip, lambda: VATVerificationService._verify_polish_vat(nip))
+            for vat_number in by_nip[nip]:
+                results[vat_number] = result
+
+        return results
+
+    @staticmethod
+    def _search_nips(nips):
+        """
+        Jedno zapytanie zbiorcze ``/api/search/nips/`` do API MF
+
+        Returns:
+            dict: NIP -> wynik weryfikacji; NIP-y bez wyniku (błąd zapytania
+                lub pozycji) są pomijane i sprawdzane pojedynczo
+        """
+        url = (f"{VATVerificationService._mf_api_url()}/api/search/nips/{','.join(nips)}"
+               f"?date={timezone.now().strftime('%Y-%m-%d')}")
+        try:
+            response = http_clients.request(
+                'mf', 'GET', url, headers={'Accept': 'application/json'}, timeout=(3.05, 10))
+            if response.status_code != 200:
+                logger.warning(
+                    f"MF bulk lookup failed for {len(nips)} NIPs: status {response.status_code}")
+                return {}
+            result = response.json().get('result') or {}
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"MF bulk lookup failed for {len(nips)} NIPs: {str(e)}")
+            return {}
+
+        verification_id = result.get('requestId')
+        results = {}
+        for entry in result.get('entries') or []:
+            nip = entry.get('identifier')
+            if nip not in nips or entry.get('error'):
+                continue
+            subjects = entry.get('subjects') or []
+            if subjects:
+                results[nip] = (
+                    True, VATVerificationService._parse_mf_subject(subjects[0]),
+                    "Numer VAT został zweryfikowany pomyślnie.", verification_id)
+            else:
+                results[nip] = (False, None, MF_NOT_FOUND_MESSAGE, None)
+        return results
+
     @staticmethod
     def _verify_eu_vat(country_code, vat_number):
         """
         Weryfikacja numeru VAT w API VIES (dla krajów UE)
         """
         try:
-            # Wywołanie API VIES
-            url = "https://ec.europa.eu/taxation_customs/vies/services/checkVatService"
-            headers = {'Content-Type': 'text/xml;charset=UTF-8'}
-
-            # Przygotowanie zapytania SOAP z poprawnym namespace
-            data = f"""
-            <soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" 
-                        xmlns:urn="urn:ec.europa.eu:taxud:vies:services:checkVat:types">
-                <soapenv:Header/>
-                <soapenv:Body>
-                    <urn:checkVat>
-                        <urn:countryCode>{country_code}</urn:countryCode>
-                        <urn:vatNumber>{vat_number}</urn:vatNumber>
-                    </urn:checkVat>
-                </soapenv:Body>
-            </soapenv:Envelope>
-            """
-
-            # Dodaj logowanie do debugowania
-            print(f"Wysyłanie zapytania VIES: {url}")
-            print(f"Treść zapytania: {data[:200]}...")
-
-            response = requests.post(
-                url, headers=headers, data=data, timeout=15)
-
-            # Logowanie odpowiedzi
-            print(f"Odpowiedź API (status: {response.status_code})")
-            print(f"Nagłówki odpowiedzi: {response.headers}")
-            print(f"Treść odpowiedzi: {response.text[:300]}...")
-
-            if response.status_code == 200:
-                print(f"Pełna odpowiedź API VIES: {response.text}")
-                # Sprawdzenie czy numer VAT jest poprawny - bardziej elastyczny warunek
-                valid_patterns = [
-                    "valid>true<", "<valid>true</valid>", "<ns2:valid>true</ns2:valid>"]
-                is_valid = any(
-                    pattern in response.text for pattern in valid_patterns)
-
-                if is_valid:
-
-                    # Sprawdzenie czy numer VAT jest poprawny
-                    if "valid>true<" in response.text:
-                        # Parsowanie XML
-                        try:
-                            # Usuwanie namespace dla łatwiejszego parsowania
-                            xml_text = response.text.replace('soap:', '')
-
-                            # Parsowanie XML
-                            from xml.etree import ElementTree as ET
-                            root = ET.fromstring(xml_text)
-
-                            # Wyciąganie danych
-                            name = ''
-                            address = ''
-                            verification_id = None
-
-                            for elem in root.iter():
-                                if 'name' in elem.tag.lower():
-                                    name = elem.text.strip() if elem.text else ''
-                                elif 'address' in elem.tag.lower():
-                                    address = elem.text.strip() if elem.text else ''
-                                elif 'requestIdentifier' in elem.tag.lower():
-                                    verification_id = elem.text.strip() if elem.text else ''
-
-                            # Podział adresu na części
-                            city = ''
-                            street = ''
-                            building_number = ''
-                            postal_code = ''
-
-                            if address:
-                                address_parts = address.split('\n')
-                                if len(address_parts) >= 1:
-                                    street = address_parts[0]
-                                    # Próba pobrania numeru budynku z nazwy ulicy
-                                    street_parts = street.split(' ')
-                                    if len(street_parts) > 1 and any(char.isdigit() for char in street_parts[-1]):
-                                        building_number = street_parts[-1]
-                                        street = ' '.join(street_parts[:-1])
-
-                                if len(address_parts) >= 2:
-                                    city_line = address_parts[1]
-                                    city_parts = city_line.split(' ')
-                                    if len(city_parts) >= 2:
-                                        # Sprawdź, czy pierwszy element wygląda jak kod pocztowy
-                                        if any(char.isdigit() for char in city_parts[0]):
-                                            postal_code = city_parts[0]
-                                            city = ' '.join(city_parts[1:])
-                                        else:
-                                            city = city_line
-
-                            # Pobieranie danych firmy
-                            partner_data = {
-                                'name': name,
-                                'city': city,
-                                'street_name': street,
-                                'building_number': building_number,
-                                'postal_code': postal_code,
-                                'apartment_number': '',  # Dodaj puste pole dla apartamentu
-                            }
-
-                            print(
-                                f"Przetworzone dane partnera: {partner_data}")
-
-                            return True, partner_data, "Numer VAT został zweryfikowany pomyślnie.", verification_id
-
-                        except Exception as parse_error:
-                            print(
-                                f"Błąd podczas parsowania XML: {str(parse_error)}")
-                            return False, None, f"Błąd podczas przetwarzania odpowiedzi XML: {str(parse_error)}", None
-                    else:
-                        return False, None, "Nieprawidłowy numer VAT.", None
-                else:
-                    return False, None, f"Nie udało się zweryfikować numeru VAT. Kod odpowiedzi: {response.status_code}", None
+            result = vies.check_vat(country_code, vat_number)
         except requests.RequestException as e:
-            print(f"Błąd zapytania HTTP: {str(e)}")
+            logger.warning(f"Błąd zapytania VIES: {str(e)}")
             return False, None, f"Błąd komunikacji z API VIES: {str(e)}", None
-        except Exception as e:
-            print(f"Niespodziewany błąd: {str(e)}")
-            return False, None, f"Błąd podczas przetwarzania odpowiedzi: {str(e)}", None
+        return VATVerificationService._vies_result(result)
+
+    @staticmethod
+    def verify_eu_vats(numbers):
+        """
+        Weryfikacja wielu numerów VAT w VIES współbieżnie
+
+        Numery nieobecne w cache są sprawdzane asynchronicznym klientem
+        ``VIESClient`` z jednej pętli zdarzeń (do ``VIES_CONCURRENCY``
+        zapytań naraz), a wyniki trafiają do cache jak w ``verify_vat``.
+        Wywoływane z kodu synchronicznego (np. komend zarządzających).
+
+        Args:
+            numbers (iterable): Pary (kod kraju, numer VAT)
+
+        Returns:
+            dict: (kod kraju, numer VAT) -> krotka
+                (success, data, message, verification_id) jak w ``verify_vat``
+        """
+        numbers = list(dict.fromkeys(numbers))
+        cache_keys = {
+            number: VATVerificationService.cache_key('vies', *number) for number in numbers}
+        cached = cache.get_many(list(cache_keys.values()))
+        results = {
+            number: tuple(cached[cache_key])
+            for number, cache_key in cache_keys.items() if cache_key in cached}
+        missing = [number for number in numbers if number not in results]
+        if not missing:
+            return results
+
+        async def check_all():
+            async with vies.VIESClient() as client:
+                return await client.check_many(missing)
+
+        for number, result in zip(missing, asyncio.run(check_all())):
+            results[number] = VATVerificationService._vies_result(result)
+            VATVerificationService._store(cache_keys[number], results[number])
+        return results
+
+    @staticmethod
+    def _vies_result(result):
+        """
+        Przekształca wynik z ``apps.core.vies`` na krotkę jak w ``verify_vat``
+        """
+        if result['fault']:
+            return False, None, f"Błąd komunikacji z API VIES: {result['fault']}", None
+        if not result['valid']:
+            return False, None, VIES_INVALID_MESSAGE, None
+
+        partner_data = VATVerificationService._parse_vies_address(result['address'])
+        partner_data['name'] = result['name']
+        return (True, partner_data, "Numer VAT został zweryfikowany pomyślnie.",
+                result['consultation_number'] or None)
+
+    @staticmethod
+    def _parse_vies_address(address):
+        """
+        Dzieli adres z VIES ("ULICA NUMER\nKOD MIASTO") na pola kontrahenta
+        """
+        city = ''
+        street = ''
+        building_number = ''
+        postal_code = ''
+
+        if address:
+            address_parts = address.split('\n')
+            if len(address_parts) >= 1:
+                street = address_parts[0]
+                # Próba pobrania numeru budynku z nazwy ulicy
+                street_parts = street.split(' ')
+                if len(street_parts) > 1 and any(char.isdigit() for char in street_parts[-1]):
+                    building_number = street_parts[-1]
+                    street = ' '.join(street_parts[:-1])
+
+            if len(address_parts) >= 2:
+                city_line = address_parts[1]
+                city_parts = city_line.split(' ')
+                if len(city_parts) >= 2:
+                    # Sprawdź, czy pierwszy element wygląda jak kod pocztowy
+                    if any(char.isdigit() for char in city_parts[0]):
+                        postal_code = city_parts[0]
+                        city = ' '.join(city_parts[1:])
+                    else:
+                        city = city_line
+
+        return {
+            'city': city,
+            'street_name': street,
+            'building_number': building_number,
+            'postal_code': postal_code,
+            'apartment_number': '',  # Dodaj puste pole dla apartamentu
+        }
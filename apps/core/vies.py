@@ -0,0 +1,245 @@
+# apps/core/vies.py
+
+import asyncio
+import logging
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape
+
+import requests
+from django.conf import settings
+
+from apps.core import http_clients
+
+logger = logging.getLogger(__name__)
+
+SOAP_NS = 'http://schemas.xmlsoap.org/soap/envelope/'
+TYPES_NS = 'urn:ec.europa.eu:taxud:vies:services:checkVat:types'
+
+# Gotowe koperty SOAP - wstawiane są tylko (escapowane) wartości
+CHECK_VAT_ENVELOPE = (
+    f'<soapenv:Envelope xmlns:soapenv="{SOAP_NS}" xmlns:urn="{TYPES_NS}">'
+    '<soapenv:Header/><soapenv:Body><urn:checkVat>'
+    '<urn:countryCode>{country_code}</urn:countryCode>'
+    '<urn:vatNumber>{vat_number}</urn:vatNumber>'
+    '</urn:checkVat></soapenv:Body></soapenv:Envelope>'
+)
+
+# checkVatApprox zwraca numer konsultacji (requestIdentifier), gdy podano
+# numer VAT pytającego (VIES_REQUESTER_COUNTRY / VIES_REQUESTER_VAT)
+CHECK_VAT_APPROX_ENVELOPE = (
+    f'<soapenv:Envelope xmlns:soapenv="{SOAP_NS}" xmlns:urn="{TYPES_NS}">'
+    '<soapenv:Header/><soapenv:Body><urn:checkVatApprox>'
+    '<urn:countryCode>{country_code}</urn:countryCode>'
+    '<urn:vatNumber>{vat_number}</urn:vatNumber>'
+    '<urn:requesterCountryCode>{requester_country}</urn:requesterCountryCode>'
+    '<urn:requesterVatNumber>{requester_vat}</urn:requesterVatNumber>'
+    '</urn:checkVatApprox></soapenv:Body></soapenv:Envelope>'
+)
+
+# Element odpowiedzi -> klucz wyniku (checkVat i checkVatApprox)
+RESPONSE_FIELDS = {
+    f'{{{TYPES_NS}}}countryCode': 'country_code',
+    f'{{{TYPES_NS}}}vatNumber': 'vat_number',
+    f'{{{TYPES_NS}}}requestDate': 'request_date',
+    f'{{{TYPES_NS}}}valid': 'valid',
+    f'{{{TYPES_NS}}}name': 'name',
+    f'{{{TYPES_NS}}}traderName': 'name',
+    f'{{{TYPES_NS}}}address': 'address',
+    f'{{{TYPES_NS}}}traderAddress': 'address',
+    f'{{{TYPES_NS}}}requestIdentifier': 'consultation_number',
+    'faultstring': 'fault',
+}
+
+# Błędy SOAP oznaczające niedostępność usługi - liczone przez bezpiecznik.
+# Pozostałe (np. INVALID_INPUT) wynikają z zapytania i nie świadczą o awarii.
+UNAVAILABLE_FAULTS = frozenset({
+    'MS_UNAVAILABLE', 'MS_MAX_CONCURRENT_REQ', 'SERVER_BUSY', 'TIMEOUT', 'SERVICE_UNAVAILABLE',
+})
+
+
+def get_vies_url():
+    return getattr(
+        settings, 'VIES_API_URL',
+        'https://ec.europa.eu/taxation_customs/vies/services/checkVatService')
+
+
+def build_envelope(country_code, vat_number):
+    """
+    Składa kopertę SOAP zapytania o numer VAT
+
+    Returns:
+        bytes: Treść zapytania w UTF-8
+    """
+    values = {'country_code': escape(country_code), 'vat_number': escape(vat_number)}
+    requester_country = getattr(settings, 'VIES_REQUESTER_COUNTRY', '')
+    requester_vat = getattr(settings, 'VIES_REQUESTER_VAT', '')
+    if requester_country and requester_vat:
+        envelope = CHECK_VAT_APPROX_ENVELOPE.format(
+            requester_country=escape(requester_country),
+            requester_vat=escape(requester_vat), **values)
+    else:
+        envelope = CHECK_VAT_ENVELOPE.format(**values)
+    return envelope.encode('utf-8')
+
+
+def empty_result(country_code='', vat_number=''):
+    return {
+        'country_code': country_code, 'vat_number': vat_number, 'valid': None,
+        'name': '', 'address': '', 'request_date': '', 'consultation_number': '', 'fault': '',
+    }
+
+
+def parse_check_vat_response(chunks):
+    """
+    Parsuje odpowiedź VIES strumieniowo, z uwzględnieniem przestrzeni nazw
+
+    Elementy są odczytywane po kolei w miarę napływu danych i od razu
+    zwalniane, a pola są rozpoznawane po pełnej nazwie z przestrzenią nazw
+    (niezależnie od użytego w odpowiedzi prefiksu).
+
+    Args:
+        chunks (iterable): Kolejne fragmenty odpowiedzi (bytes)
+
+    Returns:
+        dict: ``country_code``, ``vat_number``, ``valid`` (bool lub None przy
+            błędzie), ``name``, ``address``, ``request_date``,
+            ``consultation_number`` i ``fault`` (komunikat błędu SOAP)
+    """
+    result = empty_result()
+    parser = ET.XMLPullParser(events=('end',))
+
+    def read_events():
+        for _, elem in parser.read_events():
+            key = RESPONSE_FIELDS.get(elem.tag)
+            if key:
+                text = (elem.text or '').strip()
+                # VIES zwraca "---", gdy państwo nie udostępnia danej
+                result[key] = '' if text == '---' else text
+            elem.clear()
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        read_events()
+    parser.close()
+    read_events()
+
+    result['valid'] = (result['valid'] == 'true') if result['valid'] else None
+    if result['fault']:
+        result['valid'] = None
+    return result
+
+
+def check_vat(country_code, vat_number):
+    """
+    Sprawdza numer VAT w VIES (synchronicznie)
+
+    Zapytanie idzie przez współdzieloną sesję ``vies`` z ponowieniami
+    i bezpiecznikiem per kraj (``apps.core.http_clients``). Awarię kraju
+    oznaczają tylko błędy z ``UNAVAILABLE_FAULTS`` oraz odpowiedzi 5xx
+    bez koperty SOAP (np. z bramy HTTP).
+
+    Raises:
+        requests.RequestException: Błąd komunikacji lub otwarty bezpiecznik
+
+    Returns:
+        dict: Wynik jak w ``parse_check_vat_response``
+    """
+    response = http_clients.request(
+        'vies', 'POST', get_vies_url(), breaker_key=country_code,
+        headers={'Content-Type': 'text/xml;charset=UTF-8'},
+        data=build_envelope(country_code, vat_number),
+        timeout=(3.05, 15), stream=True, record_status=False)
+    try:
+        result = parse_check_vat_response(response.iter_content(chunk_size=4096))
+        soap_fault = result['fault']
+    except ET.ParseError as e:
+        result = empty_result()
+        result['fault'] = f"HTTP {response.status_code}: {str(e)}"
+        soap_fault = ''
+    finally:
+        response.close()
+
+    breaker = http_clients.get_circuit_breaker('vies')
+    if soap_fault:
+        if soap_fault in UNAVAILABLE_FAULTS:
+            breaker.record_failure(country_code)
+        else:
+            breaker.record_success(country_code)
+    elif response.status_code >= 500:
+        breaker.record_failure(country_code)
+    else:
+        breaker.record_success(country_code)
+
+    if response.status_code != 200 and not result['fault']:
+        result['fault'] = f"HTTP {response.status_code}"
+    result['country_code'] = result['country_code'] or country_code
+    result['vat_number'] = result['vat_number'] or vat_number
+    return result
+
+
+class VIESClient:
+    """
+    Asynchroniczny klient VIES do sprawdzania wielu numerów naraz.
+
+    Korutyny ``check`` mogą być uruchamiane setkami z jednej pętli
+    zdarzeń; liczba zapytań wykonywanych jednocześnie jest ograniczona
+    do ``concurrency`` (VIES odrzuca nadmiar jako MS_MAX_CONCURRENT_REQ).
+    Zapytania korzystają z puli połączeń współdzielonej sesji HTTP.
+
+    Przykład::
+
+        async with VIESClient() as client:
+            results = await client.check_many([('DE', '123456789'), ('FR', '...')])
+    """
+
+    def __init__(self, concurrency=None):
+        self.concurrency = concurrency or getattr(settings, 'VIES_CONCURRENCY', 10)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix='vies')
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    async def check(self, country_code, vat_number):
+        """
+        Sprawdza jeden numer VAT
+
+        Błąd komunikacji nie przerywa pozostałych sprawdzeń - trafia do
+        pola ``fault`` wyniku.
+
+        Returns:
+            dict: Wynik jak w ``check_vat``
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(
+                    self._executor, check_vat, country_code, vat_number)
+            except requests.RequestException as e:
+                logger.warning(f"VIES check failed for {country_code}{vat_number}: {str(e)}")
+                result = empty_result(country_code, vat_number)
+                result['fault'] = str(e)
+                return result
+
+    async def check_many(self, numbers):
+        """
+        Sprawdza wiele numerów VAT współbieżnie
+
+        Args:
+            numbers (iterable): Pary (kod kraju, numer VAT)
+
+        Returns:
+            list: Wyniki w kolejności podanych numerów
+        """
+        return await asyncio.gather(
+            *(self.check(country_code, vat_number) for country_code, vat_number in numbers))
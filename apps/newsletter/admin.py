@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Newsletter, NewsletterTemplate, NewsletterTracking
+from .models import Newsletter, NewsletterDelivery, NewsletterTemplate, NewsletterTracking
 
 
 @admin.register(NewsletterTemplate)
@@ -61,3 +61,13 @@ class NewsletterTrackingAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         })
     )
+
+
+@admin.register(NewsletterDelivery)
+class NewsletterDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('newsletter', 'email', 'status',
+                    'attempts', 'worker_id', 'sent_at')
+    list_filter = ('status', 'newsletter')
+    search_fields = ('email', 'newsletter__subject', 'worker_id')
+    readonly_fields = ('tracking_id', 'claimed_at', 'sent_at', 'created_at')
+    raw_id_fields = ('newsletter', 'subscriber')
@@ -0,0 +1,28 @@
+# apps/newsletter/management/commands/archive_newsletter_tracking.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.newsletter.tracking import archive_tracking_events
+
+
+class Command(BaseCommand):
+    help = "Przenosi stare zdarzenia śledzenia newsletterów do tabeli archiwum"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            default=getattr(settings, 'NEWSLETTER_TRACKING_RETENTION_DAYS', 180),
+            help="Zdarzenia starsze niż podana liczba dni trafiają do archiwum")
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help="Liczba zdarzeń przenoszonych w jednej transakcji")
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        archived = archive_tracking_events(before, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archived} tracking events older than {before:%Y-%m-%d}"))
@@ -0,0 +1,56 @@
+# apps/newsletter/management/commands/dispatch_scheduled_newsletters.py
+
+import logging
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from apps.newsletter.services import NewsletterDeliveryService
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Uruchamia wysyłkę zaplanowanych newsletterów w wyznaczonym terminie"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=getattr(settings, 'NEWSLETTER_SCHEDULER_POLL_SECONDS', 5.0),
+            help="Odstęp (w sekundach) między sprawdzeniami zaplanowanych newsletterów")
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Uruchom zaległe newslettery i zakończ działanie")
+
+    def handle(self, *args, **options):
+        self.stop_event = threading.Event()
+        signal.signal(signal.SIGINT, self._handle_signal)
+        signal.signal(signal.SIGTERM, self._handle_signal)
+
+        self.stdout.write("Scheduled newsletter dispatcher started")
+        total = 0
+        while not self.stop_event.is_set():
+            close_old_connections()
+            try:
+                dispatched = NewsletterDeliveryService.dispatch_scheduled()
+            except Exception as e:
+                logger.error(f"Scheduled newsletter dispatch failed: {str(e)}", exc_info=True)
+                dispatched = 0
+
+            if dispatched:
+                total += dispatched
+                self.stdout.write(f"Dispatched {dispatched} scheduled newsletters")
+            if options['once']:
+                break
+            self.stop_event.wait(options['poll_interval'])
+
+        connection.close()
+        self.stdout.write(self.style.SUCCESS(
+            f"Scheduled newsletter dispatcher stopped, {total} newsletters dispatched"))
+
+    def _handle_signal(self, signum, frame):
+        self.stdout.write("Stopping scheduled newsletter dispatcher...")
+        self.stop_event.set()
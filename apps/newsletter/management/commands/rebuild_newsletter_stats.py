@@ -0,0 +1,30 @@
+# apps/newsletter/management/commands/rebuild_newsletter_stats.py
+
+from django.core.management.base import BaseCommand
+
+from apps.newsletter.models import Newsletter
+from apps.newsletter.tracking import rebuild_newsletter_stats
+
+
+class Command(BaseCommand):
+    help = "Przelicza zagregowane statystyki newsletterów z tabeli zdarzeń śledzenia"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'slugs', nargs='*',
+            help="Slugi newsletterów do przeliczenia (domyślnie wszystkie wysłane)")
+
+    def handle(self, *args, **options):
+        newsletters = Newsletter.objects.all()
+        if options['slugs']:
+            newsletters = newsletters.filter(slug__in=options['slugs'])
+        else:
+            newsletters = newsletters.filter(status__in=['sending', 'sent'])
+
+        count = 0
+        for newsletter in newsletters.iterator():
+            rebuild_newsletter_stats(newsletter)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt statistics for {count} newsletters"))
@@ -0,0 +1,139 @@
+# apps/newsletter/management/commands/send_newsletters.py
+
+import logging
+import os
+import signal
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from apps.newsletter.services import (
+    DeliveryThrottle, MailConnectionPool, NewsletterDeliveryService, TrackingBuffer
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Przetwarza kolejkę wysyłki newsletterów pulą workerów"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int,
+            default=getattr(settings, 'NEWSLETTER_DELIVERY_WORKERS', 4),
+            help="Liczba równoległych workerów wysyłki")
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=NewsletterDeliveryService.get_batch_size(),
+            help="Liczba wiadomości rezerwowanych przez workera w jednej paczce")
+        parser.add_argument(
+            '--connections', type=int,
+            default=getattr(settings, 'NEWSLETTER_SMTP_CONNECTIONS', None),
+            help="Liczba połączeń z serwerem pocztowym (domyślnie jedno na workera)")
+        parser.add_argument(
+            '--tracking-flush-size', type=int,
+            default=getattr(settings, 'NEWSLETTER_TRACKING_FLUSH_SIZE', 500),
+            help="Liczba wierszy trackingu zapisywanych jednym zapytaniem")
+        parser.add_argument(
+            '--rate', type=float,
+            default=getattr(settings, 'NEWSLETTER_GLOBAL_RATE', None),
+            help="Łączny limit wiadomości na sekundę (limity domen: NEWSLETTER_DOMAIN_RATES)")
+        parser.add_argument(
+            '--poll-interval', type=float, default=5.0,
+            help="Czas oczekiwania (w sekundach) gdy kolejka jest pusta")
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Przetwórz bieżącą kolejkę i zakończ działanie")
+
+    def handle(self, *args, **options):
+        self.stop_event = threading.Event()
+        signal.signal(signal.SIGINT, self._handle_signal)
+        signal.signal(signal.SIGTERM, self._handle_signal)
+
+        # Odzyskaj wiersze porzucone przez poprzednie uruchomienia
+        NewsletterDeliveryService.recover_stale()
+        NewsletterDeliveryService.finalize_newsletters()
+
+        worker_count = max(1, options['workers'])
+        self.connection_pool = MailConnectionPool(
+            size=options['connections'] or worker_count)
+
+        self.throttle = DeliveryThrottle(global_rate=options['rate'])
+
+        worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        workers = [
+            threading.Thread(
+                target=self._run_worker,
+                args=(f"{worker_prefix}:{index}", options['batch_size'],
+                      options['tracking_flush_size'], options['poll_interval'], options['once']),
+                name=f"newsletter-worker-{index}",
+            )
+            for index in range(worker_count)
+        ]
+        for worker in workers:
+            worker.start()
+
+        self.stdout.write(
+            f"Started {len(workers)} newsletter delivery workers ({worker_prefix})")
+
+        # Wątek główny okresowo odzyskuje porzucone wiersze i kończy newslettery
+        while any(worker.is_alive() for worker in workers):
+            self.stop_event.wait(options['poll_interval'])
+            close_old_connections()
+            NewsletterDeliveryService.recover_stale()
+            NewsletterDeliveryService.finalize_newsletters()
+
+        for worker in workers:
+            worker.join()
+
+        self.connection_pool.close()
+        finalized = NewsletterDeliveryService.finalize_newsletters()
+        connection.close()
+        self.stdout.write(self.style.SUCCESS(
+            f"Newsletter delivery stopped, {finalized} newsletters finalized"))
+
+    def _handle_signal(self, signum, frame):
+        self.stdout.write("Stopping newsletter delivery workers...")
+        self.stop_event.set()
+
+    def _run_worker(self, worker_id, batch_size, tracking_flush_size, poll_interval, once):
+        sent_count = 0
+        tracking_buffer = TrackingBuffer(tracking_flush_size)
+        try:
+            while not self.stop_event.is_set():
+                close_old_connections()
+                batch = NewsletterDeliveryService.claim_batch(
+                    worker_id, batch_size)
+                if not batch:
+                    # Pusta kolejka - zapisz zaległe wiersze trackingu
+                    tracking_buffer.flush()
+                    if once:
+                        break
+                    self.stop_event.wait(poll_interval)
+                    continue
+
+                try:
+                    with self.connection_pool.connection() as mail_connection:
+                        sent, failed = NewsletterDeliveryService.deliver_batch(
+                            batch, mail_connection,
+                            should_stop=self.stop_event.is_set,
+                            tracking_buffer=tracking_buffer,
+                            throttle=self.throttle)
+                    sent_count += sent
+                except Exception as e:
+                    # Np. serwer pocztowy niedostępny - paczka wraca do kolejki
+                    logger.error(
+                        f"Worker {worker_id} could not deliver batch: {str(e)}")
+                    NewsletterDeliveryService.release_worker(worker_id)
+                    self.stop_event.wait(poll_interval)
+        except Exception as e:
+            logger.critical(
+                f"Newsletter worker {worker_id} crashed: {str(e)}", exc_info=True)
+        finally:
+            tracking_buffer.flush()
+            NewsletterDeliveryService.release_worker(worker_id)
+            connection.close()
+            logger.info(f"Worker {worker_id} stopped after {sent_count} messages")
@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-18 01:26
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0005_newsletter_is_active_newslettertemplate_is_active_and_more'),
+        ('subscriber', '0004_subscriber_is_active_subscribergroup_is_active'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsletterDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254, verbose_name='E-mail')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('claimed', 'Claimed'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10, verbose_name='Status')),
+                ('tracking_id', models.UUIDField(default=uuid.uuid4, editable=False, verbose_name='Tracking ID')),
+                ('worker_id', models.CharField(blank=True, max_length=100, verbose_name='Worker')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Attempts')),
+                ('error', models.CharField(blank=True, max_length=255, verbose_name='Error')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='Claimed at')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Sent at')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Data utworzenia')),
+                ('newsletter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='newsletter.newsletter', verbose_name='Newsletter')),
+                ('subscriber', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='newsletter_deliveries', to='subscriber.subscriber', verbose_name='Subscriber')),
+            ],
+            options={
+                'verbose_name': 'Wysyłka newslettera',
+                'verbose_name_plural': 'Wysyłki newsletterów',
+                'indexes': [models.Index(fields=['status', 'id'], name='newsletter_delivery_queue_idx'), models.Index(fields=['newsletter', 'status'], name='newsletter_delivery_nl_idx')],
+                'unique_together': {('newsletter', 'subscriber')},
+            },
+        ),
+    ]
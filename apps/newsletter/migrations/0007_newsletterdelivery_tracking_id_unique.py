@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 01:31
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0006_newsletterdelivery'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='newsletterdelivery',
+            name='tracking_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='Tracking ID'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2 on 2026-10-18 01:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0007_newsletterdelivery_tracking_id_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsletterStats',
+            fields=[
+                ('newsletter', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='newsletter.newsletter', verbose_name='Newsletter')),
+                ('total_opens', models.PositiveIntegerField(default=0, verbose_name='Total opens')),
+                ('unique_opens', models.PositiveIntegerField(default=0, verbose_name='Unique opens')),
+                ('total_clicks', models.PositiveIntegerField(default=0, verbose_name='Total clicks')),
+                ('unique_clicks', models.PositiveIntegerField(default=0, verbose_name='Unique clicks')),
+                ('last_event_at', models.DateTimeField(blank=True, null=True, verbose_name='Last event at')),
+            ],
+            options={
+                'verbose_name': 'Statystyki newslettera',
+                'verbose_name_plural': 'Statystyki newsletterów',
+            },
+        ),
+        migrations.AddField(
+            model_name='newsletterdelivery',
+            name='clicked_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='First clicked at'),
+        ),
+        migrations.AddField(
+            model_name='newsletterdelivery',
+            name='opened_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='First opened at'),
+        ),
+        migrations.CreateModel(
+            name='NewsletterHourlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Hour')),
+                ('opens', models.PositiveIntegerField(default=0, verbose_name='Opens')),
+                ('clicks', models.PositiveIntegerField(default=0, verbose_name='Clicks')),
+                ('newsletter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_stats', to='newsletter.newsletter', verbose_name='Newsletter')),
+            ],
+            options={
+                'verbose_name': 'Statystyki godzinowe newslettera',
+                'verbose_name_plural': 'Statystyki godzinowe newsletterów',
+                'unique_together': {('newsletter', 'hour')},
+            },
+        ),
+        migrations.CreateModel(
+            name='NewsletterLinkStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(verbose_name='Link URL')),
+                ('total_clicks', models.PositiveIntegerField(default=0, verbose_name='Total clicks')),
+                ('unique_clicks', models.PositiveIntegerField(default=0, verbose_name='Unique clicks')),
+                ('newsletter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='link_stats', to='newsletter.newsletter', verbose_name='Newsletter')),
+            ],
+            options={
+                'verbose_name': 'Statystyki linku',
+                'verbose_name_plural': 'Statystyki linków',
+                'unique_together': {('newsletter', 'url')},
+            },
+        ),
+    ]
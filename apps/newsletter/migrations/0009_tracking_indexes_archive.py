@@ -0,0 +1,61 @@
+# Generated by Django 5.2 on 2026-10-18 01:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0008_newsletter_stats'),
+        ('subscriber', '0004_subscriber_is_active_subscribergroup_is_active'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsletterTrackingArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(blank=True, max_length=50, null=True, verbose_name='Action')),
+                ('tracking_id', models.UUIDField(blank=True, null=True, verbose_name='Tracking ID')),
+                ('link_url', models.URLField(blank=True, null=True, verbose_name='Link URL')),
+                ('created_at', models.DateTimeField(verbose_name='Data utworzenia')),
+            ],
+            options={
+                'verbose_name': 'Archiwalny tracking newslettera',
+                'verbose_name_plural': 'Archiwalny tracking newsletterów',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='newslettertracking',
+            index=models.Index(fields=['newsletter', 'action', 'subscriber'], name='newsletter_track_nl_act_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newslettertracking',
+            index=models.Index(fields=['tracking_id', 'action'], name='newsletter_track_tid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newslettertracking',
+            index=models.Index(fields=['created_at'], name='newsletter_track_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='newslettertrackingarchive',
+            name='newsletter',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_tracking_events', to='newsletter.newsletter', verbose_name='Newsletter'),
+        ),
+        migrations.AddField(
+            model_name='newslettertrackingarchive',
+            name='subscriber',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_newsletter_events', to='subscriber.subscriber', verbose_name='Subscriber'),
+        ),
+        migrations.AddIndex(
+            model_name='newslettertrackingarchive',
+            index=models.Index(fields=['newsletter', 'action', 'subscriber'], name='newsletter_arch_nl_act_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newslettertrackingarchive',
+            index=models.Index(fields=['created_at'], name='newsletter_arch_created_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-18 01:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0009_tracking_indexes_archive'),
+        ('subscriber', '0004_subscriber_is_active_subscribergroup_is_active'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='newsletterdelivery',
+            name='newsletter_delivery_queue_idx',
+        ),
+        migrations.AddField(
+            model_name='newsletterdelivery',
+            name='domain',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Domain'),
+        ),
+        migrations.AddField(
+            model_name='newsletterdelivery',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Next attempt at'),
+        ),
+        migrations.AddField(
+            model_name='newsletterdelivery',
+            name='sequence',
+            field=models.PositiveIntegerField(default=0, verbose_name='Sequence'),
+        ),
+        migrations.AddIndex(
+            model_name='newsletterdelivery',
+            index=models.Index(fields=['status', 'sequence', 'id'], name='newsletter_delivery_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-18 01:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0010_delivery_domain_throttling'),
+        ('subscriber', '0004_subscriber_is_active_subscribergroup_is_active'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='newsletter',
+            index=models.Index(fields=['status', 'scheduled_date'], name='newsletter_status_sched_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0011_newsletter_schedule_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='newsletterlinkstats',
+            name='url',
+            field=models.URLField(max_length=2048, verbose_name='Link URL'),
+        ),
+        migrations.AlterField(
+            model_name='newslettertracking',
+            name='link_url',
+            field=models.URLField(blank=True, max_length=2048, null=True, verbose_name='Link URL'),
+        ),
+        migrations.AlterField(
+            model_name='newslettertrackingarchive',
+            name='link_url',
+            field=models.URLField(blank=True, max_length=2048, null=True, verbose_name='Link URL'),
+        ),
+    ]
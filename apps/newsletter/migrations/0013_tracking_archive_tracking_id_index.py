@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0012_link_url_length'),
+        ('subscriber', '0007_subscriber_email_lower_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='newslettertrackingarchive',
+            index=models.Index(fields=['tracking_id', 'action'], name='newsletter_arch_tid_idx'),
+        ),
+    ]
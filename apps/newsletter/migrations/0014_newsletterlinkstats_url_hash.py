@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-18 15:05
+
+import hashlib
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def fill_url_hashes(apps, schema_editor):
+    NewsletterLinkStats = apps.get_model('newsletter', 'NewsletterLinkStats')
+
+    last_pk = 0
+    while True:
+        rows = list(
+            NewsletterLinkStats.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+                'pk', 'url')[:BATCH_SIZE])
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        NewsletterLinkStats.objects.bulk_update(
+            [
+                NewsletterLinkStats(pk=pk, url_hash=hashlib.sha256(url.encode('utf-8')).hexdigest())
+                for pk, url in rows
+            ],
+            ['url_hash'],
+            batch_size=BATCH_SIZE
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0013_tracking_archive_tracking_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletterlinkstats',
+            name='url_hash',
+            field=models.CharField(default='', editable=False, max_length=64, verbose_name='URL hash'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_url_hashes, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='newsletterlinkstats',
+            unique_together={('newsletter', 'url_hash')},
+        ),
+    ]
@@ -1,3 +1,5 @@
+import hashlib
+
 from django.db import models
 from django.utils.text import slugify
 from django.urls import reverse
@@ -5,6 +7,14 @@ from apps.core.models import CoreModel
 from apps.subscriber.models import Subscriber, SubscriberGroup
 import uuid
 
+# Adresy linków w zdarzeniach i statystykach kliknięć (typowy limit przeglądarek)
+LINK_URL_MAX_LENGTH = 2048
+
+
+def link_url_hash(url):
+    """SHA-256 adresu linku - klucz unikalności zamiast długiej kolumny url"""
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
 
 class NewsletterTemplate(CoreModel):
     """
@@ -118,43 +128,47 @@ class Newsletter(CoreModel):
     def get_preview_url(self):
         return reverse('newsletter:newsletter_preview', kwargs={'slug': self.slug})
 
-    def get_recipient_count(self):
+    def get_recipients(self):
         """
-        Calculate the total number of recipients (unique subscribers)
+        Returns a queryset of unique recipients with newsletter consent.
+
+        Direct subscribers and members of the selected groups are resolved
+        in a single query with semi-joins over the M2M tables, so the
+        database removes duplicates instead of Python sets.
         """
-        # Direct subscribers
-        direct_subscribers = set(self.subscribers.values_list('id', flat=True))
+        direct_ids = Newsletter.subscribers.through.objects.filter(
+            newsletter_id=self.pk).values('subscriber_id')
+        group_ids = Newsletter.subscriber_groups.through.objects.filter(
+            newsletter_id=self.pk).values('subscribergroup_id')
+        group_member_ids = Subscriber.group_affiliation.through.objects.filter(
+            subscribergroup_id__in=group_ids).values('subscriber_id')
+
+        return Subscriber.objects.filter(newsletter_consent=True).filter(
+            models.Q(id__in=direct_ids) | models.Q(id__in=group_member_ids)
+        )
+
+    def iter_recipients(self, chunk_size=2000):
+        """
+        Streams recipients as lightweight rows (id, email, first_name, last_name).
 
-        # Subscribers from groups
-        group_subscribers = set()
-        for group in self.subscriber_groups.all():
-            group_subscribers.update(
-                group.subscriber.values_list('id', flat=True))
+        Uses a server-side cursor on PostgreSQL, so memory stays flat
+        regardless of the size of the list.
+        """
+        return self.get_recipients().order_by('id').values_list(
+            'id', 'email', 'first_name', 'last_name', named=True
+        ).iterator(chunk_size=chunk_size)
 
-        # Combine and get unique count
-        all_recipients = direct_subscribers.union(group_subscribers)
-        return len(all_recipients)
+    def get_recipient_count(self):
+        """
+        Calculate the total number of recipients (unique subscribers)
+        """
+        return self.get_recipients().count()
 
     def update_recipient_count(self):
         """
         Updates the total number of recipients based on groups and individual subscribers
         """
-        count = 0
-
-        # Count recipients from groups
-        for group in self.subscriber_groups.all():
-            count += group.subscriber.count()
-
-        # Add individual recipients who aren't already in groups
-        group_subscriber_ids = []
-        for group in self.subscriber_groups.all():
-            group_subscriber_ids.extend(
-                group.subscriber.values_list('id', flat=True)
-            )
-
-        individual_subscribers = self.subscribers.exclude(
-            id__in=group_subscriber_ids).count()
-        count += individual_subscribers
+        count = self.get_recipient_count()
 
         # Update field
         self.total_recipients = count
@@ -162,6 +176,13 @@ class Newsletter(CoreModel):
 
         return count
 
+    class Meta:
+        indexes = [
+            # Dyspozytor zaplanowanych wysyłek: status='scheduled' i termin
+            models.Index(fields=['status', 'scheduled_date'],
+                         name='newsletter_status_sched_idx'),
+        ]
+
 
 class NewsletterTracking(CoreModel):
     """
@@ -200,6 +221,7 @@ class NewsletterTracking(CoreModel):
         verbose_name="User agent"
     )
     link_url = models.URLField(
+        max_length=LINK_URL_MAX_LENGTH,
         null=True,
         blank=True,
         verbose_name="Link URL"
@@ -220,3 +242,221 @@ class NewsletterTracking(CoreModel):
         verbose_name = "Tracking newslettera"
         verbose_name_plural = "Tracking newsletterów"
         ordering = ['-created_at']
+        indexes = [
+            # Raporty: filtr (newsletter, action) i grupowanie po subskrybencie
+            models.Index(fields=['newsletter', 'action', 'subscriber'],
+                         name='newsletter_track_nl_act_idx'),
+            # Zapis zdarzeń: wyszukiwanie po identyfikatorze śledzenia
+            models.Index(fields=['tracking_id', 'action'],
+                         name='newsletter_track_tid_idx'),
+            # Archiwizacja: zakres starych zdarzeń
+            models.Index(fields=['created_at'],
+                         name='newsletter_track_created_idx'),
+        ]
+
+
+class NewsletterTrackingArchive(models.Model):
+    """
+    Archiwum starych zdarzeń śledzenia w zwartej postaci (bez danych
+    technicznych klienta i pól audytowych), dzięki czemu tabela
+    NewsletterTracking zawiera tylko bieżące zdarzenia.
+    """
+    newsletter = models.ForeignKey(
+        Newsletter,
+        on_delete=models.CASCADE,
+        related_name="archived_tracking_events",
+        verbose_name="Newsletter"
+    )
+    subscriber = models.ForeignKey(
+        Subscriber,
+        on_delete=models.CASCADE,
+        related_name="archived_newsletter_events",
+        verbose_name="Subscriber"
+    )
+    action = models.CharField(max_length=50, null=True,
+                              blank=True, verbose_name="Action")
+    tracking_id = models.UUIDField(
+        null=True, blank=True, verbose_name="Tracking ID")
+    link_url = models.URLField(
+        max_length=LINK_URL_MAX_LENGTH,
+        null=True,
+        blank=True,
+        verbose_name="Link URL"
+    )
+    created_at = models.DateTimeField(verbose_name="Data utworzenia")
+
+    def __str__(self):
+        return f"{self.action} {self.subscriber_id} - {self.newsletter_id}"
+
+    class Meta:
+        verbose_name = "Archiwalny tracking newslettera"
+        verbose_name_plural = "Archiwalny tracking newsletterów"
+        indexes = [
+            models.Index(fields=['newsletter', 'action', 'subscriber'],
+                         name='newsletter_arch_nl_act_idx'),
+            # Zapis zdarzeń: wcześniejsze kliknięcia po identyfikatorze śledzenia
+            models.Index(fields=['tracking_id', 'action'],
+                         name='newsletter_arch_tid_idx'),
+            models.Index(fields=['created_at'],
+                         name='newsletter_arch_created_idx'),
+        ]
+
+
+class NewsletterDelivery(models.Model):
+    """
+    Kolejka wysyłki - jeden wiersz na odbiorcę newslettera.
+    Status wiersza jest punktem kontrolnym dla workerów wysyłki, dzięki czemu
+    przerwany worker wznawia pracę bez ponownej wysyłki do tych samych osób.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('claimed', 'Claimed'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+
+    newsletter = models.ForeignKey(
+        Newsletter,
+        on_delete=models.CASCADE,
+        related_name="deliveries",
+        verbose_name="Newsletter"
+    )
+    subscriber = models.ForeignKey(
+        Subscriber,
+        on_delete=models.CASCADE,
+        related_name="newsletter_deliveries",
+        verbose_name="Subscriber"
+    )
+    email = models.EmailField(verbose_name="E-mail")
+    # Domena odbiorcy i numer kolejny w obrębie domeny - kolejka jest
+    # pobierana wg numeru, więc wiadomości do różnych domen są przeplatane
+    domain = models.CharField(max_length=255, blank=True, verbose_name="Domain")
+    sequence = models.PositiveIntegerField(default=0, verbose_name="Sequence")
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name="Status"
+    )
+    tracking_id = models.UUIDField(
+        default=uuid.uuid4, unique=True, editable=False, verbose_name="Tracking ID")
+    worker_id = models.CharField(
+        max_length=100, blank=True, verbose_name="Worker")
+    attempts = models.PositiveSmallIntegerField(
+        default=0, verbose_name="Attempts")
+    error = models.CharField(max_length=255, blank=True, verbose_name="Error")
+    claimed_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Claimed at")
+    # Odroczenie po tymczasowym odrzuceniu przez serwer odbiorcy (4xx)
+    next_attempt_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Next attempt at")
+    sent_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Sent at")
+    # Pierwsze otwarcie/kliknięcie - podstawa liczników unikalnych odbiorców
+    opened_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="First opened at")
+    clicked_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="First clicked at")
+    created_at = models.DateTimeField(
+        auto_now_add=True, verbose_name="Data utworzenia")
+
+    def __str__(self):
+        return f"{self.newsletter_id} -> {self.email} ({self.status})"
+
+    class Meta:
+        verbose_name = "Wysyłka newslettera"
+        verbose_name_plural = "Wysyłki newsletterów"
+        unique_together = ('newsletter', 'subscriber')
+        indexes = [
+            models.Index(fields=['status', 'sequence', 'id'],
+                         name='newsletter_delivery_queue_idx'),
+            models.Index(fields=['newsletter', 'status'],
+                         name='newsletter_delivery_nl_idx'),
+        ]
+
+
+class NewsletterStats(models.Model):
+    """
+    Zagregowane statystyki newslettera aktualizowane przy zapisie zdarzeń
+    śledzenia, dzięki czemu raport nie przelicza tabeli NewsletterTracking.
+    """
+    newsletter = models.OneToOneField(
+        Newsletter,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name="Newsletter"
+    )
+    total_opens = models.PositiveIntegerField(
+        default=0, verbose_name="Total opens")
+    unique_opens = models.PositiveIntegerField(
+        default=0, verbose_name="Unique opens")
+    total_clicks = models.PositiveIntegerField(
+        default=0, verbose_name="Total clicks")
+    unique_clicks = models.PositiveIntegerField(
+        default=0, verbose_name="Unique clicks")
+    last_event_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Last event at")
+
+    def __str__(self):
+        return f"Stats: {self.newsletter_id}"
+
+    class Meta:
+        verbose_name = "Statystyki newslettera"
+        verbose_name_plural = "Statystyki newsletterów"
+
+
+class NewsletterLinkStats(models.Model):
+    """
+    Zagregowane kliknięcia pojedynczego linku w newsletterze
+    """
+    newsletter = models.ForeignKey(
+        Newsletter,
+        on_delete=models.CASCADE,
+        related_name="link_stats",
+        verbose_name="Newsletter"
+    )
+    url = models.URLField(max_length=LINK_URL_MAX_LENGTH, verbose_name="Link URL")
+    # Indeks btree nie przyjmie wpisu z adresem dłuższym niż ok. 2,7 kB,
+    # więc unikalność linku w newsletterze jest pilnowana po skrócie
+    url_hash = models.CharField(max_length=64, editable=False, verbose_name="URL hash")
+    total_clicks = models.PositiveIntegerField(
+        default=0, verbose_name="Total clicks")
+    unique_clicks = models.PositiveIntegerField(
+        default=0, verbose_name="Unique clicks")
+
+    def __str__(self):
+        return f"{self.url} ({self.total_clicks})"
+
+    def save(self, *args, **kwargs):
+        self.url_hash = link_url_hash(self.url)
+        super().save(*args, **kwargs)
+
+    class Meta:
+        verbose_name = "Statystyki linku"
+        verbose_name_plural = "Statystyki linków"
+        unique_together = ('newsletter', 'url_hash')
+
+
+class NewsletterHourlyStats(models.Model):
+    """
+    Liczba otwarć i kliknięć newslettera w kolejnych godzinach - oś czasu raportu
+    """
+    newsletter = models.ForeignKey(
+        Newsletter,
+        on_delete=models.CASCADE,
+        related_name="hourly_stats",
+        verbose_name="Newsletter"
+    )
+    hour = models.DateTimeField(verbose_name="Hour")
+    opens = models.PositiveIntegerField(default=0, verbose_name="Opens")
+    clicks = models.PositiveIntegerField(default=0, verbose_name="Clicks")
+
+    def __str__(self):
+        return f"{self.newsletter_id} @ {self.hour:%Y-%m-%d %H:00}"
+
+    class Meta:
+        verbose_name = "Statystyki godzinowe newslettera"
+        verbose_name_plural = "Statystyki godzinowe newsletterów"
+        unique_together = ('newsletter', 'hour')
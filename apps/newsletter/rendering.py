@@ -0,0 +1,222 @@
+# apps/newsletter/rendering.py
+
+import html
+import re
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.signing import Signer
+
+DEFAULT_TEMPLATE_HTML = """
+            <!DOCTYPE html>
+            <html>
+            <head>
+                <meta charset="UTF-8">
+                <title>{{subject}}</title>
+                <style>
+                    body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px; }
+                    h1, h2, h3 { color: #2c3e50; }
+                    a { color: #3498db; }
+                </style>
+            </head>
+            <body>
+                <h1>{{subject}}</h1>
+                <div class="content">
+                    {{content}}
+                </div>
+                <p style="color: #7f8c8d; font-size: 12px; margin-top: 30px;">
+                    You're receiving this email because you subscribed to our newsletter.
+                    <a href="{{unsubscribe_url}}">Unsubscribe</a>
+                </p>
+            </body>
+            </html>
+            """
+
+# Symbole zastępcze zależne od odbiorcy, miejsce wstawienia piksela
+# śledzącego oraz linki, które są przepisywane na adresy śledzenia kliknięć
+# (tylko w znacznikach <a> - patrz ANCHOR_TAG_RE)
+RECIPIENT_PLACEHOLDER_RE = re.compile(
+    r'\{\{(recipient_name|recipient_email|unsubscribe_url)\}\}|(</body>)|href="(https?://[^"]+)"')
+ANCHOR_TAG_RE = re.compile(r'<a\s', re.IGNORECASE)
+
+LINK_TEXT_RE = re.compile(
+    r'<a\b[^>]*\bhref="(https?://[^"]+)"[^>]*>(.*?)</a>', re.IGNORECASE | re.DOTALL)
+TAG_RE = re.compile(r'<[^>]+>')
+
+CLICK_SIGNING_SALT = 'newsletter.click'
+
+COMPILED_CACHE_SIZE = 32
+
+_compiled_cache = OrderedDict()
+_compiled_cache_lock = threading.Lock()
+
+
+def get_template_html(newsletter):
+    """Get the HTML template for the newsletter"""
+    if newsletter.template and newsletter.template.html_content:
+        return newsletter.template.html_content
+    return DEFAULT_TEMPLATE_HTML
+
+
+class CompiledNewsletter:
+    """
+    Treść newslettera skompilowana raz na kampanię.
+
+    Szablon z podstawioną treścią i tematem jest dzielony na listę
+    statycznych fragmentów oraz slotów dla danych odbiorcy, więc renderowanie
+    wiadomości dla kolejnej osoby to wypełnienie slotów i jeden ``join``
+    zamiast wielokrotnego przeszukiwania całego dokumentu.
+    """
+
+    def __init__(self, newsletter, template_html=None):
+        template_html = template_html or get_template_html(newsletter)
+
+        # Podstawienia wspólne dla całej kampanii
+        html_content = template_html.replace('{{content}}', newsletter.content)
+        html_content = html_content.replace('{{subject}}', newsletter.subject)
+
+        self.subject = newsletter.subject
+        self.track_opens = getattr(newsletter, 'add_tracking', True)
+        self.track_clicks = getattr(newsletter, 'add_tracking', True)
+        self.links = []
+        self.signed_links = []
+        self.parts, self.slots = self._compile(html_content)
+
+    def _compile(self, html_content):
+        parts = []
+        slots = []
+        position = 0
+        signer = Signer(salt=CLICK_SIGNING_SALT)
+        for match in RECIPIENT_PLACEHOLDER_RE.finditer(html_content):
+            placeholder, body_end, link = match.groups()
+            parts.append(html_content[position:match.start()])
+            position = match.end()
+
+            if link:
+                # <link rel="stylesheet">, <base> itp. nie są kliknięciami
+                if not self.track_clicks or not self._in_anchor(html_content, match.start()):
+                    parts.append(match.group(0))
+                    continue
+                # Podpis chroni endpoint kliknięć przed użyciem jako open redirect
+                url = html.unescape(link)
+                self.links.append(link)
+                self.signed_links.append(quote(signer.sign(url), safe=''))
+                parts.append('href="')
+                slots.append((len(parts), len(self.links) - 1))
+                parts.append('')
+                parts.append('"')
+                continue
+
+            slots.append((len(parts), placeholder or 'tracking_pixel'))
+            parts.append('')
+            if body_end:
+                parts.append(body_end)
+        parts.append(html_content[position:])
+        return parts, slots
+
+    @staticmethod
+    def _in_anchor(html_content, position):
+        """Sprawdza, czy atrybut na pozycji ``position`` należy do znacznika <a>"""
+        tag_start = html_content.rfind('<', 0, position)
+        return (tag_start != -1
+                and '>' not in html_content[tag_start:position]
+                and ANCHOR_TAG_RE.match(html_content, tag_start) is not None)
+
+    def render(self, recipient_name, recipient_email, unsubscribe_url, tracking_id=None):
+        """
+        Renderuje HTML wiadomości dla jednego odbiorcy
+
+        Args:
+            recipient_name (str): Imię i nazwisko odbiorcy
+            recipient_email (str): Adres email odbiorcy
+            unsubscribe_url (str): Link do wypisania się z newslettera
+            tracking_id (UUID, optional): Identyfikator do śledzenia otwarć
+                i kliknięć; bez niego linki pozostają niezmienione
+
+        Returns:
+            str: Gotowy HTML wiadomości
+        """
+        tracking_pixel = ''
+        links = self.links
+        if tracking_id:
+            if self.track_opens:
+                tracking_pixel = f'<img src="{settings.SITE_URL}/track/open/{tracking_id}/" style="width:1px;height:1px;display:none;" alt="" />'
+            click_url = f"{settings.SITE_URL}/track/click/{tracking_id}/?u="
+            links = [click_url + signed for signed in self.signed_links]
+
+        values = {
+            'recipient_name': recipient_name,
+            'recipient_email': recipient_email,
+            'unsubscribe_url': unsubscribe_url,
+            'tracking_pixel': tracking_pixel,
+        }
+        parts = self.parts.copy()
+        for index, slot in self.slots:
+            parts[index] = links[slot] if isinstance(slot, int) else values[slot]
+        return ''.join(parts)
+
+    def render_for_subscriber(self, subscriber, tracking_id=None):
+        """Renderuje HTML wiadomości dla subskrybenta"""
+        full_name = f"{subscriber.first_name or ''} {subscriber.last_name or ''}".strip()
+        return self.render(
+            full_name,
+            subscriber.email,
+            f"{settings.SITE_URL}/unsubscribe/{subscriber.id}/",
+            tracking_id
+        )
+
+
+def unsign_click_url(signed_url):
+    """
+    Zwraca docelowy adres linku z podpisanego parametru endpointu kliknięć
+
+    Raises:
+        django.core.signing.BadSignature: Gdy parametr został zmodyfikowany
+    """
+    return Signer(salt=CLICK_SIGNING_SALT).unsign(signed_url)
+
+
+def extract_link_texts(html_content):
+    """
+    Zwraca teksty linków z treści newslettera
+
+    Returns:
+        dict: Adres docelowy linku -> widoczny tekst linku
+    """
+    link_texts = {}
+    for link, text in LINK_TEXT_RE.findall(html_content or ''):
+        text = html.unescape(TAG_RE.sub('', text)).strip()
+        link_texts.setdefault(html.unescape(link), text or html.unescape(link))
+    return link_texts
+
+
+def get_compiled_newsletter(newsletter):
+    """
+    Zwraca skompilowaną treść newslettera z pamięci podręcznej procesu
+
+    Klucz zawiera daty modyfikacji newslettera i szablonu, więc edycja
+    kampanii unieważnia wpis bez jawnego czyszczenia cache.
+    """
+    template = newsletter.template
+    cache_key = (
+        newsletter.pk,
+        newsletter.updated_at,
+        template.pk if template else None,
+        template.updated_at if template else None,
+    )
+
+    with _compiled_cache_lock:
+        compiled = _compiled_cache.get(cache_key)
+        if compiled is not None:
+            _compiled_cache.move_to_end(cache_key)
+            return compiled
+
+    compiled = CompiledNewsletter(newsletter)
+
+    with _compiled_cache_lock:
+        _compiled_cache[cache_key] = compiled
+        while len(_compiled_cache) > COMPILED_CACHE_SIZE:
+            _compiled_cache.popitem(last=False)
+    return compiled
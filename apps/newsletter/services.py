@@ -0,0 +1,711 @@
+# apps/newsletter/services.py
+
+import logging
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Newsletter, NewsletterDelivery, NewsletterTracking
+from .rendering import get_compiled_newsletter
+
+logger = logging.getLogger(__name__)
+
+# Statusy wierszy kolejki, które nie zostały jeszcze zakończone
+OPEN_DELIVERY_STATUSES = ('pending', 'claimed', 'sending')
+
+# Liczba odbiorców zapisywanych do kolejki jednym zapytaniem
+ENQUEUE_CHUNK_SIZE = 2000
+
+
+def build_newsletter_email(newsletter, subscriber, tracking_id=None):
+    """
+    Buduje wiadomość newslettera dla pojedynczego odbiorcy
+
+    Args:
+        newsletter (Newsletter): Wysyłany newsletter
+        subscriber (Subscriber): Odbiorca
+        tracking_id (UUID, optional): Identyfikator pikseli śledzących
+
+    Returns:
+        EmailMultiAlternatives: Gotowa do wysłania wiadomość
+    """
+    compiled = get_compiled_newsletter(newsletter)
+    html_content = compiled.render_for_subscriber(subscriber, tracking_id)
+
+    # Dodaj unikalne identyfikatory, jeśli opcja jest włączona
+    if getattr(newsletter, 'use_uuid', True):
+        message_id = str(uuid.uuid4())
+        email_headers = {
+            'Message-ID': f'<{message_id}@{settings.EMAIL_DOMAIN}>',
+            'X-Entity-Ref-ID': message_id
+        }
+    else:
+        email_headers = {}
+
+    email = EmailMultiAlternatives(
+        subject=compiled.subject,
+        body="Please view this email with an HTML-compatible email client.",
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[subscriber.email],
+        headers=email_headers
+    )
+    email.attach_alternative(html_content, "text/html")
+    return email
+
+
+def is_connection_error(error):
+    """Sprawdza, czy błąd wysyłki dotyczy połączenia, a nie samej wiadomości"""
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        # 421 - serwer zamyka połączenie (np. limit wiadomości na sesję)
+        return error.smtp_code == 421
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+def is_temporary_failure(error):
+    """
+    Sprawdza, czy serwer odbiorcy tymczasowo odrzucił wiadomość (kody 4xx),
+    np. z powodu przekroczenia limitu wiadomości od nadawcy
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return bool(codes) and all(400 <= code < 500 for code in codes)
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return False
+
+
+def get_email_domain(email):
+    """Zwraca domenę adresu email małymi literami"""
+    return email.rpartition('@')[2].lower()
+
+
+def send_with_reconnect(mail_connection, email):
+    """
+    Wysyła wiadomość przez otwarte połączenie, a po zerwaniu połączenia
+    otwiera je ponownie i ponawia wysyłkę jeden raz
+    """
+    try:
+        return mail_connection.send_messages([email])
+    except Exception as e:
+        if not is_connection_error(e):
+            raise
+        logger.warning(f"Mail connection lost, reconnecting: {str(e)}")
+
+    try:
+        mail_connection.close()
+    except Exception:
+        pass
+    mail_connection.open()
+    return mail_connection.send_messages([email])
+
+
+class MailConnectionPool:
+    """
+    Pula długotrwałych połączeń z backendem pocztowym.
+
+    Połączenia są otwierane przy pierwszym użyciu i współdzielone przez
+    workery, dzięki czemu kolejne paczki nie płacą za nawiązanie sesji
+    SMTP i handshake TLS.
+    """
+
+    def __init__(self, size=None, backend=None):
+        self.size = size or getattr(
+            settings, 'NEWSLETTER_SMTP_CONNECTIONS', 4)
+        self.backend = backend
+        self._connections = queue.LifoQueue()
+        for _ in range(self.size):
+            self._connections.put(None)
+
+    @contextmanager
+    def connection(self):
+        """Pobiera połączenie z puli na czas wysyłki jednej paczki"""
+        mail_connection = self._connections.get()
+        if mail_connection is None:
+            mail_connection = get_connection(
+                self.backend, fail_silently=False)
+        try:
+            yield mail_connection
+        except Exception:
+            # Połączenie w nieznanym stanie - zostanie otwarte ponownie
+            self._close_quietly(mail_connection)
+            raise
+        finally:
+            self._connections.put(mail_connection)
+
+    def close(self):
+        """Zamyka wszystkie połączenia w puli"""
+        for _ in range(self.size):
+            mail_connection = self._connections.get()
+            if mail_connection is not None:
+                self._close_quietly(mail_connection)
+            self._connections.put(None)
+
+    @staticmethod
+    def _close_quietly(mail_connection):
+        try:
+            mail_connection.close()
+        except Exception:
+            pass
+
+
+class TokenBucket:
+    """
+    Kubełek tokenów - limit ``rate`` wiadomości na sekundę z krótkimi
+    seriami do ``capacity`` wiadomości. Nie jest bezpieczny wątkowo,
+    synchronizację zapewnia DeliveryThrottle.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        """Czas (w sekundach) do uzyskania kolejnego tokenu"""
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class DeliveryThrottle:
+    """
+    Limity tempa wysyłki współdzielone przez workery jednego procesu.
+
+    Każda wiadomość zużywa token z limitu globalnego i z limitu domeny
+    odbiorcy. Domena, która odpowiedziała tymczasowym odrzuceniem, jest
+    wstrzymywana na ``penalty`` sekund. Limity dotyczą jednego procesu
+    ``send_newsletters`` - przy kilku procesach należy je odpowiednio podzielić.
+
+    Ustawienia:
+        NEWSLETTER_GLOBAL_RATE: wiadomości/s łącznie (None - bez limitu)
+        NEWSLETTER_DOMAIN_RATES: słownik domena -> wiadomości/s
+        NEWSLETTER_DEFAULT_DOMAIN_RATE: limit dla pozostałych domen (None - bez limitu)
+        NEWSLETTER_DOMAIN_PENALTY_SECONDS: czas wstrzymania domeny po odrzuceniu 4xx
+    """
+
+    def __init__(self, global_rate=None, domain_rates=None, default_domain_rate=None,
+                 penalty=None):
+        global_rate = global_rate or getattr(settings, 'NEWSLETTER_GLOBAL_RATE', None)
+        self.domain_rates = domain_rates if domain_rates is not None else getattr(
+            settings, 'NEWSLETTER_DOMAIN_RATES', {})
+        self.default_domain_rate = default_domain_rate or getattr(
+            settings, 'NEWSLETTER_DEFAULT_DOMAIN_RATE', None)
+        self.penalty = penalty or getattr(
+            settings, 'NEWSLETTER_DOMAIN_PENALTY_SECONDS', 60)
+        self._global = TokenBucket(global_rate) if global_rate else None
+        self._domains = {}
+        self._paused_until = {}
+        self._lock = threading.Lock()
+
+    def _get_bucket(self, domain):
+        if domain not in self._domains:
+            rate = self.domain_rates.get(domain, self.default_domain_rate)
+            self._domains[domain] = TokenBucket(rate) if rate else None
+        return self._domains[domain]
+
+    def try_acquire(self, domain):
+        """
+        Pobiera token dla wiadomości do domeny, jeśli oba limity na to pozwalają
+
+        Returns:
+            float: 0 gdy token został pobrany, w przeciwnym razie czas
+                oczekiwania (w sekundach) na dostępność domeny
+        """
+        with self._lock:
+            now = time.monotonic()
+            paused = self._paused_until.get(domain, 0) - now
+            if paused > 0:
+                return paused
+
+            buckets = [bucket for bucket in (self._global, self._get_bucket(domain)) if bucket]
+            for bucket in buckets:
+                bucket.refill(now)
+            wait = max([bucket.wait_time() for bucket in buckets], default=0.0)
+            if wait > 0:
+                return wait
+
+            for bucket in buckets:
+                bucket.tokens -= 1
+            return 0.0
+
+    def pause_domain(self, domain, seconds=None):
+        """Wstrzymuje wysyłkę do domeny po tymczasowym odrzuceniu"""
+        with self._lock:
+            self._paused_until[domain] = time.monotonic() + (seconds or self.penalty)
+
+    def paused_for(self, domain):
+        """Pozostały czas wstrzymania domeny w sekundach"""
+        with self._lock:
+            return max(0.0, self._paused_until.get(domain, 0) - time.monotonic())
+
+
+def interleave_by_domain(deliveries):
+    """
+    Grupuje wiersze kolejki wg domeny odbiorcy
+
+    Returns:
+        collections.deque: Kolejka par (domena, deque wierszy) w kolejności
+            pierwszego wystąpienia domeny
+    """
+    groups = defaultdict(deque)
+    for delivery in deliveries:
+        groups[delivery.domain or get_email_domain(delivery.email)].append(delivery)
+    return deque(groups.items())
+
+
+class TrackingBuffer:
+    """
+    Bufor wierszy NewsletterTracking zapisywanych zbiorczo.
+
+    Wiersze 'sent' i 'error' z kolejnych paczek są zbierane w pamięci
+    i zapisywane przez ``bulk_create`` po osiągnięciu ``flush_size``.
+    Właściciel bufora musi wywołać ``flush()`` przy zakończeniu pracy.
+    """
+
+    def __init__(self, flush_size=None):
+        self.flush_size = flush_size or getattr(
+            settings, 'NEWSLETTER_TRACKING_FLUSH_SIZE', 500)
+        self._rows = []
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, delivery, action):
+        """Dodaje wiersz trackingu dla wiersza kolejki"""
+        self._rows.append(NewsletterTracking(
+            newsletter_id=delivery.newsletter_id,
+            subscriber_id=delivery.subscriber_id,
+            action=action,
+            tracking_id=delivery.tracking_id
+        ))
+        if len(self._rows) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Zapisuje zbuforowane wiersze
+
+        Wszystkie paczki ``bulk_create`` są zapisywane w jednej transakcji -
+        przy błędzie bazy nic nie zostaje zapisane, a wiersze pozostają
+        w buforze i zostaną zapisane (bez duplikatów) przy następnym wywołaniu.
+
+        Returns:
+            int: Liczba zapisanych wierszy
+        """
+        if not self._rows:
+            return 0
+
+        rows = self._rows
+        try:
+            with transaction.atomic():
+                NewsletterTracking.objects.bulk_create(
+                    rows, batch_size=self.flush_size)
+        except Exception as e:
+            logger.error(
+                f"Could not flush {len(rows)} tracking records: {str(e)}")
+            return 0
+
+        self._rows = []
+        return len(rows)
+
+
+class NewsletterDeliveryService:
+    """
+    Serwis kolejki wysyłki newsletterów.
+
+    Wysyłka przebiega w trzech krokach: widok zapisuje odbiorców do kolejki
+    (enqueue), workery z komendy ``send_newsletters`` pobierają paczki wierszy
+    (claim_batch) i wysyłają je przez pulę połączeń (deliver_batch), a na
+    końcu newsletter otrzymuje status końcowy (finalize_newsletters).
+    """
+
+    @staticmethod
+    def get_batch_size():
+        return getattr(settings, 'NEWSLETTER_DELIVERY_BATCH_SIZE', 100)
+
+    @staticmethod
+    def get_lease_timeout():
+        return timedelta(seconds=getattr(
+            settings, 'NEWSLETTER_DELIVERY_LEASE_SECONDS', 900))
+
+    @staticmethod
+    def get_max_attempts():
+        return getattr(settings, 'NEWSLETTER_DELIVERY_MAX_ATTEMPTS', 3)
+
+    @staticmethod
+    def get_deferral_backoff():
+        return timedelta(seconds=getattr(
+            settings, 'NEWSLETTER_DEFERRAL_BACKOFF_SECONDS', 300))
+
+    @staticmethod
+    @transaction.atomic
+    def enqueue(newsletter):
+        """
+        Zapisuje odbiorców newslettera do kolejki wysyłki
+
+        Operacja jest idempotentna - ponowne wywołanie nie dubluje wierszy
+        dla odbiorców, którzy już są w kolejce.
+
+        Args:
+            newsletter (Newsletter): Newsletter do wysłania
+
+        Returns:
+            int: Liczba odbiorców w kolejce
+        """
+        recipients = newsletter.iter_recipients(chunk_size=ENQUEUE_CHUNK_SIZE)
+        domain_counters = defaultdict(int)
+        while True:
+            chunk = list(islice(recipients, ENQUEUE_CHUNK_SIZE))
+            if not chunk:
+                break
+
+            deliveries = []
+            for recipient in chunk:
+                domain = get_email_domain(recipient.email)
+                deliveries.append(NewsletterDelivery(
+                    newsletter=newsletter,
+                    subscriber_id=recipient.id,
+                    email=recipient.email,
+                    domain=domain,
+                    sequence=domain_counters[domain]
+                ))
+                domain_counters[domain] += 1
+            NewsletterDelivery.objects.bulk_create(
+                deliveries, ignore_conflicts=True)
+
+        total_count = newsletter.deliveries.count()
+        Newsletter.objects.filter(pk=newsletter.pk).update(
+            status='sending', total_recipients=total_count)
+        newsletter.status = 'sending'
+        newsletter.total_recipients = total_count
+
+        logger.info(
+            f"Queued {total_count} deliveries for newsletter {newsletter.id}")
+        return total_count
+
+    @staticmethod
+    def dispatch_scheduled(limit=None):
+        """
+        Uruchamia wysyłkę zaplanowanych newsletterów, których termin minął
+
+        Każdy newsletter jest rezerwowany w osobnej transakcji przez
+        ``select_for_update(skip_locked=True)`` i w tej samej transakcji
+        zapisywany do kolejki, więc kilka procesów dyspozytora nie uruchomi
+        tej samej wysyłki, a workery nie zobaczą newslettera w statusie
+        'sending' bez odbiorców w kolejce.
+
+        Args:
+            limit (int, optional): Maksymalna liczba newsletterów w jednym wywołaniu
+
+        Returns:
+            int: Liczba uruchomionych newsletterów
+        """
+        dispatched = 0
+        while limit is None or dispatched < limit:
+            with transaction.atomic():
+                newsletter = (
+                    Newsletter.objects
+                    .select_for_update(skip_locked=True)
+                    .filter(status='scheduled', scheduled_date__lte=timezone.now())
+                    .order_by('scheduled_date', 'id')
+                    .first()
+                )
+                if newsletter is None:
+                    break
+
+                # Warunek na status chroni przed podwójnym startem także na SQLite
+                if not Newsletter.objects.filter(
+                        pk=newsletter.pk, status='scheduled').update(status='sending'):
+                    continue
+
+                total_count = NewsletterDeliveryService.enqueue(newsletter)
+                if total_count == 0:
+                    logger.warning(
+                        f"No recipients found for scheduled newsletter {newsletter.id}")
+                    Newsletter.objects.filter(pk=newsletter.pk).update(status='failed')
+
+            dispatched += 1
+            logger.info(
+                f"Dispatched scheduled newsletter {newsletter.id} to {total_count} recipients")
+        return dispatched
+
+    @staticmethod
+    def claim_batch(worker_id, batch_size=None):
+        """
+        Rezerwuje paczkę oczekujących wierszy kolejki dla workera
+
+        Na PostgreSQL wiersze są blokowane z ``skip_locked``, więc kilka
+        workerów nie pobierze tej samej paczki. Warunek ``status='pending'``
+        w UPDATE chroni przed podwójną rezerwacją także na SQLite.
+        Wiersze są pobierane wg numeru kolejnego w domenie, więc paczka
+        zawiera wiadomości do wielu domen zamiast serii do jednej.
+
+        Returns:
+            list[NewsletterDelivery]: Zarezerwowane wiersze
+        """
+        batch_size = batch_size or NewsletterDeliveryService.get_batch_size()
+
+        with transaction.atomic():
+            delivery_ids = list(
+                NewsletterDelivery.objects
+                .select_for_update(skip_locked=True, of=('self',))
+                .filter(status='pending', newsletter__status='sending')
+                .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=timezone.now()))
+                .order_by('sequence', 'id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not delivery_ids:
+                return []
+
+            NewsletterDelivery.objects.filter(
+                id__in=delivery_ids, status='pending'
+            ).update(status='claimed', worker_id=worker_id, claimed_at=timezone.now())
+
+        return list(
+            NewsletterDelivery.objects
+            .filter(id__in=delivery_ids, status='claimed', worker_id=worker_id)
+            .select_related('newsletter', 'newsletter__template', 'subscriber')
+            .order_by('sequence', 'id')
+        )
+
+    @staticmethod
+    def deliver_batch(deliveries, mail_connection, should_stop=None, tracking_buffer=None,
+                      throttle=None):
+        """
+        Wysyła paczkę wiadomości przez jedno otwarte połączenie pocztowe
+
+        Status 'sending' (punkt kontrolny) dostaje tylko wiadomość wysyłana
+        w danej chwili, a po przyjęciu przez serwer wiersz od razu dostaje
+        status 'sent' - po przerwaniu workera co najwyżej jeden wiersz ma
+        niepewny stan, wysłane są już 'sent', a pozostałe są nadal 'claimed'
+        i wracają do kolejki. Błędy i odroczenia są zapisywane zbiorczo po
+        paczce. Wiersze, których wysyłka nie została rozpoczęta (zatrzymanie
+        workera, zerwane połączenie z serwerem), wracają do kolejki.
+
+        Wiadomości są wysyłane na przemian do kolejnych domen. Z limitami
+        (``throttle``) domena bez dostępnego tokenu jest pomijana na rzecz
+        następnej, a tymczasowe odrzucenie (4xx) odracza wiadomość i wstrzymuje
+        domenę zamiast oznaczać wiadomość jako nieudaną.
+
+        Args:
+            deliveries (list[NewsletterDelivery]): Zarezerwowane wiersze kolejki
+            mail_connection: Połączenie z backendem pocztowym (get_connection)
+            should_stop (callable, optional): Zwraca True gdy worker ma przerwać pracę
+            tracking_buffer (TrackingBuffer, optional): Bufor workera na wiersze
+                trackingu; bez niego wiersze są zapisywane na końcu paczki
+            throttle (DeliveryThrottle, optional): Limity tempa wysyłki
+
+        Returns:
+            tuple[int, int]: Liczba wysłanych i nieudanych wiadomości
+        """
+        local_buffer = None
+        if tracking_buffer is None:
+            tracking_buffer = local_buffer = TrackingBuffer()
+        max_wait = getattr(settings, 'NEWSLETTER_THROTTLE_MAX_WAIT', 30)
+        max_attempts = NewsletterDeliveryService.get_max_attempts()
+        backoff = NewsletterDeliveryService.get_deferral_backoff()
+
+        delivery_ids = [delivery.pk for delivery in deliveries]
+
+        sent = []
+        failed = []
+        deferred = []
+        postponed = []
+        processed_ids = set()
+        domains = interleave_by_domain(deliveries)
+        try:
+            mail_connection.open()
+            while domains:
+                if should_stop and should_stop():
+                    break
+
+                domain, delivery, wait = NewsletterDeliveryService._next_delivery(
+                    domains, throttle)
+                if delivery is None:
+                    if wait > max_wait:
+                        # Pozostałe domeny są wstrzymane - wiersze wracają do kolejki
+                        for domain, group in domains:
+                            retry_at = timezone.now() + timedelta(seconds=throttle.paused_for(domain))
+                            postponed.extend((delivery, retry_at) for delivery in group)
+                            processed_ids.update(delivery.pk for delivery in group)
+                        break
+                    time.sleep(min(wait, 1.0))
+                    continue
+
+                processed_ids.add(delivery.pk)
+                started = NewsletterDelivery.objects.filter(
+                    pk=delivery.pk, status='claimed', worker_id=delivery.worker_id
+                ).update(status='sending', attempts=F('attempts') + 1, claimed_at=timezone.now())
+                if not started:
+                    # Rezerwacja wygasła i wiersz przejął inny worker
+                    continue
+
+                try:
+                    email = build_newsletter_email(
+                        delivery.newsletter, delivery.subscriber, delivery.tracking_id)
+                    send_with_reconnect(mail_connection, email)
+                except Exception as e:
+                    if is_connection_error(e) and delivery.attempts + 1 < max_attempts:
+                        # Serwer pocztowy niedostępny także po ponownym połączeniu -
+                        # wiadomość jest odraczana, a reszta paczki wraca do kolejki
+                        logger.warning(
+                            f"Mail server unavailable, requeueing remaining batch: {str(e)}")
+                        deferred.append((
+                            delivery,
+                            timezone.now() + backoff * (delivery.attempts + 1),
+                            str(e)[:255]))
+                        break
+                    if is_temporary_failure(e) and delivery.attempts + 1 < max_attempts:
+                        logger.warning(
+                            f"Delivery to {delivery.email} deferred: {str(e)}")
+                        if throttle:
+                            throttle.pause_domain(domain)
+                        deferred.append((
+                            delivery,
+                            timezone.now() + backoff * (delivery.attempts + 1),
+                            str(e)[:255]))
+                    else:
+                        logger.error(
+                            f"Error sending to {delivery.email}: {str(e)}")
+                        failed.append((delivery, str(e)[:255]))
+                else:
+                    NewsletterDelivery.objects.filter(pk=delivery.pk).update(
+                        status='sent', sent_at=timezone.now(), error='')
+                    tracking_buffer.add(delivery, 'sent')
+                    sent.append(delivery)
+        finally:
+            NewsletterDeliveryService._save_batch_results(
+                failed,
+                [pk for pk in delivery_ids if pk not in processed_ids],
+                tracking_buffer, deferred, postponed)
+            if local_buffer is not None:
+                local_buffer.flush()
+
+        return len(sent), len(failed)
+
+    @staticmethod
+    def _next_delivery(domains, throttle):
+        """
+        Wybiera następną wiadomość - pierwszą domenę (po kolei), która ma token
+
+        Returns:
+            tuple: (domena, wiersz, 0) lub (None, None, czas oczekiwania)
+                gdy żadna domena nie ma dostępnego tokenu
+        """
+        wait = None
+        for _ in range(len(domains)):
+            domain, group = domains[0]
+            domains.rotate(-1)
+            delay = throttle.try_acquire(domain) if throttle else 0.0
+            if delay == 0:
+                delivery = group.popleft()
+                if not group:
+                    domains.pop()
+                return domain, delivery, 0.0
+            wait = delay if wait is None else min(wait, delay)
+        return None, None, wait
+
+    @staticmethod
+    def _save_batch_results(failed, unprocessed_ids, tracking_buffer,
+                            deferred=(), postponed=()):
+        """Zapisuje pozostałe wyniki paczki (wysłane są zapisywane na bieżąco)"""
+        for delivery, error in failed:
+            NewsletterDelivery.objects.filter(pk=delivery.pk).update(
+                status='failed', error=error)
+
+        for delivery, retry_at, error in deferred:
+            NewsletterDelivery.objects.filter(pk=delivery.pk).update(
+                status='pending', worker_id='', claimed_at=None,
+                next_attempt_at=retry_at, error=error)
+
+        # Wiersze niewysłane z powodu wstrzymania domeny nie zużywają próby
+        for delivery, retry_at in postponed:
+            NewsletterDelivery.objects.filter(pk=delivery.pk).update(
+                status='pending', worker_id='', claimed_at=None, next_attempt_at=retry_at)
+
+        if unprocessed_ids:
+            NewsletterDelivery.objects.filter(pk__in=unprocessed_ids, status='claimed').update(
+                status='pending', worker_id='', claimed_at=None)
+
+        for delivery, _ in failed:
+            tracking_buffer.add(delivery, 'error')
+
+    @staticmethod
+    def release_worker(worker_id):
+        """Zwraca do kolejki wiersze zarezerwowane, ale nierozpoczęte przez workera"""
+        return NewsletterDelivery.objects.filter(
+            worker_id=worker_id, status='claimed'
+        ).update(status='pending', worker_id='', claimed_at=None)
+
+    @staticmethod
+    def recover_stale(lease_timeout=None):
+        """
+        Odzyskuje wiersze porzucone przez workery, które przestały działać
+
+        Wiersze 'claimed' wracają do kolejki. Wiersze 'sending' mogły już
+        zostać przyjęte przez serwer SMTP, więc są oznaczane jako 'failed'
+        zamiast ponownej wysyłki.
+
+        Returns:
+            tuple[int, int]: Liczba wierszy przywróconych i przerwanych
+        """
+        lease_timeout = lease_timeout or NewsletterDeliveryService.get_lease_timeout()
+        cutoff = timezone.now() - lease_timeout
+
+        requeued = NewsletterDelivery.objects.filter(
+            status='claimed', claimed_at__lt=cutoff
+        ).update(status='pending', worker_id='', claimed_at=None)
+
+        interrupted = NewsletterDelivery.objects.filter(
+            status='sending', claimed_at__lt=cutoff
+        ).update(status='failed', error='Delivery interrupted by worker shutdown')
+
+        if requeued or interrupted:
+            logger.warning(
+                f"Recovered stale deliveries: {requeued} requeued, {interrupted} interrupted")
+        return requeued, interrupted
+
+    @staticmethod
+    def finalize_newsletters():
+        """
+        Ustawia status końcowy newsletterom, których kolejka została przetworzona
+
+        Returns:
+            int: Liczba zakończonych newsletterów
+        """
+        finalized = 0
+        for newsletter in Newsletter.objects.filter(status='sending'):
+            if newsletter.deliveries.filter(status__in=OPEN_DELIVERY_STATUSES).exists():
+                continue
+
+            sent_count = newsletter.deliveries.filter(status='sent').count()
+            if sent_count > 0:
+                updated = Newsletter.objects.filter(pk=newsletter.pk, status='sending').update(
+                    status='sent', sent_date=timezone.now())
+            else:
+                updated = Newsletter.objects.filter(pk=newsletter.pk, status='sending').update(
+                    status='failed')
+
+            if updated:
+                finalized += 1
+                logger.info(
+                    f"Newsletter {newsletter.id} finished with {sent_count} sent messages")
+        return finalized
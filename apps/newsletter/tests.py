@@ -1,3 +1,515 @@
-from django.test import TestCase
+# apps/newsletter/tests.py
 
-# Create your tests here.
+import smtplib
+from datetime import timedelta
+from urllib.parse import unquote
+
+from django.core import mail
+from django.core.mail import get_connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.subscriber.models import Subscriber, SubscriberGroup
+from .models import (
+    Newsletter, NewsletterDelivery, NewsletterStats, NewsletterTracking, NewsletterTrackingArchive
+)
+from .rendering import CompiledNewsletter, unsign_click_url
+from .services import DeliveryThrottle, NewsletterDeliveryService, TrackingBuffer
+from .tracking import archive_tracking_events, ingest_tracking_events, rebuild_newsletter_stats
+
+
+class NewsletterDeliveryServiceTestCase(TestCase):
+    def setUp(self):
+        self.group = SubscriberGroup.objects.create(group_name='Klienci')
+        self.newsletter = Newsletter.objects.create(
+            subject='Test', content='<p>Treść</p>')
+
+        direct = Subscriber.objects.create(email='a@example.com')
+        shared = Subscriber.objects.create(email='b@example.com')
+        no_consent = Subscriber.objects.create(
+            email='c@example.com', newsletter_consent=False)
+        shared.group_affiliation.add(self.group)
+        no_consent.group_affiliation.add(self.group)
+
+        self.newsletter.subscribers.add(direct, shared)
+        self.newsletter.subscriber_groups.add(self.group)
+
+    def test_enqueue_deduplicates_recipients(self):
+        # Odbiorca z listy i z grupy trafia do kolejki tylko raz
+        count = NewsletterDeliveryService.enqueue(self.newsletter)
+        self.assertEqual(count, 2)
+
+        # Ponowne dodanie do kolejki nie dubluje wierszy
+        NewsletterDeliveryService.enqueue(self.newsletter)
+        self.assertEqual(self.newsletter.deliveries.count(), 2)
+
+        self.newsletter.refresh_from_db()
+        self.assertEqual(self.newsletter.status, 'sending')
+
+    def test_dispatch_scheduled_starts_due_newsletters_once(self):
+        Newsletter.objects.filter(pk=self.newsletter.pk).update(
+            status='scheduled', scheduled_date=timezone.now() - timedelta(minutes=1))
+        future = Newsletter.objects.create(
+            subject='Później', content='<p>x</p>', status='scheduled',
+            scheduled_date=timezone.now() + timedelta(hours=1))
+
+        self.assertEqual(NewsletterDeliveryService.dispatch_scheduled(), 1)
+        # Kolejne wywołanie nie uruchamia tej samej wysyłki ponownie
+        self.assertEqual(NewsletterDeliveryService.dispatch_scheduled(), 0)
+
+        self.newsletter.refresh_from_db()
+        future.refresh_from_db()
+        self.assertEqual(self.newsletter.status, 'sending')
+        self.assertEqual(self.newsletter.deliveries.count(), 2)
+        self.assertEqual(future.status, 'scheduled')
+
+    def test_worker_processes_queue_and_finalizes(self):
+        NewsletterDeliveryService.enqueue(self.newsletter)
+
+        batch = NewsletterDeliveryService.claim_batch('worker-1', 10)
+        self.assertEqual(len(batch), 2)
+
+        # Drugi worker nie dostaje wierszy zarezerwowanych przez pierwszego
+        self.assertEqual(
+            NewsletterDeliveryService.claim_batch('worker-2', 10), [])
+
+        sent, failed = NewsletterDeliveryService.deliver_batch(
+            batch, get_connection())
+        self.assertEqual((sent, failed), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(NewsletterDeliveryService.finalize_newsletters(), 1)
+
+        self.newsletter.refresh_from_db()
+        self.assertEqual(self.newsletter.status, 'sent')
+
+    def test_recover_stale_does_not_resend(self):
+        NewsletterDeliveryService.enqueue(self.newsletter)
+        first, second = NewsletterDeliveryService.claim_batch('worker-1', 10)
+
+        # Symulacja awarii: pierwsza wiadomość wysłana, druga nierozpoczęta
+        NewsletterDeliveryService.deliver_batch([first], get_connection())
+        NewsletterDelivery.objects.filter(pk=second.pk).update(
+            claimed_at=timezone.now() - timedelta(hours=1))
+
+        NewsletterDeliveryService.recover_stale(timedelta(minutes=5))
+
+        batch = NewsletterDeliveryService.claim_batch('worker-2', 10)
+        self.assertEqual([delivery.pk for delivery in batch], [second.pk])
+
+    def test_interrupted_batch_keeps_sent_rows(self):
+        NewsletterDeliveryService.enqueue(self.newsletter)
+        first, second = NewsletterDeliveryService.claim_batch('worker-1', 10)
+
+        statuses_at_crash = {}
+
+        # Awaria workera po wysłaniu pierwszej wiadomości, w trakcie drugiej
+        class CrashingConnection:
+            def open(self):
+                pass
+
+            def close(self):
+                pass
+
+            def send_messages(self, messages):
+                if messages[0].to[0] == second.email:
+                    statuses_at_crash.update(
+                        NewsletterDelivery.objects.values_list('email', 'status'))
+                    raise KeyboardInterrupt
+                return 1
+
+        with self.assertRaises(KeyboardInterrupt):
+            NewsletterDeliveryService.deliver_batch([first, second], CrashingConnection())
+
+        # Stan zapisany przed końcem paczki - tak zostaje po nagłym zabiciu procesu
+        self.assertEqual(statuses_at_crash, {first.email: 'sent', second.email: 'sending'})
+
+        NewsletterDelivery.objects.update(claimed_at=timezone.now() - timedelta(hours=1))
+        NewsletterDeliveryService.recover_stale(timedelta(minutes=5))
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, 'sent')
+        self.assertIsNotNone(first.sent_at)
+        # Tylko wiadomość przerwana w trakcie wysyłki ma niepewny stan
+        self.assertEqual(second.status, 'failed')
+
+    def test_lost_connection_requeues_batch(self):
+        NewsletterDeliveryService.enqueue(self.newsletter)
+        batch = NewsletterDeliveryService.claim_batch('worker-1', 10)
+
+        # Serwer zrywa połączenie, a ponowne połączenie się nie udaje
+        class BrokenConnection:
+            opened = 0
+
+            def open(self):
+                self.opened += 1
+                if self.opened > 1:
+                    raise ConnectionRefusedError('Connection refused')
+
+            def close(self):
+                pass
+
+            def send_messages(self, messages):
+                raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+
+        sent, failed = NewsletterDeliveryService.deliver_batch(batch, BrokenConnection())
+        self.assertEqual((sent, failed), (0, 0))
+
+        statuses = list(self.newsletter.deliveries.values_list('status', 'attempts'))
+        # Żaden wiersz nie jest nieudany ani nie zostaje w stanie 'sending'
+        self.assertEqual(sorted(statuses), [('pending', 0), ('pending', 1)])
+
+    def test_throttled_delivery_interleaves_and_defers_domains(self):
+        newsletter = Newsletter.objects.create(subject='Domeny', content='<p>x</p>')
+        for email in ('a@gmail.com', 'b@gmail.com', 'c@gmail.com', 'd@wp.pl'):
+            newsletter.subscribers.add(Subscriber.objects.create(email=email))
+        NewsletterDeliveryService.enqueue(newsletter)
+
+        batch = NewsletterDeliveryService.claim_batch('worker-1', 10)
+        self.assertEqual(
+            [delivery.domain for delivery in batch[:2]], ['gmail.com', 'wp.pl'])
+
+        # Serwer wp.pl tymczasowo odrzuca wiadomość (kod 4xx)
+        class DeferringConnection:
+            def __init__(self):
+                self.sent = []
+
+            def open(self):
+                pass
+
+            def close(self):
+                pass
+
+            def send_messages(self, messages):
+                if messages[0].to[0].endswith('@wp.pl'):
+                    raise smtplib.SMTPRecipientsRefused(
+                        {messages[0].to[0]: (450, b'Try again later')})
+                self.sent.append(messages[0].to[0])
+                return 1
+
+        connection = DeferringConnection()
+        sent, failed = NewsletterDeliveryService.deliver_batch(
+            batch, connection, throttle=DeliveryThrottle(global_rate=1000))
+        self.assertEqual((sent, failed), (3, 0))
+
+        deferred = NewsletterDelivery.objects.get(email='d@wp.pl')
+        self.assertEqual(deferred.status, 'pending')
+        self.assertIsNotNone(deferred.next_attempt_at)
+
+        # Odroczona wiadomość nie jest pobierana przed upływem czasu odroczenia
+        self.assertEqual(NewsletterDeliveryService.claim_batch('worker-1', 10), [])
+
+    def test_tracking_rows_flushed_in_chunks(self):
+        NewsletterDeliveryService.enqueue(self.newsletter)
+        batch = NewsletterDeliveryService.claim_batch('worker-1', 10)
+
+        tracking_buffer = TrackingBuffer(flush_size=10)
+        NewsletterDeliveryService.deliver_batch(
+            batch, get_connection(), tracking_buffer=tracking_buffer)
+
+        # Wiersze czekają w buforze do osiągnięcia rozmiaru paczki
+        self.assertEqual(len(tracking_buffer), 2)
+        self.assertFalse(NewsletterTracking.objects.exists())
+
+        self.assertEqual(tracking_buffer.flush(), 2)
+        self.assertEqual(
+            NewsletterTracking.objects.filter(action='sent').count(), 2)
+
+    def test_failed_flush_does_not_duplicate_rows(self):
+        NewsletterDeliveryService.enqueue(self.newsletter)
+        first, second = self.newsletter.deliveries.all()
+
+        tracking_buffer = TrackingBuffer(flush_size=10)
+        tracking_buffer.add(first, 'sent')
+        tracking_buffer.add(second, 'sent')
+        broken = NewsletterDelivery(subscriber_id=first.subscriber_id, tracking_id=first.tracking_id)
+        tracking_buffer.add(broken, 'sent')
+
+        # Pierwsza paczka się zapisuje, druga nie - całość jest wycofywana
+        tracking_buffer.flush_size = 2
+        self.assertEqual(tracking_buffer.flush(), 0)
+        self.assertFalse(NewsletterTracking.objects.exists())
+        self.assertEqual(len(tracking_buffer), 3)
+
+        tracking_buffer._rows.pop()
+        self.assertEqual(tracking_buffer.flush(), 2)
+        self.assertEqual(NewsletterTracking.objects.count(), 2)
+
+    def test_ingest_tracking_events_updates_counters(self):
+        NewsletterDeliveryService.enqueue(self.newsletter)
+        delivery = self.newsletter.deliveries.first()
+
+        saved = ingest_tracking_events([
+            {'tracking_id': delivery.tracking_id, 'event_type': 'open'},
+            {'tracking_id': delivery.tracking_id, 'event_type': 'click',
+             'link_url': 'https://example.com/'},
+        ])
+        self.assertEqual(saved, 2)
+
+        self.newsletter.refresh_from_db()
+        self.assertEqual((self.newsletter.open_count, self.newsletter.click_count), (1, 1))
+
+    def test_ingest_maintains_aggregate_stats(self):
+        NewsletterDeliveryService.enqueue(self.newsletter)
+        first, second = self.newsletter.deliveries.all()
+
+        # Powtórne kliknięcie tego samego linku nie zwiększa licznika unikalnych
+        ingest_tracking_events([
+            {'tracking_id': first.tracking_id, 'event_type': 'open'},
+            {'tracking_id': first.tracking_id, 'event_type': 'click',
+             'link_url': 'https://example.com/'},
+        ])
+        ingest_tracking_events([
+            {'tracking_id': first.tracking_id, 'event_type': 'open'},
+            {'tracking_id': first.tracking_id, 'event_type': 'click',
+             'link_url': 'https://example.com/'},
+            {'tracking_id': second.tracking_id, 'event_type': 'click',
+             'link_url': 'https://example.com/'},
+        ])
+
+        stats = NewsletterStats.objects.get(newsletter=self.newsletter)
+        self.assertEqual(
+            (stats.total_opens, stats.unique_opens, stats.total_clicks, stats.unique_clicks),
+            (2, 1, 3, 2))
+
+        link = self.newsletter.link_stats.get()
+        self.assertEqual((link.total_clicks, link.unique_clicks), (3, 2))
+        self.assertEqual(sum(self.newsletter.hourly_stats.values_list('opens', flat=True)), 2)
+
+        # Przeliczenie od zera daje te same wartości
+        rebuilt = rebuild_newsletter_stats(self.newsletter)
+        self.assertEqual(
+            (rebuilt.total_opens, rebuilt.unique_opens, rebuilt.total_clicks, rebuilt.unique_clicks),
+            (2, 1, 3, 2))
+
+    def test_archive_keeps_statistics(self):
+        NewsletterDeliveryService.enqueue(self.newsletter)
+        delivery = self.newsletter.deliveries.first()
+        ingest_tracking_events([
+            {'tracking_id': delivery.tracking_id, 'event_type': 'open'},
+            {'tracking_id': delivery.tracking_id, 'event_type': 'open'},
+        ])
+
+        archived = archive_tracking_events(timezone.now() + timedelta(seconds=1), batch_size=1)
+        self.assertEqual(archived, 2)
+        self.assertFalse(NewsletterTracking.objects.exists())
+        self.assertEqual(NewsletterTrackingArchive.objects.count(), 2)
+
+        # Statystyki przeliczone po archiwizacji uwzględniają archiwum
+        rebuilt = rebuild_newsletter_stats(self.newsletter)
+        self.assertEqual((rebuilt.total_opens, rebuilt.unique_opens), (2, 1))
+
+    def test_repeat_click_on_archived_link_is_not_unique(self):
+        NewsletterDeliveryService.enqueue(self.newsletter)
+        delivery = self.newsletter.deliveries.first()
+        click = {'tracking_id': delivery.tracking_id, 'event_type': 'click',
+                 'link_url': 'https://example.com/'}
+        ingest_tracking_events([click])
+        archive_tracking_events(timezone.now() + timedelta(seconds=1))
+
+        # Pierwsze kliknięcie jest już tylko w archiwum
+        ingest_tracking_events([click])
+        link = self.newsletter.link_stats.get()
+        self.assertEqual((link.total_clicks, link.unique_clicks), (2, 1))
+
+    def test_long_link_urls_keyed_by_hash(self):
+        from .models import link_url_hash
+        NewsletterDeliveryService.enqueue(self.newsletter)
+        delivery = self.newsletter.deliveries.first()
+        long_url = 'https://example.com/?q=' + 'x' * 2000
+
+        for _ in range(2):
+            ingest_tracking_events([{'tracking_id': delivery.tracking_id,
+                                     'event_type': 'click', 'link_url': long_url}])
+
+        link = self.newsletter.link_stats.get()
+        self.assertEqual(link.url, long_url)
+        self.assertEqual(link.url_hash, link_url_hash(long_url))
+        self.assertEqual((link.total_clicks, link.unique_clicks), (2, 1))
+
+        # Przeliczenie od zera zapisuje ten sam klucz
+        rebuild_newsletter_stats(self.newsletter)
+        self.assertEqual(self.newsletter.link_stats.get().url_hash, link.url_hash)
+
+
+class NewsletterSendViewTestCase(TestCase):
+    def test_send_view_does_not_overwrite_queue_state(self):
+        from django.contrib.auth import get_user_model
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.urls import reverse
+
+        user = get_user_model().objects.create_user('admin', password='x')
+        self.client.force_login(user)
+        newsletter = Newsletter.objects.create(subject='Wysyłka', content='<p>x</p>')
+        newsletter.subscribers.add(Subscriber.objects.create(email='a@example.com'))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('newsletter:newsletter_send', kwargs={'slug': newsletter.slug}))
+
+        # Newsletter jest zmieniany tylko warunkowymi UPDATE z enqueue,
+        # bez pełnego zapisu wszystkich kolumn (liczniki, status)
+        full_saves = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('UPDATE "newsletter_newsletter"')
+            and '"open_count"' in query['sql']]
+        self.assertEqual(full_saves, [])
+
+        newsletter.refresh_from_db()
+        self.assertEqual((newsletter.status, newsletter.total_recipients), ('sending', 1))
+
+
+class NewsletterRecipientsTestCase(TestCase):
+    def setUp(self):
+        from apps.partner.models import Partner, PartnerEmail
+
+        self.newsletter = Newsletter.objects.create(subject='Odbiorcy', content='<p>x</p>')
+        first_group = SubscriberGroup.objects.create(group_name='Pierwsza')
+        second_group = SubscriberGroup.objects.create(group_name='Druga')
+        other_group = SubscriberGroup.objects.create(group_name='Niewybrana')
+        self.newsletter.subscriber_groups.add(first_group, second_group)
+
+        def create(email, groups=(), direct=False, consent=True):
+            subscriber = Subscriber.objects.create(email=email, newsletter_consent=consent)
+            subscriber.group_affiliation.add(*groups)
+            if direct:
+                self.newsletter.subscribers.add(subscriber)
+            return subscriber
+
+        self.direct = create('direct@example.com', direct=True)
+        self.both_groups = create('groups@example.com', groups=[first_group, second_group])
+        self.direct_and_group = create(
+            'both@example.com', groups=[first_group], direct=True)
+        self.partnered = create('partner@example.com', groups=[second_group])
+        create('no-consent@example.com', groups=[first_group], direct=True, consent=False)
+        create('other-group@example.com', groups=[other_group])
+        create('unrelated@example.com')
+
+        # Powiązania z wieloma kontrahentami nie mogą dublować ani dodawać odbiorców
+        partners = [
+            Partner.objects.create(country='NO', vat_number=str(number), name=f'P{number}')
+            for number in (111111111, 222222222)]
+        for partner in partners:
+            PartnerEmail.objects.create(partner=partner, subscriber=self.partnered)
+            PartnerEmail.objects.create(
+                partner=partner, subscriber=Subscriber.objects.get(email='unrelated@example.com'))
+
+    def test_recipients_are_unique_consenting_direct_and_group_members(self):
+        expected = [self.direct.pk, self.both_groups.pk, self.direct_and_group.pk, self.partnered.pk]
+
+        # Ten sam zbiór co dawne łączenie zbiorów w Pythonie
+        legacy = (
+            set(self.newsletter.subscribers.values_list('id', flat=True))
+            | set(Subscriber.objects.filter(
+                group_affiliation__in=self.newsletter.subscriber_groups.all()
+            ).values_list('id', flat=True))
+        )
+        legacy &= set(Subscriber.objects.filter(
+            newsletter_consent=True).values_list('id', flat=True))
+        self.assertEqual(legacy, set(expected))
+
+        self.assertCountEqual(
+            self.newsletter.get_recipients().values_list('id', flat=True), expected)
+        self.assertEqual(self.newsletter.get_recipient_count(), 4)
+
+        rows = list(self.newsletter.iter_recipients(chunk_size=2))
+        self.assertEqual([row.id for row in rows], sorted(expected))
+        self.assertEqual(rows[0].email, 'direct@example.com')
+
+    def test_recipients_without_targets(self):
+        newsletter = Newsletter.objects.create(subject='Pusty', content='<p>x</p>')
+        self.assertFalse(newsletter.get_recipients().exists())
+        self.assertEqual(list(newsletter.iter_recipients()), [])
+
+
+@override_settings(SITE_URL='http://x')
+class CompiledNewsletterTestCase(TestCase):
+    def test_render_matches_placeholder_replacement(self):
+        newsletter = Newsletter(
+            subject='Oferta', content='<p>Cześć {{recipient_name}}</p>')
+        template_html = (
+            '<html><body><h1>{{subject}}</h1>{{content}}'
+            '<a href="{{unsubscribe_url}}">{{recipient_email}}</a></body></html>')
+
+        compiled = CompiledNewsletter(newsletter, template_html)
+        html_content = compiled.render(
+            'Jan Kowalski', 'jan@example.com', 'http://x/u/1/', 'abc')
+
+        self.assertEqual(
+            html_content,
+            '<html><body><h1>Oferta</h1><p>Cześć Jan Kowalski</p>'
+            '<a href="http://x/u/1/">jan@example.com</a>'
+            '<img src="http://x/track/open/abc/" style="width:1px;height:1px;display:none;" alt="" />'
+            '</body></html>')
+
+    def test_links_rewritten_to_signed_click_urls(self):
+        newsletter = Newsletter(
+            subject='Oferta', content='<a href="https://example.com/?a=1&amp;b=2">Sklep</a>')
+        compiled = CompiledNewsletter(newsletter, '<body>{{content}}</body>')
+
+        # Bez identyfikatora śledzenia linki pozostają bez zmian
+        self.assertIn('href="https://example.com/?a=1&amp;b=2"', compiled.render('', '', ''))
+
+        html_content = compiled.render('', '', '', 'abc')
+        self.assertIn('href="http://x/track/click/abc/?u=', html_content)
+        self.assertEqual(
+            unsign_click_url(unquote(compiled.signed_links[0])),
+            'https://example.com/?a=1&b=2')
+
+    def test_only_anchor_links_are_tracked(self):
+        newsletter = Newsletter(
+            subject='Oferta', content='<a class="btn" href="https://example.com/">Sklep</a>')
+        compiled = CompiledNewsletter(newsletter, (
+            '<html><head><link rel="stylesheet" href="https://cdn.example.com/style.css">'
+            '<base href="https://example.com/"></head><body>{{content}}</body></html>'))
+
+        html_content = compiled.render('', '', '', 'abc')
+        self.assertIn(
+            '<link rel="stylesheet" href="https://cdn.example.com/style.css">', html_content)
+        self.assertIn('<base href="https://example.com/">', html_content)
+        self.assertIn('<a class="btn" href="http://x/track/click/abc/?u=', html_content)
+        self.assertEqual(compiled.links, ['https://example.com/'])
+
+
+class TrackingRequestTestCase(TestCase):
+    def test_client_ip_ignores_invalid_and_untrusted_headers(self):
+        from django.test import RequestFactory
+        from .views import _get_client_ip
+        factory = RequestFactory()
+
+        # Bez zaufanych proxy X-Forwarded-For jest ignorowany
+        request = factory.get('/', REMOTE_ADDR='203.0.113.5', HTTP_X_FORWARDED_FOR='not-an-ip')
+        self.assertEqual(_get_client_ip(request), '203.0.113.5')
+        self.assertIsNone(_get_client_ip(factory.get('/', REMOTE_ADDR='junk')))
+
+        with override_settings(NEWSLETTER_TRACKING_TRUSTED_PROXIES=['10.0.0.0/8']):
+            request = factory.get(
+                '/', REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='198.51.100.7, 10.0.0.3')
+            self.assertEqual(_get_client_ip(request), '198.51.100.7')
+            request = factory.get(
+                '/', REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR="1.2.3.4'; DROP")
+            self.assertIsNone(_get_client_ip(request))
+
+    def test_flush_drops_events_that_cannot_be_saved(self):
+        from unittest import mock
+        from django.db import DataError
+        from .tracking import TrackingEventBuffer
+
+        def ingest(events):
+            if any(event['ip_address'] == 'bad' for event in events):
+                raise DataError('invalid input syntax for type inet')
+            return len(events)
+
+        event_buffer = TrackingEventBuffer(flush_size=10)
+        for ip_address in ('1.1.1.1', 'bad', '2.2.2.2', '3.3.3.3'):
+            event_buffer._events.append({
+                'tracking_id': 'x', 'event_type': 'open', 'link_url': None,
+                'ip_address': ip_address, 'user_agent': '', 'occurred_at': timezone.now()})
+
+        with mock.patch('apps.newsletter.tracking.ingest_tracking_events', side_effect=ingest):
+            with self.assertLogs('apps.newsletter.tracking', 'ERROR') as logs:
+                self.assertEqual(event_buffer.flush(), 3)
+
+        # Błędne zdarzenie jest odrzucone, a kolejka nie jest zablokowana
+        self.assertEqual(len(event_buffer), 0)
+        self.assertTrue(any('Dropping tracking event' in line for line in logs.output))
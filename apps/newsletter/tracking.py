@@ -0,0 +1,421 @@
+# apps/newsletter/tracking.py
+
+import atexit
+import logging
+import threading
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, close_old_connections, transaction
+from django.db.models import Count, F, Max, Q
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import (
+    Newsletter, NewsletterDelivery, NewsletterHourlyStats, NewsletterLinkStats,
+    NewsletterStats, NewsletterTracking, NewsletterTrackingArchive, link_url_hash
+)
+from apps.subscriber.models import Subscriber
+
+logger = logging.getLogger(__name__)
+
+
+def ingest_tracking_events(events):
+    """
+    Zapisuje paczkę zdarzeń otwarć i kliknięć
+
+    Identyfikatory śledzenia są mapowane na newsletter i subskrybenta jednym
+    zapytaniem, wiersze NewsletterTracking są zapisywane przez ``bulk_create``,
+    a liczniki newsletterów i tabele statystyk zwiększane wyrażeniami F -
+    liczba zapytań zależy od liczby newsletterów, linków i godzin w paczce,
+    a nie od liczby zdarzeń.
+
+    Args:
+        events (list[dict]): Zdarzenia z kluczami tracking_id, event_type,
+            link_url, ip_address, user_agent i occurred_at
+
+    Returns:
+        int: Liczba zapisanych zdarzeń
+    """
+    now = timezone.now()
+    tracking_ids = {event['tracking_id'] for event in events}
+    recipients = {
+        tracking_id: (newsletter_id, subscriber_id)
+        for tracking_id, newsletter_id, subscriber_id in
+        NewsletterDelivery.objects.filter(tracking_id__in=tracking_ids).values_list(
+            'tracking_id', 'newsletter_id', 'subscriber_id')
+    }
+
+    # Kliknięcia tych samych linków zapisane we wcześniejszych paczkach,
+    # także te przeniesione już do archiwum
+    click_links = {
+        event['link_url'] for event in events
+        if event['event_type'] == 'click' and event.get('link_url')}
+    seen_clicks = set()
+    if click_links:
+        for model in (NewsletterTracking, NewsletterTrackingArchive):
+            seen_clicks.update(model.objects.filter(
+                tracking_id__in=tracking_ids,
+                action='click',
+                link_url__in=click_links,
+            ).values_list('tracking_id', 'link_url').distinct())
+
+    rows = []
+    counters = defaultdict(lambda: {'open': 0, 'click': 0})
+    opened = defaultdict(set)
+    clicked = defaultdict(set)
+    link_counters = defaultdict(lambda: [0, 0])
+    hourly_counters = defaultdict(lambda: {'open': 0, 'click': 0})
+    for event in events:
+        recipient = recipients.get(event['tracking_id'])
+        if recipient is None:
+            continue
+        newsletter_id, subscriber_id = recipient
+        event_type = event['event_type']
+        occurred_at = event.get('occurred_at') or now
+        rows.append(NewsletterTracking(
+            newsletter_id=newsletter_id,
+            subscriber_id=subscriber_id,
+            event_type=event_type,
+            action=event_type,
+            tracking_id=event['tracking_id'],
+            link_url=event.get('link_url'),
+            ip_address=event.get('ip_address'),
+            user_agent=event.get('user_agent'),
+        ))
+        counters[newsletter_id][event_type] += 1
+        hour = occurred_at.replace(minute=0, second=0, microsecond=0)
+        hourly_counters[(newsletter_id, hour)][event_type] += 1
+
+        if event_type == 'open':
+            opened[newsletter_id].add(event['tracking_id'])
+        elif event_type == 'click':
+            clicked[newsletter_id].add(event['tracking_id'])
+            link_url = event.get('link_url')
+            if link_url:
+                link_counter = link_counters[(newsletter_id, link_url)]
+                link_counter[0] += 1
+                if (event['tracking_id'], link_url) not in seen_clicks:
+                    seen_clicks.add((event['tracking_id'], link_url))
+                    link_counter[1] += 1
+
+    if not rows:
+        return 0
+
+    with transaction.atomic():
+        NewsletterTracking.objects.bulk_create(rows, batch_size=500)
+
+        # Brakujące wiersze statystyk są tworzone z zerami, a potem zwiększane
+        NewsletterStats.objects.bulk_create(
+            [NewsletterStats(newsletter_id=newsletter_id) for newsletter_id in counters],
+            ignore_conflicts=True)
+        NewsletterLinkStats.objects.bulk_create(
+            [NewsletterLinkStats(newsletter_id=newsletter_id, url=url, url_hash=link_url_hash(url))
+             for newsletter_id, url in link_counters],
+            ignore_conflicts=True)
+        NewsletterHourlyStats.objects.bulk_create(
+            [NewsletterHourlyStats(newsletter_id=newsletter_id, hour=hour)
+             for newsletter_id, hour in hourly_counters],
+            ignore_conflicts=True)
+
+        for newsletter_id, counts in counters.items():
+            # Odbiorca jest unikalny, jeśli to jego pierwsze otwarcie/kliknięcie
+            unique_opens = unique_clicks = 0
+            if opened[newsletter_id]:
+                unique_opens = NewsletterDelivery.objects.filter(
+                    newsletter_id=newsletter_id,
+                    tracking_id__in=opened[newsletter_id],
+                    opened_at__isnull=True,
+                ).update(opened_at=now)
+            if clicked[newsletter_id]:
+                unique_clicks = NewsletterDelivery.objects.filter(
+                    newsletter_id=newsletter_id,
+                    tracking_id__in=clicked[newsletter_id],
+                    clicked_at__isnull=True,
+                ).update(clicked_at=now)
+
+            Newsletter.objects.filter(pk=newsletter_id).update(
+                open_count=F('open_count') + counts['open'],
+                click_count=F('click_count') + counts['click'],
+            )
+            NewsletterStats.objects.filter(newsletter_id=newsletter_id).update(
+                total_opens=F('total_opens') + counts['open'],
+                unique_opens=F('unique_opens') + unique_opens,
+                total_clicks=F('total_clicks') + counts['click'],
+                unique_clicks=F('unique_clicks') + unique_clicks,
+                last_event_at=now,
+            )
+
+        for (newsletter_id, url), (total, unique) in link_counters.items():
+            NewsletterLinkStats.objects.filter(
+                newsletter_id=newsletter_id, url_hash=link_url_hash(url)
+            ).update(
+                total_clicks=F('total_clicks') + total,
+                unique_clicks=F('unique_clicks') + unique,
+            )
+
+        for (newsletter_id, hour), counts in hourly_counters.items():
+            NewsletterHourlyStats.objects.filter(newsletter_id=newsletter_id, hour=hour).update(
+                opens=F('opens') + counts['open'],
+                clicks=F('clicks') + counts['click'],
+            )
+
+    return len(rows)
+
+
+def rebuild_newsletter_stats(newsletter):
+    """
+    Przelicza od nowa statystyki newslettera na podstawie zdarzeń śledzenia
+
+    Uwzględnia zarówno bieżącą tabelę NewsletterTracking, jak i archiwum.
+    Używane do uzupełnienia statystyk dla zdarzeń zapisanych przed
+    wprowadzeniem agregatów lub po ręcznych poprawkach danych.
+
+    Args:
+        newsletter (Newsletter): Newsletter do przeliczenia
+
+    Returns:
+        NewsletterStats: Zaktualizowane statystyki
+    """
+    sources = (
+        NewsletterTracking.objects.filter(newsletter=newsletter),
+        NewsletterTrackingArchive.objects.filter(newsletter=newsletter),
+    )
+
+    def total(action):
+        return sum(events.filter(action=action).count() for events in sources)
+
+    def unique(action):
+        # Odbiorca może mieć zdarzenia w obu tabelach - liczymy go raz
+        condition = Q()
+        for events in sources:
+            condition |= Q(id__in=events.filter(action=action).values('subscriber_id'))
+        return Subscriber.objects.filter(condition).count()
+
+    link_counters = defaultdict(lambda: [0, 0])
+    hourly_counters = defaultdict(lambda: [0, 0])
+    for events in sources:
+        clicks = events.filter(action='click').exclude(
+            link_url__isnull=True).exclude(link_url='')
+        for row in clicks.values('link_url').annotate(
+                total=Count('id'), unique=Count('subscriber', distinct=True)).order_by():
+            # Unikalne kliknięcia linku są sumowane per tabela - odbiorca
+            # klikający przed i po granicy archiwizacji liczony jest dwukrotnie
+            link_counters[row['link_url']][0] += row['total']
+            link_counters[row['link_url']][1] += row['unique']
+
+        for row in events.annotate(hour=TruncHour('created_at')).values('hour').annotate(
+                opens=Count('id', filter=Q(action='open')),
+                clicks=Count('id', filter=Q(action='click'))).order_by():
+            hourly_counters[row['hour']][0] += row['opens']
+            hourly_counters[row['hour']][1] += row['clicks']
+
+    with transaction.atomic():
+        stats, _ = NewsletterStats.objects.update_or_create(
+            newsletter=newsletter,
+            defaults={
+                'total_opens': total('open'),
+                'unique_opens': unique('open'),
+                'total_clicks': total('click'),
+                'unique_clicks': unique('click'),
+                'last_event_at': max(
+                    filter(None, (events.aggregate(last=Max('created_at'))['last']
+                                  for events in sources)),
+                    default=None),
+            }
+        )
+
+        NewsletterLinkStats.objects.filter(newsletter=newsletter).delete()
+        NewsletterLinkStats.objects.bulk_create([
+            NewsletterLinkStats(
+                newsletter=newsletter,
+                url=url,
+                url_hash=link_url_hash(url),
+                total_clicks=total_clicks,
+                unique_clicks=unique_clicks,
+            )
+            for url, (total_clicks, unique_clicks) in link_counters.items()
+        ])
+
+        NewsletterHourlyStats.objects.filter(newsletter=newsletter).delete()
+        NewsletterHourlyStats.objects.bulk_create([
+            NewsletterHourlyStats(
+                newsletter=newsletter, hour=hour, opens=opens, clicks=clicks)
+            for hour, (opens, clicks) in hourly_counters.items()
+            if opens or clicks
+        ])
+
+    return stats
+
+
+def archive_tracking_events(before, batch_size=5000):
+    """
+    Przenosi zdarzenia śledzenia starsze niż podana data do archiwum
+
+    Zdarzenia są przenoszone paczkami w osobnych transakcjach - każda paczka
+    to jeden INSERT do archiwum i jeden DELETE z bieżącej tabeli - więc
+    archiwizacja dużej tabeli nie blokuje jej na długo. Statystyki raportów
+    pochodzą z tabel agregatów, więc archiwizacja ich nie zmienia.
+
+    Args:
+        before (datetime): Granica - archiwizowane są zdarzenia sprzed tej daty
+        batch_size (int): Liczba zdarzeń przenoszonych w jednej transakcji
+
+    Returns:
+        int: Liczba przeniesionych zdarzeń
+    """
+    archived = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                NewsletterTracking.objects.filter(created_at__lt=before)
+                .order_by('created_at', 'id')
+                .values('id', 'newsletter_id', 'subscriber_id', 'action', 'event_type',
+                        'tracking_id', 'link_url', 'created_at')[:batch_size]
+            )
+            if not rows:
+                break
+
+            NewsletterTrackingArchive.objects.bulk_create([
+                NewsletterTrackingArchive(
+                    newsletter_id=row['newsletter_id'],
+                    subscriber_id=row['subscriber_id'],
+                    action=row['action'] or row['event_type'],
+                    tracking_id=row['tracking_id'],
+                    link_url=row['link_url'],
+                    created_at=row['created_at'],
+                )
+                for row in rows
+            ])
+            NewsletterTracking.objects.filter(
+                id__in=[row['id'] for row in rows]).delete()
+
+        archived += len(rows)
+        logger.info(f"Archived {archived} newsletter tracking events")
+
+    return archived
+
+
+class TrackingEventBuffer:
+    """
+    Bufor zdarzeń otwarć i kliknięć w pamięci procesu.
+
+    Endpointy śledzenia tylko dopisują zdarzenie do kolejki i od razu
+    zwracają odpowiedź. Wątek w tle zapisuje zdarzenia paczkami co
+    ``flush_interval`` sekund lub po zebraniu ``flush_size`` zdarzeń,
+    a przy zamykaniu procesu zapisywane są pozostałe zdarzenia.
+    """
+
+    def __init__(self, flush_size=None, flush_interval=None, max_size=None):
+        self.flush_size = flush_size or getattr(
+            settings, 'NEWSLETTER_TRACKING_FLUSH_SIZE', 500)
+        self.flush_interval = flush_interval or getattr(
+            settings, 'NEWSLETTER_TRACKING_FLUSH_INTERVAL', 2.0)
+        # Limit chroni pamięć procesu, gdy baza jest długo niedostępna
+        self.max_size = max_size or getattr(
+            settings, 'NEWSLETTER_TRACKING_BUFFER_MAX_SIZE', 100000)
+        self._events = deque()
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, tracking_id, event_type, link_url=None, ip_address=None, user_agent=None):
+        """Dodaje zdarzenie do bufora bez dostępu do bazy danych"""
+        if len(self._events) >= self.max_size:
+            logger.warning("Tracking buffer full, dropping event")
+            return
+
+        self._events.append({
+            'tracking_id': tracking_id,
+            'event_type': event_type,
+            'link_url': link_url,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'occurred_at': timezone.now(),
+        })
+        self._ensure_flusher()
+        if len(self._events) >= self.flush_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Zapisuje zbuforowane zdarzenia do bazy
+
+        Returns:
+            int: Liczba zapisanych zdarzeń
+        """
+        with self._flush_lock:
+            saved = 0
+            while self._events:
+                events = []
+                while self._events and len(events) < self.flush_size:
+                    events.append(self._events.popleft())
+                try:
+                    saved += ingest_tracking_events(events)
+                except (OperationalError, InterfaceError) as e:
+                    logger.error(
+                        f"Could not flush {len(events)} tracking events: {str(e)}")
+                    # Baza niedostępna - zdarzenia wracają na początek kolejki
+                    self._events.extendleft(reversed(events))
+                    break
+                except Exception as e:
+                    logger.error(
+                        f"Could not flush {len(events)} tracking events, "
+                        f"isolating invalid events: {str(e)}")
+                    saved += self._ingest_isolating(events)
+            return saved
+
+    def _ingest_isolating(self, events):
+        """
+        Zapisuje paczkę, której zapis nie powiódł się z powodu błędnych danych
+
+        Paczka jest dzielona na połowy aż do pojedynczych zdarzeń, a zdarzenia,
+        których nie da się zapisać, są odrzucane (z wpisem w logu) zamiast
+        wracać do kolejki i blokować kolejne paczki.
+
+        Returns:
+            int: Liczba zapisanych zdarzeń
+        """
+        try:
+            return ingest_tracking_events(events)
+        except (OperationalError, InterfaceError):
+            self._events.extendleft(reversed(events))
+            return 0
+        except Exception as e:
+            if len(events) == 1:
+                event = events[0]
+                logger.error(
+                    f"Dropping tracking event {event['event_type']} "
+                    f"for {event['tracking_id']}: {str(e)}")
+                return 0
+        middle = len(events) // 2
+        return (self._ingest_isolating(events[:middle]) +
+                self._ingest_isolating(events[middle:]))
+
+    def _ensure_flusher(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='newsletter-tracking-flusher', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Tracking flusher error: {str(e)}")
+
+
+event_buffer = TrackingEventBuffer()
@@ -5,20 +5,29 @@ from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
 from django.utils.text import slugify
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseRedirect, Http404
+from django.core.signing import BadSignature
+from django.views.decorators.cache import never_cache
 from django.utils import timezone
 from django.db.models import Q
 from django.core.mail import send_mail, EmailMultiAlternatives
 from django.template import Context
 from django.conf import settings
 
-from .models import Newsletter, NewsletterTemplate, NewsletterTracking, SubscriberGroup
+from .models import (
+    LINK_URL_MAX_LENGTH, Newsletter, NewsletterStats, NewsletterTemplate, NewsletterTracking,
+    SubscriberGroup
+)
 from .forms import NewsletterForm, NewsletterTemplateForm, NewsletterSendTestForm, NewsletterFilterForm
+from .services import NewsletterDeliveryService, OPEN_DELIVERY_STATUSES, build_newsletter_email
+from .rendering import extract_link_texts, unsign_click_url
+from .tracking import event_buffer
 from apps.subscriber.models import Subscriber, SubscriberGroup
 
 from .models import Newsletter, NewsletterTracking
 
 
+import ipaddress
 import logging
 import uuid
 import datetime
@@ -285,8 +294,7 @@ class NewsletterSendTestView(LoginRequiredMixin, View):
                     test_subscriber.save()
 
                 # Send the test email
-                self._send_newsletter_email(
-                    newsletter, test_subscriber, is_test=True)
+                build_newsletter_email(newsletter, test_subscriber).send()
 
                 messages.success(request, _(
                     f'Test newsletter sent to {email}.'))
@@ -300,91 +308,6 @@ class NewsletterSendTestView(LoginRequiredMixin, View):
         # Redirect to list instead of detail
         return redirect('newsletter:newsletter_list')
 
-    def _send_newsletter_email(self, newsletter, subscriber):
-        """Send the newsletter to a specific subscriber"""
-        # Get the template
-        template_html = self._get_template_html(newsletter)
-
-        # Replace placeholders
-        html_content = template_html.replace('{{content}}', newsletter.content)
-        html_content = html_content.replace('{{subject}}', newsletter.subject)
-
-        # Add subscriber-specific placeholders
-        full_name = f"{subscriber.first_name or ''} {subscriber.last_name or ''}".strip()
-        html_content = html_content.replace('{{recipient_name}}', full_name)
-        html_content = html_content.replace(
-            '{{recipient_email}}', subscriber.email)
-
-        # Add unsubscribe link - POPRAWIONA WERSJA
-        try:
-            site_url = getattr(settings, 'SITE_URL', 'http://127.0.0.1:8000')
-            unsubscribe_url = f"{site_url}/unsubscribe/{subscriber.id}/"
-        except Exception as e:
-            logger.warning(f"Error creating unsubscribe URL: {str(e)}")
-            unsubscribe_url = "#unsubscribe"  # Fallback
-
-        html_content = html_content.replace(
-            '{{unsubscribe_url}}', unsubscribe_url)
-
-        # Add tracking pixel if newsletter has tracking enabled - POPRAWIONA WERSJA
-        if getattr(newsletter, 'add_tracking', True):
-            tracking_id = str(uuid.uuid4())
-            try:
-                site_url = getattr(settings, 'SITE_URL',
-                                   'http://127.0.0.1:8000')
-                tracking_url = f"{site_url}/track/open/{tracking_id}/"
-            except Exception as e:
-                logger.warning(f"Error creating tracking URL: {str(e)}")
-                tracking_url = "/track/open/{tracking_id}/"  # Względny URL
-
-            tracking_pixel = f'<img src="{tracking_url}" style="width:1px;height:1px;display:none;" alt="" />'
-            html_content = html_content.replace(
-                '</body>', f'{tracking_pixel}</body>')
-
-        # Create the email
-        # Reszta metody bez zmian...
-        # Create the email
-        email = EmailMultiAlternatives(
-            subject=newsletter.subject,
-            body="Please view this email with an HTML-compatible email client.",
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[subscriber.email]
-        )
-
-        email.attach_alternative(html_content, "text/html")
-        email.send()
-
-    def _get_template_html(self, newsletter):
-        """Get the HTML template for the newsletter"""
-        if newsletter.template and newsletter.template.html_content:
-            return newsletter.template.html_content
-        else:
-            # Use default template
-            return """
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <title>{{subject}}</title>
-                <style>
-                    body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px; }
-                    h1, h2, h3 { color: #2c3e50; }
-                    a { color: #3498db; }
-                </style>
-            </head>
-            <body>
-                <h1>{{subject}}</h1>
-                <div class="content">
-                    {{content}}
-                </div>
-                <p style="color: #7f8c8d; font-size: 12px; margin-top: 30px;">
-                    You're receiving this email because you subscribed to our newsletter. 
-                    <a href="{{unsubscribe_url}}">Unsubscribe</a>
-                </p>
-            </body>
-            </html>
-            """
-
 
 class NewsletterSendView(LoginRequiredMixin, View):
     """View for finalizing and sending newsletters"""
@@ -449,19 +372,9 @@ class NewsletterSendView(LoginRequiredMixin, View):
                     newsletter.status = 'failed'
                     message = _('Error sending newsletter: {}').format(str(e))
 
-                # Zapisz tylko jeśli newsletter nadal jest w statusie 'sending'
-                # (funkcja send_newsletter mogła już zaktualizować status)
-                if newsletter.status == 'sending':
-                    try:
-                        newsletter.save()
-                        logger.info(
-                            f"Saved newsletter with status {newsletter.status}")
-                    except Exception as e:
-                        logger.critical(
-                            f"Failed to save newsletter: {str(e)}", exc_info=True)
-                else:
-                    logger.info(
-                        f"Not saving newsletter status as it's already set to {newsletter.status}")
+                # Bez zapisu: status i liczbę odbiorców ustawia enqueue warunkowym
+                # UPDATE, a pełny save() tej instancji nadpisałby zmiany workerów
+                # i finalize_newsletters
 
             # Wyświetl odpowiedni komunikat
             if newsletter.status == 'failed':
@@ -480,124 +393,17 @@ class NewsletterSendView(LoginRequiredMixin, View):
             return redirect('newsletter:newsletter_list')
 
     def send_newsletter(self, newsletter):
-        """Send the newsletter to all recipients with detailed error handling"""
+        """
+        Queue the newsletter for background delivery.
+
+        Messages are sent by the ``send_newsletters`` management command,
+        so the request returns as soon as the recipients are queued.
+        """
         logger.info(
-            f"Starting to send newsletter: {newsletter.subject} (ID: {newsletter.id})")
+            f"Queueing newsletter: {newsletter.subject} (ID: {newsletter.id})")
 
         try:
-            # Pobierz wszystkich odbiorców
-            direct_subscribers = set(
-                newsletter.subscribers.filter(newsletter_consent=True))
-            logger.info(f"Direct subscribers: {len(direct_subscribers)}")
-
-            # Dodaj subskrybentów z grup
-            group_subscribers = set()
-            for group in newsletter.subscriber_groups.all():
-                try:
-                    subscribers = group.subscriber.filter(
-                        newsletter_consent=True)
-                    group_subscribers.update(subscribers)
-                    logger.info(
-                        f"Added {len(subscribers)} subscribers from group {group.id}")
-                except Exception as e:
-                    logger.error(
-                        f"Error getting subscribers from group {group.id}: {str(e)}")
-
-            # Połącz i usuń duplikaty
-            all_recipients = list(direct_subscribers.union(group_subscribers))
-
-            total_count = len(all_recipients)
-            logger.info(
-                f"Found {total_count} recipients for newsletter {newsletter.id}")
-
-            # Ustaw całkowitą liczbę odbiorców
-            newsletter.total_recipients = total_count
-            newsletter.save(update_fields=['total_recipients'])
-            logger.info(f"Updated total_recipients to {total_count}")
-
-            # Sprawdź, czy w ogóle są jacyś odbiorcy
-            if total_count == 0:
-                logger.warning(
-                    f"No recipients found for newsletter {newsletter.id}")
-                newsletter.status = 'failed'
-                newsletter.save(update_fields=['status'])
-                return 0
-
-            # Wyślij do każdego odbiorcy
-            success_count = 0
-            error_count = 0
-
-            for index, subscriber in enumerate(all_recipients):
-                logger.info(
-                    f"Sending to {subscriber.email} ({index+1}/{total_count})")
-                try:
-                    self._send_newsletter_email(newsletter, subscriber)
-                    success_count += 1
-                    logger.info(f"Successfully sent to {subscriber.email}")
-
-                    # Opcjonalnie: Zapisuj każdy sukces do bazy
-                    # NewsletterTracking.objects.create(
-                    #     newsletter=newsletter,
-                    #     subscriber=subscriber,
-                    #     action='sent',
-                    #     timestamp=timezone.now()
-                    # )
-
-                except Exception as e:
-                    error_count += 1
-                    logger.error(
-                        f"Error sending to {subscriber.email}: {str(e)}")
-
-                    # Zapisz błąd do trackingu
-                    try:
-                        NewsletterTracking.objects.create(
-                            newsletter=newsletter,
-                            subscriber=subscriber,
-                            action='error',
-                            details=str(e)[:255]
-                        )
-                    except:
-                        pass  # Ignoruj błędy zapisywania trackingu
-
-            logger.info(
-                f"Completed sending: {success_count} successful, {error_count} errors")
-
-            # Aktualizuj status newslettera - BARDZO WAŻNE!
-            try:
-                # Pobierz świeżą instancję newslettera z bazy
-                newsletter_fresh = Newsletter.objects.get(pk=newsletter.pk)
-
-                if success_count > 0:
-                    newsletter_fresh.status = 'sent'
-                    newsletter_fresh.sent_date = timezone.now()
-                    newsletter_fresh.save(
-                        update_fields=['status', 'sent_date'])
-                    logger.info(
-                        f"Newsletter {newsletter.id} status updated to 'sent'")
-                else:
-                    newsletter_fresh.status = 'failed'
-                    newsletter_fresh.save(update_fields=['status'])
-                    logger.info(
-                        f"Newsletter {newsletter.id} status updated to 'failed'")
-
-            except Exception as e:
-                logger.critical(
-                    f"CRITICAL: Could not update newsletter status: {str(e)}")
-                # Próbuj ponownie z pełnym zapisem
-                try:
-                    if success_count > 0:
-                        newsletter.status = 'sent'
-                        newsletter.sent_date = timezone.now()
-                    else:
-                        newsletter.status = 'failed'
-                    newsletter.save()
-                    logger.info(f"Newsletter status updated with full save")
-                except Exception as e2:
-                    logger.critical(
-                        f"CRITICAL: Second attempt to update status failed: {str(e2)}")
-
-            return success_count
-
+            total_count = NewsletterDeliveryService.enqueue(newsletter)
         except Exception as e:
             logger.critical(f"Critical error in send_newsletter: {str(e)}")
             try:
@@ -608,103 +414,14 @@ class NewsletterSendView(LoginRequiredMixin, View):
                     "Could not update newsletter status to 'failed'")
             return 0
 
-    def _send_newsletter_email(self, newsletter, subscriber):
-        """Send the newsletter to a specific subscriber"""
-        # Get the template
-        template_html = self._get_template_html(newsletter)
-
-        # Replace placeholders
-        html_content = template_html.replace('{{content}}', newsletter.content)
-        html_content = html_content.replace('{{subject}}', newsletter.subject)
-
-        # Add subscriber-specific placeholders
-        full_name = f"{subscriber.first_name or ''} {subscriber.last_name or ''}".strip()
-        html_content = html_content.replace('{{recipient_name}}', full_name)
-        html_content = html_content.replace(
-            '{{recipient_email}}', subscriber.email)
-
-        # Add unsubscribe link
-        unsubscribe_url = f"{settings.SITE_URL}/unsubscribe/{subscriber.id}/"
-        html_content = html_content.replace(
-            '{{unsubscribe_url}}', unsubscribe_url)
-
-        # Add tracking pixel if newsletter has tracking enabled
-        if getattr(newsletter, 'add_tracking', True):
-            tracking_id = str(uuid.uuid4())
-            tracking_pixel = f'<img src="{settings.SITE_URL}/track/open/{tracking_id}/" style="width:1px;height:1px;display:none;" alt="" />'
-            html_content = html_content.replace(
-                '</body>', f'{tracking_pixel}</body>')
-
-            # Create tracking record
-            try:
-                NewsletterTracking.objects.create(
-                    newsletter=newsletter,
-                    subscriber=subscriber,
-                    action='sent',
-                    tracking_id=tracking_id
-                )
-            except Exception as e:
-                logger.warning(f"Could not create tracking record: {str(e)}")
-
-            # Dodaj unikalne identyfikatory, jeśli opcja jest włączona
-        if getattr(newsletter, 'use_uuid', True):
-            message_id = str(uuid.uuid4())
-
-            # Dodaj Message-ID do nagłówków wiadomości
-            email_headers = {
-                'Message-ID': f'<{message_id}@{settings.EMAIL_DOMAIN}>',
-                'X-Entity-Ref-ID': message_id
-            }
-        else:
-            email_headers = {}
-
-        # Create the email
-        email = EmailMultiAlternatives(
-            subject=newsletter.subject,
-            body="Please view this email with an HTML-compatible email client.",
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[subscriber.email]
-        )
+        # Sprawdź, czy w ogóle są jacyś odbiorcy
+        if total_count == 0:
+            logger.warning(
+                f"No recipients found for newsletter {newsletter.id}")
+            newsletter.status = 'failed'
+            newsletter.save(update_fields=['status'])
 
-        # Add any attachments if newsletter has them
-        if hasattr(newsletter, 'attachments') and newsletter.attachments.exists():
-            for attachment in newsletter.attachments.all():
-                email.attach(attachment.name, attachment.file.read(),
-                             attachment.content_type)
-
-        email.attach_alternative(html_content, "text/html")
-        email.send()
-
-    def _get_template_html(self, newsletter):
-        """Get the HTML template for the newsletter"""
-        if newsletter.template and newsletter.template.html_content:
-            return newsletter.template.html_content
-        else:
-            # Use default template
-            return """
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <title>{{subject}}</title>
-                <style>
-                    body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px; }
-                    h1, h2, h3 { color: #2c3e50; }
-                    a { color: #3498db; }
-                </style>
-            </head>
-            <body>
-                <h1>{{subject}}</h1>
-                <div class="content">
-                    {{content}}
-                </div>
-                <p style="color: #7f8c8d; font-size: 12px; margin-top: 30px;">
-                    You're receiving this email because you subscribed to our newsletter. 
-                    <a href="{{unsubscribe_url}}">Unsubscribe</a>
-                </p>
-            </body>
-            </html>
-            """
+        return total_count
 
 
 # Newsletter Template views
@@ -914,50 +631,17 @@ class NewsletterReportView(LoginRequiredMixin, View):
         })
 
     def _get_newsletter_stats(self, newsletter):
-        """Pobierz statystyki dla newslettera"""
-        # W rzeczywistej implementacji te dane pochodziłyby z bazy danych
-        # Na potrzeby demonstracji używamy przykładowych danych
+        """Pobierz statystyki dla newslettera z tabeli agregatów"""
+        total_recipients = newsletter.total_recipients or 0
 
-        # Sprawdź czy model ma pole total_recipients
-        total_recipients = getattr(newsletter, 'total_recipients', 0) or 0
+        stats = NewsletterStats.objects.filter(newsletter=newsletter).first()
+        if stats is None:
+            stats = NewsletterStats(newsletter=newsletter)
 
-        # Podstawowe statystyki
-        unique_opens = 0
-        total_opens = 0
-        unique_clicks = 0
-        total_clicks = 0
-
-        # Sprawdź, czy model NewsletterTracking jest dostępny
-        try:
-            unique_opens = NewsletterTracking.objects.filter(
-                newsletter=newsletter,
-                action='open'
-            ).values('subscriber').distinct().count()
-
-            total_opens = NewsletterTracking.objects.filter(
-                newsletter=newsletter,
-                action='open'
-            ).count()
-
-            unique_clicks = NewsletterTracking.objects.filter(
-                newsletter=newsletter,
-                action='click'
-            ).values('subscriber').distinct().count()
-
-            total_clicks = NewsletterTracking.objects.filter(
-                newsletter=newsletter,
-                action='click'
-            ).count()
-        except:
-            # Jeśli model nie istnieje lub wystąpi inny błąd, użyj przykładowych danych
-            # co najmniej 1, 35% open rate
-            unique_opens = max(1, int(total_recipients * 0.35))
-            # co najmniej 1, 20% więcej niż unique
-            total_opens = max(1, int(unique_opens * 1.2))
-            # co najmniej 1, 40% click-through rate
-            unique_clicks = max(1, int(unique_opens * 0.4))
-            # co najmniej 1, 30% więcej niż unique
-            total_clicks = max(1, int(unique_clicks * 1.3))
+        unique_opens = stats.unique_opens
+        total_opens = stats.total_opens
+        unique_clicks = stats.unique_clicks
+        total_clicks = stats.total_clicks
 
         # Oblicz wskaźniki (unikaj dzielenia przez zero)
         open_rate = (unique_opens / total_recipients *
@@ -987,91 +671,53 @@ class NewsletterReportView(LoginRequiredMixin, View):
 
     def _get_link_stats(self, newsletter):
         """Pobierz statystyki dla linków w newsletterze"""
-        # Na potrzeby demonstracji używamy przykładowych danych
+        total_recipients = newsletter.total_recipients or 0
+        # Klucze jak w track_click - adres przycięty do długości pola
+        link_texts = {
+            url[:LINK_URL_MAX_LENGTH]: text
+            for url, text in extract_link_texts(newsletter.content).items()}
 
         return [
             {
-                'text': 'Read more on our blog',
-                'url': 'https://example.com/blog/post-1',
-                'total_clicks': 45,
-                'unique_clicks': 40,
-                'click_rate': 20.0
-            },
-            {
-                'text': 'Sign up for our webinar',
-                'url': 'https://example.com/webinar',
-                'total_clicks': 29,
-                'unique_clicks': 25,
-                'click_rate': 12.5
-            },
-            {
-                'text': 'Download our free guide',
-                'url': 'https://example.com/guide',
-                'total_clicks': 20,
-                'unique_clicks': 18,
-                'click_rate': 9.0
-            },
-            {
-                'text': 'Follow us on social media',
-                'url': 'https://example.com/social',
-                'total_clicks': 15,
-                'unique_clicks': 12,
-                'click_rate': 6.0
-            },
-            {
-                'text': 'Contact us',
-                'url': 'https://example.com/contact',
-                'total_clicks': 10,
-                'unique_clicks': 8,
-                'click_rate': 4.0
+                'text': link_texts.get(link.url, link.url),
+                'url': link.url,
+                'total_clicks': link.total_clicks,
+                'unique_clicks': link.unique_clicks,
+                'click_rate': (link.unique_clicks / total_recipients *
+                               100) if total_recipients > 0 else 0
             }
+            for link in newsletter.link_stats.order_by('-total_clicks', 'url')
         ]
 
-    def _get_timeline_events(self, newsletter):
-        """Pobierz wydarzenia dla osi czasu"""
-        # Na potrzeby demonstracji używamy przykładowych danych
-
-        # Data wysłania newslettera
-        sent_date = getattr(newsletter, 'sent_date',
-                            timezone.now()) or timezone.now()
-
-        # Generuj przykładowe wydarzenia w różnych odstępach czasu
+    def _get_timeline_events(self, newsletter, limit=48):
+        """Pobierz wydarzenia dla osi czasu (ostatnie godziny z aktywnością)"""
         events = []
 
-        # Dodaj wydarzenie wysłania
-        events.append({
-            'timestamp': sent_date,
-            'action': 'sent',
-            'recipient': 'All recipients',
-            'details': f'Newsletter sent to {getattr(newsletter, "total_recipients", 0)} recipients'
-        })
-
-        # Dodaj kilka otwarć
-        for i in range(5):
-            events.append({
-                'timestamp': sent_date + datetime.timedelta(minutes=5 * (i + 1)),
-                'action': 'open',
-                'recipient': f'user{i+1}@example.com',
-                'details': f'Opened on iPhone'
-            })
+        for row in newsletter.hourly_stats.order_by('-hour')[:limit]:
+            if row.opens:
+                events.append({
+                    'timestamp': row.hour,
+                    'action': 'open',
+                    'recipient': 'All recipients',
+                    'details': f'{row.opens} opens in this hour'
+                })
+            if row.clicks:
+                events.append({
+                    'timestamp': row.hour,
+                    'action': 'click',
+                    'recipient': 'All recipients',
+                    'details': f'{row.clicks} clicks in this hour'
+                })
 
-        # Dodaj kilka kliknięć
-        for i in range(3):
+        # Dodaj wydarzenie wysłania
+        if newsletter.sent_date:
             events.append({
-                'timestamp': sent_date + datetime.timedelta(minutes=10 * (i + 1)),
-                'action': 'click',
-                'recipient': f'user{i+2}@example.com',
-                'details': f'Clicked on "Read more"'
+                'timestamp': newsletter.sent_date,
+                'action': 'sent',
+                'recipient': 'All recipients',
+                'details': f'Newsletter sent to {newsletter.total_recipients or 0} recipients'
             })
 
-        # Dodaj odbicie
-        events.append({
-            'timestamp': sent_date + datetime.timedelta(minutes=7),
-            'action': 'bounce',
-            'recipient': 'invalid@example.com',
-            'details': 'Mailbox full'
-        })
-
         # Posortuj wydarzenia wg timestamp (od najnowszych)
         events.sort(key=lambda x: x['timestamp'], reverse=True)
 
@@ -1149,7 +795,9 @@ def reset_stuck_newsletters(request):
         messages.error(request, _('Admin privileges required.'))
         return redirect('newsletter:newsletter_list')
 
-    stuck_newsletters = Newsletter.objects.filter(status='sending')
+    # Newslettery z niedokończoną kolejką są nadal przetwarzane przez workery
+    stuck_newsletters = Newsletter.objects.filter(status='sending').exclude(
+        deliveries__status__in=OPEN_DELIVERY_STATUSES)
     count = stuck_newsletters.count()
 
     # Ustaw status na 'failed' dla wszystkich zawieszonych newsletterów
@@ -1160,3 +808,76 @@ def reset_stuck_newsletters(request):
     messages.success(request, _(
         f'Reset {count} newsletters that were stuck in sending status.'))
     return redirect('newsletter:newsletter_list')
+
+
+# Przezroczysty GIF 1x1 zwracany przez piksel śledzący
+TRACKING_PIXEL_GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff'
+    b'!\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00'
+    b'\x00\x02\x02D\x01\x00;'
+)
+
+
+def _parse_ip(value):
+    """Zwraca adres IP w postaci znormalizowanej lub None dla nieprawidłowej wartości"""
+    try:
+        return str(ipaddress.ip_address((value or '').strip()))
+    except ValueError:
+        return None
+
+
+def _is_trusted_proxy(ip):
+    trusted = getattr(settings, 'NEWSLETTER_TRACKING_TRUSTED_PROXIES', [])
+    address = ipaddress.ip_address(ip)
+    return any(address in ipaddress.ip_network(network, strict=False) for network in trusted)
+
+
+def _get_client_ip(request):
+    """
+    Adres IP klienta dla zdarzeń śledzenia
+
+    ``X-Forwarded-For`` jest brany pod uwagę tylko, gdy zapytanie przyszło
+    z serwera proxy wymienionego w ``NEWSLETTER_TRACKING_TRUSTED_PROXIES``
+    (adresy lub sieci). Nagłówek jest czytany od prawej - pierwszy adres
+    spoza zaufanych proxy to klient. Nieprawidłowy adres daje None.
+    """
+    ip = _parse_ip(request.META.get('REMOTE_ADDR'))
+    if ip is None or not _is_trusted_proxy(ip):
+        return ip
+
+    forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    for value in reversed(forwarded_for.split(',')):
+        ip = _parse_ip(value)
+        if ip is None or not _is_trusted_proxy(ip):
+            return ip
+    return ip
+
+
+@never_cache
+def track_open(request, tracking_id):
+    """Tracking pixel - records an open and returns a 1x1 GIF immediately"""
+    event_buffer.add(
+        tracking_id,
+        'open',
+        ip_address=_get_client_ip(request),
+        user_agent=request.META.get('HTTP_USER_AGENT', '')[:1000]
+    )
+    return HttpResponse(TRACKING_PIXEL_GIF, content_type='image/gif')
+
+
+@never_cache
+def track_click(request, tracking_id):
+    """Records a link click and redirects to the signed target URL"""
+    try:
+        url = unsign_click_url(request.GET.get('u', ''))
+    except BadSignature:
+        raise Http404('Invalid tracking link')
+
+    event_buffer.add(
+        tracking_id,
+        'click',
+        link_url=url[:LINK_URL_MAX_LENGTH],
+        ip_address=_get_client_ip(request),
+        user_agent=request.META.get('HTTP_USER_AGENT', '')[:1000]
+    )
+    return HttpResponseRedirect(url)
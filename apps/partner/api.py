@@ -1,5 +1,10 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.functions import Collate, Lower
 from django.views import View
-from django.db import models
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django.utils.translation import gettext_lazy as _
@@ -8,6 +13,7 @@ from django.utils import timezone
 
 from .models import Partner, PartnerEmail, VATVerificationHistory
 from apps.subscriber.models import Subscriber
+from apps.subscriber.search import search_subscribers
 from apps.core.vat_verification import VATVerificationService, EU_COUNTRY_CODES
 
 
@@ -328,13 +334,12 @@ class SubscriberLookupAPIView(LoginRequiredMixin, View):
         page = int(request.GET.get('page', 1))
         limit = 10
 
+        if request.GET.get('mode') == 'autocomplete':
+            return JsonResponse(self.autocomplete(search, page, limit))
+
         # Wyszukaj subskrybentów
         if search:
-            subscribers = Subscriber.objects.filter(
-                models.Q(email__icontains=search) |
-                models.Q(first_name__icontains=search) |
-                models.Q(last_name__icontains=search)
-            )
+            subscribers = search_subscribers(Subscriber.objects.all(), search)
         else:
             subscribers = Subscriber.objects.all()
 
@@ -359,6 +364,47 @@ class SubscriberLookupAPIView(LoginRequiredMixin, View):
             'has_more': total > end
         })
 
+    @staticmethod
+    def autocomplete(search, page, limit):
+        """
+        Podpowiedzi adresów email dla pola typeahead
+
+        Dopasowanie po początku adresu bez względu na wielkość liter
+        (``LOWER(email) LIKE 'abc%'``) i sortowanie po tym samym wyrażeniu
+        korzystają z indeksu na ``LOWER(email) COLLATE "C"`` (migracja
+        subscriber 0007, PostgreSQL), więc baza czyta wiersze już
+        posortowane i kończy po ``LIMIT``. Zamiast liczyć
+        wszystkie wyniki pobierany jest jeden wiersz więcej (``has_more``),
+        a odpowiedzi dla popularnych początków są krótko trzymane w cache.
+
+        Returns:
+            dict: Wyniki i informacja, czy istnieje kolejna strona
+        """
+        prefix = search.strip().lower()
+        cache_key = 'subscriber_autocomplete:' + hashlib.md5(
+            f"{page}:{prefix}".encode()).hexdigest()
+        data = cache.get(cache_key)
+        if data is not None:
+            return data
+
+        email_lower = Lower('email')
+        if connection.vendor == 'postgresql':
+            # Wyrażenie musi być identyczne z indeksem, także collation
+            email_lower = Collate(email_lower, 'C')
+        subscribers = Subscriber.objects.annotate(email_lower=email_lower).order_by('email_lower')
+        if prefix:
+            subscribers = subscribers.filter(email_lower__startswith=prefix)
+
+        start = (max(page, 1) - 1) * limit
+        rows = list(subscribers.values(
+            'id', 'email', 'first_name', 'last_name')[start:start + limit + 1])
+        data = {
+            'results': rows[:limit],
+            'has_more': len(rows) > limit
+        }
+        cache.set(cache_key, data, getattr(settings, 'SUBSCRIBER_AUTOCOMPLETE_CACHE_SECONDS', 30))
+        return data
+
 
 class UpdateVerificationAPIView(LoginRequiredMixin, View):
     """API to update partner verification status"""
@@ -0,0 +1,56 @@
+# apps/partner/management/commands/reverify_partner_vat.py
+
+from django.core.management.base import BaseCommand
+
+from apps.partner.vat_reverification import PartnerVATReverificationService
+
+
+class Command(BaseCommand):
+    help = "Ponownie weryfikuje numery VAT kontrahentów (MF / VIES) równolegle i paczkami"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int, default=30,
+            help="Weryfikuj kontrahentów bez rozstrzygającego wyniku weryfikacji z ostatnich N dni "
+                 "(ponowne uruchomienie wznawia przerwaną weryfikację)")
+        parser.add_argument(
+            '--country', action='append', dest='countries',
+            help="Kod kraju (można podać wielokrotnie)")
+        parser.add_argument(
+            '--partner', action='append', type=int, dest='partner_ids',
+            help="ID kontrahenta (można podać wielokrotnie)")
+        parser.add_argument(
+            '--workers', type=int,
+            default=PartnerVATReverificationService.get_worker_count(),
+            help="Liczba równoległych zapytań do API")
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=PartnerVATReverificationService.get_batch_size(),
+            help="Liczba kontrahentów zapisywanych w jednej transakcji")
+
+    def handle(self, *args, **options):
+        partners = PartnerVATReverificationService.due_partners(
+            older_than_days=options['older_than'],
+            countries=options['countries'],
+            partner_ids=options['partner_ids'],
+        )
+        total = partners.count()
+        self.stdout.write(
+            f"Re-verifying {total} partners with {options['workers']} workers")
+
+        def report(stats):
+            self.stdout.write(
+                f"{stats['processed']}/{total} processed, {stats['verified']} verified, "
+                f"{stats['failed']} failed, {stats['rate']:.1f} partners/s "
+                f"(last id {stats['last_pk']})")
+
+        stats = PartnerVATReverificationService.run(
+            partners,
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            on_batch=report,
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-verified {stats['processed']} partners in {stats['elapsed']:.1f}s: "
+            f"{stats['verified']} verified, {stats['failed']} failed"))
@@ -1,3 +1,211 @@
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from apps.subscriber.models import Subscriber
+from .api import SubscriberLookupAPIView
+
+
+class SubscriberAutocompleteTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        for email in ('anna@example.com', 'adam@example.com', 'artur@example.com', 'jan@example.com'):
+            Subscriber.objects.create(email=email)
+
+    def test_prefix_match_without_count(self):
+        # Jedno zapytanie: limit + 1 wierszy, bez COUNT
+        with self.assertNumQueries(1):
+            data = SubscriberLookupAPIView.autocomplete('A', 1, 2)
+        self.assertEqual(
+            [row['email'] for row in data['results']], ['adam@example.com', 'anna@example.com'])
+        self.assertTrue(data['has_more'])
+
+        # Powtórzone zapytanie o ten sam początek trafia do cache
+        with self.assertNumQueries(0):
+            SubscriberLookupAPIView.autocomplete('a', 1, 2)
+
+        data = SubscriberLookupAPIView.autocomplete('a', 2, 2)
+        self.assertEqual([row['email'] for row in data['results']], ['artur@example.com'])
+        self.assertFalse(data['has_more'])
+
+    def test_prefix_match_ignores_case(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        Subscriber.objects.create(email='Zofia.Nowak@Example.com')
+
+        with CaptureQueriesContext(connection) as queries:
+            data = SubscriberLookupAPIView.autocomplete('ZOFIA.n', 1, 10)
+        self.assertEqual(
+            [row['email'] for row in data['results']], ['Zofia.Nowak@Example.com'])
+        # LIKE jest w SQLite niewrażliwy na wielkość liter, a w PostgreSQL nie -
+        # dopasowanie musi iść po LOWER(email), tak jak indeks
+        self.assertIn('LOWER("subscriber_subscriber"."email")', queries[0]['sql'])
+        # Sortowanie po tym samym wyrażeniu co filtr (i indeks)
+        self.assertIn('ORDER BY LOWER("subscriber_subscriber"."email")', queries[0]['sql'])
+
+
+class PartnerVATReverificationTestCase(TestCase):
+    def test_batch_run_is_resumable(self):
+        from unittest import mock
+        from apps.core.vat_verification import MF_NOT_FOUND_MESSAGE
+        from .models import Partner, VATVerificationHistory
+        from .vat_reverification import PartnerVATReverificationService
+        valid = Partner.objects.create(country='NO', vat_number='123456789', name='A')
+        invalid = Partner.objects.create(country='NO', vat_number='987654321', name='B')
+        unreachable = Partner.objects.create(country='NO', vat_number='555555555', name='C')
+        Partner.objects.filter(pk=invalid.pk).update(is_verified=True, verification_id='old')
+
+        def verify_vat(country_code, vat_number):
+            if vat_number == valid.vat_number:
+                return True, {'name': 'A'}, 'OK', 'req-1'
+            if vat_number == invalid.vat_number:
+                return False, None, MF_NOT_FOUND_MESSAGE, None
+            return False, None, 'Błąd połączenia z API: timeout', None
+
+        with mock.patch('apps.core.vat_verification.VATVerificationService.verify_vat',
+                        side_effect=verify_vat):
+            stats = PartnerVATReverificationService.run(
+                PartnerVATReverificationService.due_partners(), workers=2, batch_size=1)
+
+        self.assertEqual((stats['processed'], stats['verified'], stats['failed']), (3, 1, 2))
+        valid.refresh_from_db()
+        invalid.refresh_from_db()
+        self.assertTrue(valid.is_verified)
+        self.assertEqual(valid.verification_id, 'req-1')
+        # Jednoznaczny brak podmiotu odbiera status weryfikacji
+        self.assertFalse(invalid.is_verified)
+        self.assertIsNone(invalid.verification_id)
+        self.assertEqual(VATVerificationHistory.objects.count(), 3)
+
+        # Ponowne uruchomienie pomija kontrahentów z rozstrzygającym wynikiem,
+        # ale ponawia tych, przy których wystąpił błąd przejściowy
+        self.assertEqual(
+            list(PartnerVATReverificationService.due_partners()), [unreachable])
+        self.assertEqual(PartnerVATReverificationService.due_partners(older_than_days=0).count(), 3)
+
+
+class MFBulkLookupTestCase(TestCase):
+    """Zapytania zbiorcze do API MF sprawdzane na lokalnym serwerze zastępczym"""
+
+    def setUp(self):
+        import json
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        cache.clear()
+        self.paths = paths = []
+
+        class StubHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                paths.append(path)
+                if path.startswith('/api/search/nips/'):
+                    entries = []
+                    for nip in path.rsplit('/', 1)[1].split(','):
+                        if nip == '5261040828':
+                            entries.append({'identifier': nip, 'error': {'code': 'WL-111'}})
+                        elif nip == '1234563218':
+                            entries.append({'identifier': nip, 'subjects': []})
+                        else:
+                            entries.append({'identifier': nip, 'subjects': [
+                                {'name': f'FIRMA {nip}', 'workingAddress': 'PROSTA 1, 00-001 WARSZAWA'}]})
+                    body = {'result': {'entries': entries, 'requestId': 'bulk-1'}}
+                else:
+                    body = {'result': {'subject': {'name': 'POJEDYNCZA'}, 'requestId': 'single-1'}}
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_bulk_lookup_with_single_fallback(self):
+        from django.test import override_settings
+        from apps.core.vat_verification import VATVerificationService
+
+        nips = ['526-025-02-74', '7740001454', '5261040828', '1234563218', '5213017228', '123']
+        url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        with override_settings(MF_WHITELIST_API_URL=url, MF_NIPS_PER_REQUEST=3):
+            results = VATVerificationService.verify_polish_vats(nips)
+
+        # Dwa zapytania zbiorcze (3 + 2 NIP-y) i jedno pojedyncze dla błędnej pozycji
+        self.assertEqual(self.paths, [
+            '/api/search/nips/5260250274,7740001454,5261040828',
+            '/api/search/nips/1234563218,5213017228',
+            '/api/search/nip/5261040828',
+        ])
+        self.assertTrue(results['526-025-02-74'][0])
+        self.assertEqual(results['526-025-02-74'][1]['city'], 'Warszawa')
+        self.assertEqual(results['7740001454'][3], 'bulk-1')
+        self.assertEqual(results['5261040828'][3], 'single-1')
+        self.assertFalse(results['1234563218'][0])
+        self.assertFalse(results['123'][0])
+
+
+class VATVerificationCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_results_are_cached_per_number(self):
+        from apps.core.vat_verification import MF_NOT_FOUND_MESSAGE, VATVerificationService
+        calls = []
+
+        def lookup(result):
+            def call():
+                calls.append(result)
+                return result
+            return call
+
+        found = (True, {'name': 'Firma'}, 'OK', 'req-1')
+        for vat_number in ('5260250274', 'PL 526-025-02-74'):
+            self.assertEqual(
+                VATVerificationService.cached_lookup('mf', 'PL', vat_number, lookup(found)), found)
+        self.assertEqual(len(calls), 1)
+
+        # "Nie znaleziono" jest zapamiętywane, błąd komunikacji nie
+        not_found = (False, None, MF_NOT_FOUND_MESSAGE, None)
+        error = (False, None, 'Błąd komunikacji z API', None)
+        for result in (not_found, not_found, error, error):
+            number = '7740001454' if result is not_found else '5213017228'
+            VATVerificationService.cached_lookup('mf', 'PL', number, lookup(result))
+        self.assertEqual(calls.count(not_found), 1)
+        self.assertEqual(calls.count(error), 2)
+
+    def test_concurrent_lookups_share_one_request(self):
+        import threading
+        from apps.core.vat_verification import VATVerificationService
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow_lookup():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return True, {'name': 'Firma'}, 'OK', 'req-1'
+
+        results = []
+
+        def worker():
+            results.append(VATVerificationService.cached_lookup(
+                'vies', 'DE', '123456789', slow_lookup))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(result[3] == 'req-1' for result in results))
@@ -0,0 +1,205 @@
+# apps/partner/vat_reverification.py
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from apps.core.utils import iter_pk_batches
+from apps.core.vat_verification import (
+    EU_COUNTRY_CODES, NOT_FOUND_MESSAGES, VATVerificationService
+)
+from .models import Partner, VATVerificationHistory
+
+logger = logging.getLogger(__name__)
+
+
+class PartnerVATReverificationService:
+    """
+    Ponowna weryfikacja numerów VAT całej bazy kontrahentów.
+
+    Zapytania do API (MF / VIES) są wykonywane równolegle w ograniczonej
+    puli wątków (polskie NIP-y zbiorczo, po kilkadziesiąt na zapytanie),
+    a wyniki każdej paczki są zapisywane jedną transakcją: historia przez
+    ``bulk_create``, status kontrahentów przez ``bulk_update``.
+    Wątki nie korzystają z bazy danych - wykonują wyłącznie zapytania HTTP.
+    """
+
+    @staticmethod
+    def get_worker_count():
+        return getattr(settings, 'VAT_REVERIFY_WORKERS', 4)
+
+    @staticmethod
+    def get_batch_size():
+        return getattr(settings, 'VAT_REVERIFY_BATCH_SIZE', 100)
+
+    @staticmethod
+    def due_partners(older_than_days=30, countries=None, partner_ids=None):
+        """
+        Zwraca kontrahentów do ponownej weryfikacji
+
+        Pomijani są kontrahenci, dla których w ciągu ``older_than_days`` dni
+        zapisano już rozstrzygający wynik weryfikacji (numer potwierdzony
+        albo jednoznacznie nieznaleziony), więc przerwane uruchomienie można
+        po prostu powtórzyć - wznowi się od kontrahentów jeszcze niesprawdzonych.
+        Błędy przejściowe (timeout, niedostępne API) nie wykluczają kontrahenta.
+
+        Args:
+            older_than_days (int): Minimalny wiek ostatniej weryfikacji w dniach
+            countries (list, optional): Kody krajów
+            partner_ids (list, optional): Identyfikatory kontrahentów
+
+        Returns:
+            QuerySet: Kontrahenci do weryfikacji
+        """
+        cutoff = timezone.now() - timedelta(days=older_than_days)
+        partners = Partner.objects.filter(is_active=True).exclude(
+            Exists(VATVerificationHistory.objects.filter(
+                Q(is_verified=True) | Q(message__in=NOT_FOUND_MESSAGES),
+                partner=OuterRef('pk'), verification_date__gte=cutoff)))
+        if countries:
+            partners = partners.filter(country__in=countries)
+        if partner_ids:
+            partners = partners.filter(pk__in=partner_ids)
+        return partners
+
+    @staticmethod
+    def _verify(partner):
+        """Wywołanie API dla jednego kontrahenta (wykonywane w wątku puli)"""
+        success, data, message, verification_id = VATVerificationService.verify_vat(
+            partner.country.code, partner.vat_number)
+        return partner, bool(success and data), message, verification_id
+
+    @staticmethod
+    def _verify_polish(partners):
+        """Zapytanie zbiorcze API MF dla grupy polskich kontrahentów (w wątku puli)"""
+        results = VATVerificationService.verify_polish_vats(
+            [partner.vat_number for partner in partners])
+        verified = []
+        for partner in partners:
+            success, data, message, verification_id = results[partner.vat_number]
+            verified.append((partner, bool(success and data), message, verification_id))
+        return verified
+
+    @staticmethod
+    def verify_batch(partners, executor):
+        """
+        Weryfikuje paczkę kontrahentów i zapisuje wyniki
+
+        Kontrahenci zweryfikowani pomyślnie dostają ``is_verified``,
+        ``verification_date`` i ``verification_id``. Kontrahentom, których
+        numeru jednoznacznie nie znaleziono (MF / VIES), status weryfikacji
+        jest odbierany. Przy błędzie przejściowym zapisywana jest tylko
+        historia, a status nie jest zmieniany.
+
+        Args:
+            partners (list): Kontrahenci do weryfikacji
+            executor (Executor): Pula wątków wykonująca zapytania do API
+
+        Returns:
+            tuple: (liczba zweryfikowanych, liczba niezweryfikowanych)
+        """
+        # Polscy kontrahenci są sprawdzani zapytaniami zbiorczymi /search/nips/
+        polish = [partner for partner in partners if partner.country.code == 'PL']
+        chunk_size = getattr(settings, 'MF_NIPS_PER_REQUEST', 30)
+        polish_results = executor.map(
+            PartnerVATReverificationService._verify_polish,
+            [polish[start:start + chunk_size] for start in range(0, len(polish), chunk_size)])
+
+        # Pozostali z UE - współbieżnie klientem asynchronicznym VIES
+        eu = [partner for partner in partners
+              if partner.country.code != 'PL' and partner.country.code in EU_COUNTRY_CODES]
+        eu_results = VATVerificationService.verify_eu_vats(
+            [(partner.country.code, partner.vat_number) for partner in eu])
+
+        results = list(executor.map(
+            PartnerVATReverificationService._verify,
+            [partner for partner in partners
+             if partner.country.code not in EU_COUNTRY_CODES]))
+        for partner in eu:
+            success, data, message, verification_id = eu_results[
+                (partner.country.code, partner.vat_number)]
+            results.append((partner, bool(success and data), message, verification_id))
+        for chunk_results in polish_results:
+            results.extend(chunk_results)
+
+        now = timezone.now()
+        verified = []
+        updated = []
+        history = []
+        for partner, success, message, verification_id in results:
+            history.append(VATVerificationHistory(
+                partner=partner,
+                is_verified=success,
+                verification_id=verification_id if success else None,
+                message=message,
+            ))
+            if success:
+                partner.is_verified = True
+                partner.verification_date = now
+                partner.verification_id = verification_id
+                partner.updated_at = now
+                verified.append(partner)
+                updated.append(partner)
+            elif message in NOT_FOUND_MESSAGES:
+                partner.is_verified = False
+                partner.verification_date = now
+                partner.verification_id = None
+                partner.updated_at = now
+                updated.append(partner)
+
+        with transaction.atomic():
+            VATVerificationHistory.objects.bulk_create(history)
+            if updated:
+                Partner.objects.bulk_update(
+                    updated,
+                    ['is_verified', 'verification_date', 'verification_id', 'updated_at'])
+
+        return len(verified), len(results) - len(verified)
+
+    @staticmethod
+    def run(partners, workers=None, batch_size=None, on_batch=None):
+        """
+        Weryfikuje wszystkich kontrahentów z querysetu paczkami
+
+        Args:
+            partners (QuerySet): Kontrahenci do weryfikacji, np. z ``due_partners``
+            workers (int, optional): Liczba równoległych zapytań do API
+            batch_size (int, optional): Liczba kontrahentów w paczce
+            on_batch (callable, optional): Wywoływane po każdej paczce
+                ze słownikiem statystyk
+
+        Returns:
+            dict: ``processed``, ``verified``, ``failed``, ``elapsed``, ``rate``
+                (kontrahentów na sekundę) i ``last_pk``
+        """
+        workers = workers or PartnerVATReverificationService.get_worker_count()
+        batch_size = batch_size or PartnerVATReverificationService.get_batch_size()
+        stats = {'processed': 0, 'verified': 0, 'failed': 0,
+                 'elapsed': 0.0, 'rate': 0.0, 'last_pk': None}
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for pks in iter_pk_batches(partners, batch_size):
+                batch = list(Partner.objects.filter(pk__in=pks).order_by('pk'))
+                verified, failed = PartnerVATReverificationService.verify_batch(batch, executor)
+
+                stats['processed'] += len(batch)
+                stats['verified'] += verified
+                stats['failed'] += failed
+                stats['last_pk'] = pks[-1]
+                stats['elapsed'] = time.monotonic() - started
+                stats['rate'] = stats['processed'] / stats['elapsed'] if stats['elapsed'] else 0.0
+                if on_batch:
+                    on_batch(dict(stats))
+
+        logger.info(
+            f"VAT re-verification finished: {stats['processed']} partners, "
+            f"{stats['verified']} verified, {stats['failed']} failed, "
+            f"{stats['rate']:.1f} partners/s")
+        return stats
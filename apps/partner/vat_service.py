@@ -1,12 +1,14 @@
 # vat_service.py
-import requests
 from django.utils import timezone
 
+from apps.core import http_clients
+
 
 class VATService:
     """Serwis do komunikacji z API Wykazu Podatników VAT"""
 
     BASE_URL = "https://wl-api.mf.gov.pl/api/search"
+    NOT_FOUND_MESSAGE = "Podmiot nie został znaleziony w bazie VAT"
 
     @staticmethod
     def verify_vat(nip):
@@ -20,7 +22,7 @@ class VATService:
 
             # Wywołanie API
             url = f"{VATService.BASE_URL}/nip/{nip}?date={today}"
-            response = requests.get(url, timeout=10)
+            response = http_clients.request('mf', 'GET', url, timeout=(3.05, 10))
 
             if response.status_code == 200:
                 data = response.json()
@@ -58,7 +60,7 @@ class VATService:
 
                     return True, result, "Podmiot odnaleziony w bazie VAT", result['verification_id']
                 else:
-                    return False, None, "Podmiot nie został znaleziony w bazie VAT", None
+                    return False, None, VATService.NOT_FOUND_MESSAGE, None
             else:
                 return False, None, f"Błąd API: {response.status_code}", None
 
@@ -18,6 +18,7 @@ from .forms import PartnerCreateForm, PartnerFilterForm
 from .vat_service import VATService
 from .utils import add_to_context
 
+from apps.subscriber.filter_options import get_partner_cities
 from apps.subscriber.models import Subscriber
 from apps.core.vat_verification import VATVerificationService
 
@@ -95,11 +96,8 @@ class PartnerListView(LoginRequiredMixin, ListView):
             'page_size', str(self.paginate_by))
         context['default_page_size'] = str(self.paginate_by)
 
-        # Pobierz unikalne miasta dla filtra
-        # Wykorzystaj set comprehension dla unikalnych wartości i posortuj
-        cities = sorted({p.city for p in Partner.objects.filter(
-            city__isnull=False).exclude(city='')})
-        context['cities'] = cities
+        # Unikalne miasta dla filtra (z cache, unieważniane sygnałami)
+        context['cities'] = get_partner_cities()
 
         return context
 
@@ -291,7 +289,9 @@ def fetch_mf_data(request):
         })
 
     # Wywołanie serwisu do weryfikacji VAT
-    success, data, message, verification_id = VATService.verify_vat(nip)
+    success, data, message, verification_id = VATVerificationService.cached_lookup(
+        'wl', 'PL', nip, lambda: VATService.verify_vat(nip),
+        not_found_messages=(VATService.NOT_FOUND_MESSAGE,))
 
     return JsonResponse({
         'success': success,
@@ -318,8 +318,8 @@ def fetch_vies_data(request):
 
     # Wywołaj serwis weryfikacji VAT
     from apps.core.vat_verification import VATVerificationService
-    success, data, message, verification_id = VATVerificationService._verify_eu_vat(
-        country, vat)
+    success, data, message, verification_id = VATVerificationService.cached_lookup(
+        'vies', country, vat, lambda: VATVerificationService._verify_eu_vat(country, vat))
 
     if success and data:
         return JsonResponse({
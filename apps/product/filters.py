@@ -0,0 +1,54 @@
+# apps/product/filters.py
+
+from django.db.models import Q
+
+
+def filter_products(queryset, params):
+    """
+    Filtruje produkty według parametrów listy produktów
+
+    Używane przez listę oraz przez akcje masowe na wszystkich produktach
+    pasujących do filtra.
+
+    Args:
+        queryset (QuerySet): Produkty do przefiltrowania
+        params (QueryDict): Parametry filtra (category, brand, status, featured, search)
+
+    Returns:
+        QuerySet: Przefiltrowane produkty
+    """
+    # Filtrowanie po kategorii
+    category_slugs = params.getlist('category')
+    if category_slugs:
+        queryset = queryset.filter(category__slug__in=category_slugs)
+
+    # Filtrowanie po marce
+    brand_slugs = params.getlist('brand')
+    if brand_slugs:
+        queryset = queryset.filter(brand__slug__in=brand_slugs)
+
+    # Filtrowanie po statusie aktywności
+    status = params.get('status')
+    if status == '1':
+        queryset = queryset.filter(is_active=True)
+    elif status == '0':
+        queryset = queryset.filter(is_active=False)
+
+    # Filtrowanie po statusie wyróżnienia
+    featured = params.get('featured')
+    if featured == '1':
+        queryset = queryset.filter(is_featured=True)
+    elif featured == '0':
+        queryset = queryset.filter(is_featured=False)
+
+    # Wyszukiwanie
+    search_query = params.get('search')
+    if search_query:
+        queryset = queryset.filter(
+            Q(name__icontains=search_query) |
+            Q(sku__icontains=search_query) |
+            Q(ean__icontains=search_query) |
+            Q(altum_id__icontains=search_query)
+        )
+
+    return queryset
@@ -4,12 +4,17 @@ from django.contrib import messages
 from django.views.generic import ListView, DetailView
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy, reverse
-from django.db.models import Q
+from django.http import QueryDict
 from django.views.decorators.http import require_POST
 from django.contrib.messages.views import SuccessMessageMixin
 
+from apps.core.utils import iter_pk_batches
 from .models import Product, ProductCategory, Brand, ProductImage
 from .forms import ProductForm, ProductCategoryForm, BrandForm
+from .filters import filter_products
+
+# Rozmiar paczki dla akcji masowych na wszystkich produktach z filtra
+PRODUCT_BULK_BATCH_SIZE = 1000
 
 # Widoki dla produktów
 
@@ -41,41 +46,7 @@ class ProductListView(ListView):
         return context
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-
-        # Filtrowanie po kategorii
-        category_slugs = self.request.GET.getlist('category')
-        if category_slugs:
-            queryset = queryset.filter(category__slug__in=category_slugs)
-
-        # Filtrowanie po marce
-        brand_slugs = self.request.GET.getlist('brand')
-        if brand_slugs:
-            queryset = queryset.filter(brand__slug__in=brand_slugs)
-
-        # Filtrowanie po statusie aktywności
-        status = self.request.GET.get('status')
-        if status == '1':
-            queryset = queryset.filter(is_active=True)
-        elif status == '0':
-            queryset = queryset.filter(is_active=False)
-
-        # Filtrowanie po statusie wyróżnienia
-        featured = self.request.GET.get('featured')
-        if featured == '1':
-            queryset = queryset.filter(is_featured=True)
-        elif featured == '0':
-            queryset = queryset.filter(is_featured=False)
-
-        # Wyszukiwanie
-        search_query = self.request.GET.get('search')
-        if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) |
-                Q(sku__icontains=search_query) |
-                Q(ean__icontains=search_query) |
-                Q(altum_id__icontains=search_query)
-            )
+        queryset = filter_products(super().get_queryset(), self.request.GET)
 
         # Ustaw rozmiar strony (paginacja)
         page_size = self.request.GET.get('page_size')
@@ -370,41 +341,55 @@ def product_bulk_action(request):
     """Widok do obsługi masowych akcji na produktach"""
     product_ids = request.POST.getlist('product_ids')
     bulk_action = request.POST.get('bulk_action')
+    # Akcja na wszystkich produktach pasujących do filtra listy
+    select_all_matching = request.POST.get('select_all_matching') == '1'
 
-    if not product_ids:
+    if not product_ids and not select_all_matching:
         messages.error(request, "Nie wybrano żadnych produktów.")
         return redirect('product:product_list')
 
     # Pobierz produkty
-    products = Product.objects.filter(id__in=product_ids)
+    if select_all_matching:
+        products = filter_products(
+            Product.objects.all(), QueryDict(request.POST.get('filter_query', '')))
+    else:
+        products = Product.objects.filter(id__in=product_ids)
+
+    def apply(action):
+        # Dla całego filtra identyfikatory są pobierane paczkami po stronie serwera
+        if not select_all_matching:
+            return action(products)
+        return sum(
+            action(Product.objects.filter(pk__in=pks))
+            for pks in iter_pk_batches(products, PRODUCT_BULK_BATCH_SIZE)
+        )
 
     # Wykonaj odpowiednią akcję
     if bulk_action == 'delete':
         # Opcjonalnie: dodatkowe sprawdzenie potwierdzenia
         if request.POST.get('confirm_delete') == 'yes':
-            count = products.count()
-            products.delete()
+            count = apply(lambda batch: batch.delete()[1].get(Product._meta.label, 0))
             messages.success(request, f"Pomyślnie usunięto {count} produktów.")
 
     elif bulk_action == 'status_active':
-        products.update(is_active=True)
+        count = apply(lambda batch: batch.update(is_active=True))
         messages.success(
-            request, f"Pomyślnie zaktualizowano status {len(product_ids)} produktów na 'Aktywny'.")
+            request, f"Pomyślnie zaktualizowano status {count} produktów na 'Aktywny'.")
 
     elif bulk_action == 'status_inactive':
-        products.update(is_active=False)
+        count = apply(lambda batch: batch.update(is_active=False))
         messages.success(
-            request, f"Pomyślnie zaktualizowano status {len(product_ids)} produktów na 'Nieaktywny'.")
+            request, f"Pomyślnie zaktualizowano status {count} produktów na 'Nieaktywny'.")
 
     elif bulk_action == 'featured_yes':
-        products.update(is_featured=True)
+        count = apply(lambda batch: batch.update(is_featured=True))
         messages.success(
-            request, f"Pomyślnie oznaczono {len(product_ids)} produktów jako 'Wyróżnione'.")
+            request, f"Pomyślnie oznaczono {count} produktów jako 'Wyróżnione'.")
 
     elif bulk_action == 'featured_no':
-        products.update(is_featured=False)
+        count = apply(lambda batch: batch.update(is_featured=False))
         messages.success(
-            request, f"Pomyślnie usunięto oznaczenie 'Wyróżnione' dla {len(product_ids)} produktów.")
+            request, f"Pomyślnie usunięto oznaczenie 'Wyróżnione' dla {count} produktów.")
 
     elif bulk_action == 'set_category':
         category_ids = request.POST.getlist('category_ids')
@@ -412,9 +397,9 @@ def product_bulk_action(request):
             category = ProductCategory.objects.filter(
                 id=category_ids[0]).first()
             if category:
-                products.update(category=category)
+                count = apply(lambda batch: batch.update(category=category))
                 messages.success(
-                    request, f"Pomyślnie ustawiono kategorię '{category.name}' dla {len(product_ids)} produktów.")
+                    request, f"Pomyślnie ustawiono kategorię '{category.name}' dla {count} produktów.")
             else:
                 messages.error(request, "Wybrana kategoria nie istnieje.")
         else:
@@ -425,9 +410,9 @@ def product_bulk_action(request):
         if brand_ids:
             brand = Brand.objects.filter(id=brand_ids[0]).first()
             if brand:
-                products.update(brand=brand)
+                count = apply(lambda batch: batch.update(brand=brand))
                 messages.success(
-                    request, f"Pomyślnie ustawiono markę '{brand.name}' dla {len(product_ids)} produktów.")
+                    request, f"Pomyślnie ustawiono markę '{brand.name}' dla {count} produktów.")
             else:
                 messages.error(request, "Wybrana marka nie istnieje.")
         else:
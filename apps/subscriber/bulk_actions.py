@@ -0,0 +1,325 @@
+# apps/subscriber/bulk_actions.py
+
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.core.utils import iter_pk_batches
+from apps.partner.models import Partner, PartnerEmail
+from .models import Subscriber, SubscriberGroup
+from .search import refresh_search_documents, signal_refresh_suspended
+
+logger = logging.getLogger(__name__)
+
+BULK_INSERT_BATCH_SIZE = 1000
+
+
+class SubscriberBulkActionService:
+    """
+    Masowe operacje na zaznaczonych subskrybentach.
+
+    Każda operacja działa na querysecie subskrybentów i wykonuje stałą
+    liczbę zapytań niezależnie od liczby zaznaczonych wierszy: ``UPDATE``
+    z warunkiem, wstawianie brakujących powiązań paczkami albo ``DELETE``
+    z warunkiem. Zwracana jest liczba zmienionych wierszy (subskrybentów
+    lub powiązań), a nie liczba zaznaczonych.
+    """
+
+    @staticmethod
+    def get_batch_size():
+        return getattr(settings, 'SUBSCRIBER_BULK_ACTION_BATCH_SIZE', 1000)
+
+    @staticmethod
+    def apply_in_batches(subscribers, action, *args, batch_size=None, **kwargs):
+        """
+        Wykonuje akcję paczkami na wszystkich subskrybentach z querysetu
+
+        Służy do akcji na wszystkich subskrybentach pasujących do filtra
+        listy - identyfikatory są pobierane po stronie serwera paczka po
+        paczce, a każda paczka jest osobną transakcją.
+
+        Args:
+            subscribers (QuerySet): Subskrybenci pasujący do filtra
+            action (callable): Metoda serwisu, np. ``set_consent``
+
+        Returns:
+            int: Suma liczb zwróconych przez akcję dla kolejnych paczek
+        """
+        batch_size = batch_size or SubscriberBulkActionService.get_batch_size()
+        total = 0
+        for pks in iter_pk_batches(subscribers, batch_size):
+            total += action(Subscriber.objects.filter(pk__in=pks), *args, **kwargs)
+        return total
+
+    @staticmethod
+    def selected(subscriber_ids):
+        """
+        Zwraca queryset subskrybentów o podanych identyfikatorach
+
+        Args:
+            subscriber_ids (list): Identyfikatory z formularza (mogą być tekstem)
+
+        Returns:
+            QuerySet: Zaznaczeni subskrybenci
+        """
+        ids = [int(pk) for pk in subscriber_ids if str(pk).isdigit()]
+        return Subscriber.objects.filter(pk__in=ids)
+
+    @staticmethod
+    @transaction.atomic
+    def set_consent(subscribers, consent, user=None):
+        """
+        Ustawia zgodę na newsletter
+
+        Returns:
+            int: Liczba zaktualizowanych subskrybentów
+        """
+        return subscribers.order_by().update(
+            newsletter_consent=consent, updated_at=timezone.now(), updated_by=user)
+
+    @staticmethod
+    @transaction.atomic
+    def add_to_groups(subscribers, groups):
+        """
+        Dodaje subskrybentów do grup (istniejące powiązania są pomijane)
+
+        Returns:
+            int: Liczba utworzonych powiązań
+        """
+        through = Subscriber.group_affiliation.through
+        subscriber_ids = list(subscribers.order_by().values_list('pk', flat=True))
+        group_ids = [group.pk for group in groups]
+        existing = set(through.objects.filter(
+            subscriber_id__in=subscriber_ids, subscribergroup_id__in=group_ids
+        ).values_list('subscriber_id', 'subscribergroup_id'))
+        links = [
+            through(subscriber_id=subscriber_id, subscribergroup_id=group_id)
+            for subscriber_id in subscriber_ids
+            for group_id in group_ids
+            if (subscriber_id, group_id) not in existing
+        ]
+        through.objects.bulk_create(
+            links, batch_size=BULK_INSERT_BATCH_SIZE, ignore_conflicts=True)
+        refresh_search_documents({link.subscriber_id for link in links})
+        return len(links)
+
+    @staticmethod
+    @transaction.atomic
+    def remove_from_groups(subscribers, groups):
+        """
+        Usuwa subskrybentów z grup
+
+        Returns:
+            int: Liczba usuniętych powiązań
+        """
+        through = Subscriber.group_affiliation.through
+        subscriber_ids = list(subscribers.order_by().values_list('pk', flat=True))
+        deleted, _ = through.objects.filter(
+            subscriber_id__in=subscriber_ids,
+            subscribergroup_id__in=[group.pk for group in groups]
+        ).delete()
+        refresh_search_documents(subscriber_ids)
+        return deleted
+
+    @staticmethod
+    @transaction.atomic
+    def add_to_partners(subscribers, partners, user=None):
+        """
+        Wiąże subskrybentów z partnerami (istniejące powiązania są pomijane)
+
+        Returns:
+            int: Liczba utworzonych powiązań
+        """
+        subscriber_ids = list(subscribers.order_by().values_list('pk', flat=True))
+        partner_ids = [partner.pk for partner in partners]
+        existing = set(PartnerEmail.objects.filter(
+            subscriber_id__in=subscriber_ids, partner_id__in=partner_ids
+        ).values_list('subscriber_id', 'partner_id'))
+        links = [
+            PartnerEmail(partner_id=partner_id, subscriber_id=subscriber_id, created_by=user)
+            for subscriber_id in subscriber_ids
+            for partner_id in partner_ids
+            if (subscriber_id, partner_id) not in existing
+        ]
+        PartnerEmail.objects.bulk_create(
+            links, batch_size=BULK_INSERT_BATCH_SIZE, ignore_conflicts=True)
+        refresh_search_documents({link.subscriber_id for link in links})
+        return len(links)
+
+    @staticmethod
+    @transaction.atomic
+    def remove_from_partners(subscribers, partners):
+        """
+        Usuwa powiązania subskrybentów z partnerami
+
+        Returns:
+            int: Liczba usuniętych powiązań
+        """
+        subscriber_ids = list(subscribers.order_by().values_list('pk', flat=True))
+        with signal_refresh_suspended():
+            deleted, _ = PartnerEmail.objects.filter(
+                subscriber_id__in=subscriber_ids,
+                partner_id__in=[partner.pk for partner in partners]
+            ).delete()
+        refresh_search_documents(subscriber_ids)
+        return deleted
+
+    @staticmethod
+    @transaction.atomic
+    def delete(subscribers):
+        """
+        Usuwa subskrybentów razem z ich powiązaniami
+
+        Returns:
+            int: Liczba usuniętych subskrybentów
+        """
+        _, deleted = subscribers.order_by().delete()
+        count = deleted.get(Subscriber._meta.label, 0)
+        logger.info(f"Deleted {count} subscribers")
+        return count
+
+    @staticmethod
+    @transaction.atomic
+    def update_sheet(changes, fields, user=None):
+        """
+        Zapisuje zmiany z arkusza edycji zbiorczej
+
+        Subskrybenci, zajęte adresy email oraz bieżące powiązania z grupami
+        i partnerami są pobierane jednym zapytaniem każde. Zapisywane są
+        tylko wiersze, w których coś się zmieniło, i tylko zmienione pola;
+        powiązania są zmieniane różnicowo przez tabele pośrednie.
+
+        Args:
+            changes (dict): ID subskrybenta -> wartości z arkusza (``partner_ids``
+                i ``group_ids`` jako zbiory identyfikatorów)
+            fields (list): Pola zaznaczone do aktualizacji
+            user (User, optional): Użytkownik wprowadzający zmiany
+
+        Returns:
+            dict: ``updated`` - liczba zmienionych subskrybentów,
+                ``conflicts`` - adresy email zajęte przez innych subskrybentów
+        """
+        subscribers = Subscriber.objects.in_bulk(list(changes))
+        changed_ids = set()
+        conflicts = []
+
+        # Adresy email zajęte przez innych subskrybentów - jedno zapytanie
+        email_owners = {}
+        if 'email' in fields:
+            new_emails = {
+                values.get('email') for values in changes.values() if values.get('email')}
+            email_owners = dict(
+                Subscriber.objects.filter(email__in=new_emails).values_list('email', 'pk'))
+
+        # Różnice w polach podstawowych, pogrupowane po zestawie zmienionych pól
+        text_fields = [
+            field for field in ('common_name', 'first_name', 'last_name', 'newsletter_consent')
+            if field in fields]
+        by_changed_fields = {}
+        skipped_ids = set()
+        now = timezone.now()
+        for subscriber_id, subscriber in subscribers.items():
+            values = changes[subscriber_id]
+            changed_fields = []
+
+            new_email = values.get('email') if 'email' in fields else None
+            if new_email and new_email != subscriber.email:
+                owner_id = email_owners.get(new_email)
+                if owner_id is not None and owner_id != subscriber_id:
+                    conflicts.append(new_email)
+                    skipped_ids.add(subscriber_id)
+                    continue
+                # Kolejny wiersz arkusza nie może przejąć tego samego adresu
+                email_owners[new_email] = subscriber_id
+                subscriber.email = new_email
+                changed_fields.append('email')
+
+            for field in text_fields:
+                new_value = values.get(field)
+                if new_value is not None and new_value != getattr(subscriber, field):
+                    setattr(subscriber, field, new_value)
+                    changed_fields.append(field)
+
+            if changed_fields:
+                subscriber.updated_at = now
+                subscriber.updated_by = user
+                by_changed_fields.setdefault(
+                    tuple(changed_fields) + ('updated_at', 'updated_by'), []).append(subscriber)
+                changed_ids.add(subscriber_id)
+
+        for update_fields, rows in by_changed_fields.items():
+            Subscriber.objects.bulk_update(
+                rows, list(update_fields), batch_size=BULK_INSERT_BATCH_SIZE)
+
+        linked_ids = [pk for pk in subscribers if pk not in skipped_ids]
+
+        if 'group_ids' in fields:
+            through = Subscriber.group_affiliation.through
+            changed_ids |= SubscriberBulkActionService._relink(
+                through.objects.filter(subscriber_id__in=linked_ids),
+                'subscribergroup_id',
+                SubscriberBulkActionService._wanted_links(
+                    changes, linked_ids, 'group_ids', SubscriberGroup),
+                lambda subscriber_id, group_id: through(
+                    subscriber_id=subscriber_id, subscribergroup_id=group_id),
+            )
+
+        if 'partner_ids' in fields:
+            changed_ids |= SubscriberBulkActionService._relink(
+                PartnerEmail.objects.filter(subscriber_id__in=linked_ids),
+                'partner_id',
+                SubscriberBulkActionService._wanted_links(
+                    changes, linked_ids, 'partner_ids', Partner),
+                lambda subscriber_id, partner_id: PartnerEmail(
+                    subscriber_id=subscriber_id, partner_id=partner_id, created_by=user),
+            )
+
+        refresh_search_documents(changed_ids)
+        return {'updated': len(changed_ids), 'conflicts': conflicts}
+
+    @staticmethod
+    def _wanted_links(changes, subscriber_ids, key, target_model):
+        """Oczekiwane powiązania z pominięciem nieistniejących obiektów docelowych"""
+        wanted = {pk: set(changes[pk].get(key, ())) for pk in subscriber_ids}
+        existing = set(target_model.objects.filter(
+            pk__in=set().union(*wanted.values())).values_list('pk', flat=True))
+        return {pk: target_ids & existing for pk, target_ids in wanted.items()}
+
+    @staticmethod
+    def _relink(links, target_field, wanted, make_link):
+        """
+        Doprowadza powiązania subskrybentów do oczekiwanego stanu
+
+        Bieżące powiązania są pobierane jednym zapytaniem, zbędne usuwane
+        jednym ``DELETE``, a brakujące wstawiane paczkami.
+
+        Returns:
+            set: ID subskrybentów, których powiązania się zmieniły
+        """
+        current = {}
+        for link_id, subscriber_id, target_id in links.values_list(
+                'pk', 'subscriber_id', target_field):
+            current.setdefault(subscriber_id, {})[target_id] = link_id
+
+        to_delete = []
+        to_create = []
+        changed_ids = set()
+        for subscriber_id, target_ids in wanted.items():
+            existing = current.get(subscriber_id, {})
+            removed = [
+                link_id for target_id, link_id in existing.items() if target_id not in target_ids]
+            added = [target_id for target_id in target_ids if target_id not in existing]
+            if removed or added:
+                changed_ids.add(subscriber_id)
+            to_delete.extend(removed)
+            to_create.extend(make_link(subscriber_id, target_id) for target_id in added)
+
+        if to_delete:
+            with signal_refresh_suspended():
+                links.model.objects.filter(pk__in=to_delete).delete()
+        if to_create:
+            links.model.objects.bulk_create(
+                to_create, batch_size=BULK_INSERT_BATCH_SIZE, ignore_conflicts=True)
+        return changed_ids
@@ -0,0 +1,64 @@
+# apps/subscriber/filter_options.py
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.partner.models import Partner
+from .models import SubscriberGroup
+
+GROUPS_CACHE_KEY = 'filter_options:subscriber_groups'
+PARTNERS_CACHE_KEY = 'filter_options:partners'
+PARTNER_CITIES_CACHE_KEY = 'filter_options:partner_cities'
+
+
+def _cached(cache_key, loader):
+    options = cache.get(cache_key)
+    if options is None:
+        options = loader()
+        cache.set(cache_key, options, getattr(settings, 'FILTER_OPTIONS_CACHE_SECONDS', 600))
+    return options
+
+
+def get_group_options():
+    """
+    Grupy subskrybentów do filtrów list
+
+    Opcje filtrów są trzymane w cache i unieważniane sygnałami przy zapisie
+    lub usunięciu grupy, więc wyświetlenie listy nie pobiera całej tabeli.
+
+    Returns:
+        list: Słowniki z kluczami ``id`` i ``group_name`` posortowane po nazwie
+    """
+    return _cached(GROUPS_CACHE_KEY, lambda: list(
+        SubscriberGroup.objects.order_by('group_name').values('id', 'group_name')))
+
+
+def get_partner_options():
+    """
+    Partnerzy do filtrów list
+
+    Returns:
+        list: Słowniki z kluczami ``id`` i ``name`` posortowane po nazwie
+    """
+    return _cached(PARTNERS_CACHE_KEY, lambda: list(
+        Partner.objects.order_by('name').values('id', 'name')))
+
+
+def get_partner_cities():
+    """
+    Unikalne miasta partnerów do filtra listy partnerów
+
+    Returns:
+        list: Posortowane nazwy miast
+    """
+    return _cached(PARTNER_CITIES_CACHE_KEY, lambda: list(
+        Partner.objects.filter(city__isnull=False).exclude(city='')
+        .order_by('city').values_list('city', flat=True).distinct()))
+
+
+def invalidate_group_options():
+    cache.delete(GROUPS_CACHE_KEY)
+
+
+def invalidate_partner_options():
+    cache.delete_many([PARTNERS_CACHE_KEY, PARTNER_CITIES_CACHE_KEY])
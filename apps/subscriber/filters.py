@@ -0,0 +1,52 @@
+# apps/subscriber/filters.py
+
+from .search import search_subscribers
+
+
+FILTER_PARAMS = ('search', 'group', 'partner', 'consent')
+
+
+def has_subscriber_filters(params):
+    """Czy w parametrach listy jest aktywny filtr"""
+    return any(params.get(name, '') not in ('', None) for name in FILTER_PARAMS)
+
+
+def filter_subscribers(queryset, params):
+    """
+    Filtruje subskrybentów według parametrów listy subskrybentów
+
+    Używane przez listę oraz przez akcje masowe na wszystkich
+    subskrybentach pasujących do filtra.
+
+    Args:
+        queryset (QuerySet): Subskrybenci do przefiltrowania
+        params (QueryDict): Parametry filtra (search, group, partner, consent)
+
+    Returns:
+        QuerySet: Przefiltrowani subskrybenci
+    """
+    search_query = params.get('search', '')
+    group_id = params.get('group', '')
+    partner_id = params.get('partner', '')
+    consent = params.get('consent', '')
+
+    # Apply search filter - jedna kolumna z dokumentem wyszukiwania zamiast
+    # złączeń z partnerami i grupami
+    if search_query:
+        queryset = search_subscribers(queryset, search_query)
+
+    # Apply group filter
+    if group_id:
+        queryset = queryset.filter(group_affiliation__id=group_id)
+
+    # Apply partner filter
+    if partner_id:
+        queryset = queryset.filter(partnered_with__id=partner_id)
+
+    # Apply consent filter
+    if consent in ['0', '1']:
+        queryset = queryset.filter(newsletter_consent=(consent == '1'))
+
+    # Filtry grupy i partnera łączą po jednym wierszu tabel pośrednich
+    # (unikalne pary), więc wyniki nie wymagają DISTINCT
+    return queryset
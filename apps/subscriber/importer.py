@@ -0,0 +1,641 @@
+# apps/subscriber/importer.py
+
+import logging
+from datetime import timedelta
+from itertools import islice
+
+import openpyxl
+import pandas as pd
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.partner.models import PartnerEmail
+from .models import Subscriber, SubscriberImportJob
+from .search import build_search_document, refresh_search_documents
+
+logger = logging.getLogger(__name__)
+
+# Aliasy nagłówków kolumn w importowanych plikach (po zamianie na małe litery)
+COLUMN_ALIASES = {
+    'email': ['email'],
+    'common_name': ['nazwa', 'common_name', 'name'],
+    'first_name': ['imię', 'imie', 'first_name'],
+    'last_name': ['nazwisko', 'last_name'],
+    'consent': ['zgoda', 'newsletter_consent', 'consent'],
+}
+
+NAME_FIELDS = ('common_name', 'first_name', 'last_name')
+
+# Zapisane wartości pól porównywane z danymi z pliku
+DB_COLUMNS = [f'{field}_db' for field in NAME_FIELDS] + ['newsletter_consent_db']
+
+# Aktualizacja grupami identycznych wartości, gdy grup jest co najmniej
+# tyle razy mniej niż zmienionych wierszy
+GROUPED_UPDATE_RATIO = 10
+
+CONSENT_TRUE = {'tak', 'yes', 't', 'y', 'true', '1'}
+CONSENT_FALSE = {'nie', 'no', 'n', 'false', '0'}
+
+
+class MissingEmailColumn(ValueError):
+    """Importowany plik nie zawiera kolumny z adresami email"""
+
+
+class ImportInterrupted(Exception):
+    """Import przerwany przez zatrzymanie workera - zlecenie wraca do kolejki"""
+
+
+def empty_result():
+    return {'imported': 0, 'updated': 0, 'skipped': 0, 'invalid': 0}
+
+
+def is_valid_email(email):
+    try:
+        validate_email(email)
+    except ValidationError:
+        return False
+    return True
+
+
+def parse_consent(value):
+    """
+    Zamienia wartość kolumny zgody na bool
+
+    Returns:
+        bool | None: None gdy wartość nie pozwala ustalić zgody
+    """
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        value = value.lower().strip()
+        if value in CONSENT_TRUE:
+            return True
+        if value in CONSENT_FALSE:
+            return False
+        return None
+    if isinstance(value, (int, float)) and not pd.isna(value):
+        return bool(value)
+    return None
+
+
+def clean_text_column(series, max_length=100):
+    """Zamienia brakujące wartości i 'nan' na pusty ciąg, przycina spacje"""
+    series = series.where(series.notna(), '').astype(str).str.strip()
+    series = series.mask(series.str.lower() == 'nan', '')
+    return series.str.slice(0, max_length)
+
+
+def iter_file_chunks(file_obj, chunk_size, file_name=None):
+    """
+    Zwraca kolejne paczki wierszy pliku jako DataFrame
+
+    Formaty inne niż CSV i XLSX (xls, ods) nie mają czytnika strumieniowego
+    i są wczytywane w całości, a następnie dzielone na paczki.
+    """
+    file_name = file_name or getattr(file_obj, 'name', None) or str(file_obj)
+    file_ext = file_name.rsplit('.', 1)[-1].lower()
+
+    if file_ext == 'csv':
+        yield from pd.read_csv(file_obj, encoding='utf-8', chunksize=chunk_size)
+
+    elif file_ext in ('xlsx', 'xlsm'):
+        workbook = openpyxl.load_workbook(file_obj, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [str(col) if col is not None else '' for col in header]
+            while True:
+                batch = list(islice(rows, chunk_size))
+                if not batch:
+                    break
+                yield pd.DataFrame.from_records(batch, columns=columns)
+        finally:
+            workbook.close()
+
+    else:
+        df = pd.read_excel(file_obj)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+
+
+class SubscriberImporter:
+    """
+    Import subskrybentów operujący na całych paczkach wierszy.
+
+    Dane są normalizowane i walidowane kolumnami (pandas), a każda paczka
+    wymaga stałej liczby zapytań: jedno wyszukanie istniejących adresów
+    (``email__in``), ``bulk_create`` nowych, ``bulk_update`` istniejących
+    oraz zbiorcze wstawienie powiązań z grupami i partnerami.
+    """
+
+    def __init__(self, newsletter_consent=True, groups=(), partners=(),
+                 duplicate_action='skip', user=None, chunk_size=None):
+        self.newsletter_consent = newsletter_consent
+        self.groups = list(groups)
+        self.partners = list(partners)
+        self.duplicate_action = duplicate_action
+        self.user = user if getattr(user, 'is_authenticated', False) else None
+        self.chunk_size = chunk_size or getattr(
+            settings, 'SUBSCRIBER_IMPORT_CHUNK_SIZE', 5000)
+        # Nowi subskrybenci mają tylko powiązania z importu
+        self.partner_terms = [
+            term for partner in self.partners for term in (partner.name, partner.vat_number)]
+        self.group_names = [group.group_name for group in self.groups]
+
+    @staticmethod
+    def normalize_columns(df):
+        """
+        Mapuje nagłówki pliku na nazwy pól importu
+
+        Raises:
+            MissingEmailColumn: Gdy plik nie zawiera kolumny email
+        """
+        columns = {col.lower(): col for col in df.columns}
+        renamed = {}
+        for field, aliases in COLUMN_ALIASES.items():
+            source = next((columns[alias] for alias in aliases if alias in columns), None)
+            if source is not None:
+                renamed[source] = field
+
+        if 'email' not in renamed.values():
+            raise MissingEmailColumn(
+                "Plik musi zawierać kolumnę z adresami email (nazwa kolumny powinna zawierać 'email')")
+        return df[list(renamed)].rename(columns=renamed)
+
+    def import_frame(self, df, result=None):
+        """
+        Importuje subskrybentów z DataFrame z kolumnami po normalize_columns
+
+        Args:
+            df (DataFrame): Wiersze do importu
+            result (dict, optional): Wynik, do którego są doliczane liczniki
+
+        Returns:
+            dict: Liczby zaimportowanych, zaktualizowanych, pominiętych i błędnych
+        """
+        result = result if result is not None else empty_result()
+        for start in range(0, len(df), self.chunk_size):
+            self._import_chunk(df.iloc[start:start + self.chunk_size], result)
+        return result
+
+    def import_file(self, file_obj, file_name=None, progress=None):
+        """
+        Importuje subskrybentów z pliku CSV/Excel czytanego paczkami
+
+        Plik nie jest wczytywany w całości do pamięci - CSV jest czytany
+        przez ``read_csv(chunksize=...)``, a XLSX w trybie tylko do odczytu
+        openpyxl. Każda paczka jest zapisywana we własnej transakcji.
+
+        Args:
+            file_obj: Plik (ścieżka lub obiekt plikowy)
+            file_name (str, optional): Nazwa pliku, gdy inna niż file_obj.name
+            progress (callable, optional): Wywoływane po każdej paczce
+                z liczbą przetworzonych wierszy i bieżącym wynikiem
+
+        Returns:
+            dict: Liczby zaimportowanych, zaktualizowanych, pominiętych i błędnych
+
+        Raises:
+            MissingEmailColumn: Gdy plik nie zawiera kolumny email
+        """
+        result = empty_result()
+        processed = 0
+        for chunk in iter_file_chunks(file_obj, self.chunk_size, file_name):
+            self.import_frame(self.normalize_columns(chunk), result)
+            processed += len(chunk)
+            logger.info(f"Subscriber import: {processed} rows processed")
+            if progress:
+                progress(processed, result)
+        return result
+
+    def import_emails(self, emails):
+        """Importuje listę adresów email (import z pola tekstowego)"""
+        df = pd.DataFrame({'email': list(emails)})
+        # Zgoda z formularza dotyczy także aktualizowanych subskrybentów
+        df['consent'] = self.newsletter_consent
+        return self.import_frame(df)
+
+    def _prepare(self, df, result):
+        """Normalizuje i waliduje paczkę, zwraca wiersze do zapisania"""
+        df = df.copy()
+        df['email'] = clean_text_column(df['email'], max_length=None)
+
+        empty = df['email'] == ''
+        result['skipped'] += int(empty.sum())
+        df = df[~empty]
+
+        valid = df['email'].map(is_valid_email).astype(bool)
+        result['invalid'] += int((~valid).sum())
+        df = df[valid]
+
+        # Powtórzony adres działa jak wiersz dla istniejącego subskrybenta -
+        # przy aktualizacji obowiązują dane z ostatniego wystąpienia
+        keep = 'last' if self.duplicate_action == 'update' else 'first'
+        duplicated = df.duplicated(subset='email', keep=keep)
+        result['updated' if self.duplicate_action == 'update' else 'skipped'] += int(duplicated.sum())
+        df = df[~duplicated]
+
+        for field in NAME_FIELDS:
+            if field in df:
+                df[field] = clean_text_column(df[field])
+        if 'consent' in df:
+            df['consent_present'] = df['consent'].notna()
+            df['consent'] = df['consent'].map(parse_consent).astype(object)
+        return df
+
+    def _import_chunk(self, df, result):
+        df = self._prepare(df, result)
+        if df.empty:
+            return
+
+        with transaction.atomic():
+            existing = pd.DataFrame.from_records(
+                Subscriber.objects.filter(email__in=df['email'].tolist()).values_list(
+                    'email', 'id', *NAME_FIELDS, 'newsletter_consent'),
+                columns=['email', 'id', *DB_COLUMNS])
+            df = df.merge(existing, on='email', how='left')
+            is_new = df['id'].isna()
+            new_rows = df[is_new]
+            existing_rows = df[~is_new]
+
+            linked_ids = self._create(new_rows)
+            result['imported'] += len(new_rows)
+
+            if self.duplicate_action == 'update':
+                self._update(existing_rows)
+                result['updated'] += len(existing_rows)
+                linked_ids += existing_rows['id'].astype(int).tolist()
+            else:
+                result['skipped'] += len(existing_rows)
+
+            self._link(linked_ids)
+            if self.duplicate_action == 'update':
+                refresh_search_documents(existing_rows['id'].astype(int).tolist())
+
+    def _create(self, rows):
+        """Tworzy nowych subskrybentów, zwraca ich identyfikatory"""
+        if rows.empty:
+            return []
+
+        if 'consent' in rows:
+            # Nierozpoznana wartość zgody oznacza brak zgody
+            consent = rows['consent'].where(rows['consent'].notna(), False)
+            consent = consent.where(rows['consent_present'], self.newsletter_consent)
+        else:
+            consent = pd.Series(self.newsletter_consent, index=rows.index)
+
+        subscribers = [
+            Subscriber(
+                email=email,
+                common_name=common_name,
+                first_name=first_name,
+                last_name=last_name,
+                newsletter_consent=bool(newsletter_consent),
+                search_document=build_search_document(
+                    email, first_name, last_name, common_name,
+                    self.partner_terms, self.group_names),
+                created_by=self.user,
+            )
+            for email, common_name, first_name, last_name, newsletter_consent in zip(
+                rows['email'],
+                rows.get('common_name', pd.Series('', index=rows.index)),
+                rows.get('first_name', pd.Series('', index=rows.index)),
+                rows.get('last_name', pd.Series('', index=rows.index)),
+                consent,
+            )
+        ]
+        Subscriber.objects.bulk_create(
+            subscribers, batch_size=1000, ignore_conflicts=True)
+
+        # ignore_conflicts nie zwraca kluczy na wszystkich bazach
+        return list(Subscriber.objects.filter(
+            email__in=rows['email'].tolist()).values_list('id', flat=True))
+
+    def _update(self, rows):
+        """
+        Aktualizuje istniejących subskrybentów danymi z pliku
+
+        Nowe wartości są porównywane z zapisanymi kolumnami i zapisywane są
+        tylko zmienione wiersze. Gdy zmiany sprowadzają się do kilku zestawów
+        wartości (np. sama zmiana zgody), każdy zestaw to jeden
+        UPDATE ... WHERE id IN; w przeciwnym razie wiersze są zapisywane
+        przez ``bulk_create`` z aktualizacją przy konflikcie adresu email.
+        """
+        if rows.empty:
+            return
+
+        fields = [field for field in NAME_FIELDS if field in rows]
+        if 'consent' in rows:
+            fields.append('newsletter_consent')
+        if not fields:
+            return
+
+        # Pola spoza pliku zachowują zapisane wartości
+        updates = rows[['id', 'email']].copy()
+        for field in NAME_FIELDS:
+            updates[field] = rows[field] if field in rows else rows[f'{field}_db']
+        updates['newsletter_consent'] = rows['newsletter_consent_db'].astype(bool)
+        if 'consent' in rows:
+            # Nierozpoznana wartość zgody nie zmienia zapisanej
+            updates['newsletter_consent'] = rows['consent'].where(
+                rows['consent'].notna(), updates['newsletter_consent']).astype(bool)
+
+        changed_mask = pd.Series(False, index=rows.index)
+        for field in fields:
+            changed_mask |= updates[field] != rows[f'{field}_db']
+        changed = updates[changed_mask]
+        if changed.empty:
+            return
+
+        now = timezone.now()
+        groups = changed.groupby(fields, sort=False)['id']
+        if groups.ngroups <= max(1, len(changed) // GROUPED_UPDATE_RATIO):
+            for values, subscriber_ids in groups:
+                values = values if isinstance(values, tuple) else (values,)
+                Subscriber.objects.filter(pk__in=subscriber_ids.astype(int).tolist()).update(
+                    updated_at=now, updated_by=self.user,
+                    **{field: (bool(value) if field == 'newsletter_consent' else value)
+                       for field, value in zip(fields, values)})
+            return
+
+        subscribers = [
+            Subscriber(
+                email=row.email,
+                common_name=row.common_name,
+                first_name=row.first_name,
+                last_name=row.last_name,
+                newsletter_consent=row.newsletter_consent,
+                updated_at=now,
+                updated_by=self.user,
+            )
+            for row in changed.itertuples(index=False)
+        ]
+        update_fields = fields + ['updated_at', 'updated_by']
+        if connection.features.supports_update_conflicts_with_target:
+            Subscriber.objects.bulk_create(
+                subscribers, batch_size=1000, update_conflicts=True,
+                unique_fields=['email'], update_fields=update_fields)
+        else:
+            for subscriber, subscriber_id in zip(subscribers, changed['id']):
+                subscriber.pk = int(subscriber_id)
+            Subscriber.objects.bulk_update(subscribers, update_fields, batch_size=1000)
+
+    def _link(self, subscriber_ids):
+        """
+        Dodaje subskrybentów do wybranych grup i partnerów
+
+        Istniejące powiązania są pobierane jednym zapytaniem, więc ponowny
+        import tego samego pliku nie wstawia ich jeszcze raz.
+        """
+        if not subscriber_ids:
+            return
+
+        if self.groups:
+            through = Subscriber.group_affiliation.through
+            group_ids = [group.pk for group in self.groups]
+            linked = set(through.objects.filter(
+                subscriber_id__in=subscriber_ids, subscribergroup_id__in=group_ids
+            ).values_list('subscriber_id', 'subscribergroup_id'))
+            through.objects.bulk_create(
+                [
+                    through(subscriber_id=subscriber_id, subscribergroup_id=group_id)
+                    for subscriber_id in subscriber_ids
+                    for group_id in group_ids
+                    if (subscriber_id, group_id) not in linked
+                ],
+                batch_size=1000,
+                ignore_conflicts=True
+            )
+
+        if self.partners:
+            partner_ids = [partner.pk for partner in self.partners]
+            linked = set(PartnerEmail.objects.filter(
+                subscriber_id__in=subscriber_ids, partner_id__in=partner_ids
+            ).values_list('subscriber_id', 'partner_id'))
+            PartnerEmail.objects.bulk_create(
+                [
+                    PartnerEmail(
+                        partner_id=partner_id,
+                        subscriber_id=subscriber_id,
+                        created_by=self.user
+                    )
+                    for subscriber_id in subscriber_ids
+                    for partner_id in partner_ids
+                    if (subscriber_id, partner_id) not in linked
+                ],
+                batch_size=1000,
+                ignore_conflicts=True
+            )
+
+
+def count_file_rows(file_obj, file_name):
+    """
+    Szacuje liczbę wierszy danych w pliku bez wczytywania go do pamięci
+
+    Returns:
+        int | None: Liczba wierszy (bez nagłówka) lub None, gdy nieznana
+    """
+    file_ext = file_name.rsplit('.', 1)[-1].lower()
+    if file_ext == 'csv':
+        lines = 0
+        last_block = b''
+        for block in iter(lambda: file_obj.read(1024 * 1024), b''):
+            lines += block.count(b'\n')
+            last_block = block
+        if last_block and not last_block.endswith(b'\n'):
+            lines += 1
+        return max(0, lines - 1)
+
+    if file_ext in ('xlsx', 'xlsm'):
+        workbook = openpyxl.load_workbook(file_obj, read_only=True)
+        try:
+            max_row = workbook.active.max_row
+        finally:
+            workbook.close()
+        return max(0, max_row - 1) if max_row else None
+
+    return None
+
+
+class SubscriberImportJobService:
+    """
+    Serwis zleceń importu subskrybentów.
+
+    Widok zapisuje przesłany plik i tworzy zlecenie (submit), worker
+    z komendy ``process_subscriber_imports`` rezerwuje je (claim_next)
+    i wykonuje import paczkami (run), zapisując postęp po każdej paczce,
+    a strona importu odpytuje postęp (get_progress).
+    """
+
+    @staticmethod
+    def get_lease_timeout():
+        return timedelta(seconds=getattr(
+            settings, 'SUBSCRIBER_IMPORT_LEASE_SECONDS', 600))
+
+    @staticmethod
+    @transaction.atomic
+    def submit(uploaded_file, newsletter_consent, groups, partners, duplicate_action, user=None):
+        """
+        Tworzy zlecenie importu, zapisując przesłany plik na dysku
+
+        Returns:
+            SubscriberImportJob: Utworzone zlecenie
+        """
+        user = user if getattr(user, 'is_authenticated', False) else None
+        job = SubscriberImportJob(
+            file_name=uploaded_file.name,
+            newsletter_consent=newsletter_consent,
+            duplicate_action=duplicate_action,
+            created_by=user,
+        )
+        job.file.save(uploaded_file.name, uploaded_file, save=False)
+        job.save()
+        job.groups.set(groups)
+        job.partners.set(partners)
+
+        logger.info(f"Subscriber import job {job.pk} queued ({job.file_name})")
+        return job
+
+    @staticmethod
+    def claim_next(worker_id):
+        """
+        Rezerwuje najstarsze oczekujące zlecenie
+
+        Returns:
+            SubscriberImportJob | None: Zarezerwowane zlecenie
+        """
+        with transaction.atomic():
+            job = (
+                SubscriberImportJob.objects
+                .select_for_update(skip_locked=True)
+                .filter(status='pending')
+                .order_by('created_at', 'id')
+                .first()
+            )
+            if job is None:
+                return None
+
+            now = timezone.now()
+            # Warunek na status chroni przed podwójną rezerwacją na SQLite
+            if not SubscriberImportJob.objects.filter(pk=job.pk, status='pending').update(
+                    status='running', worker_id=worker_id, started_at=now, updated_at=now,
+                    processed_rows=0, imported=0, updated=0, skipped=0, invalid=0, error=''):
+                return None
+
+        job.refresh_from_db()
+        return job
+
+    @staticmethod
+    def run(job, should_stop=None):
+        """
+        Wykonuje import zlecenia i zapisuje postęp po każdej paczce
+
+        Args:
+            job (SubscriberImportJob): Zarezerwowane zlecenie
+            should_stop (callable, optional): Zwraca True gdy worker ma przerwać pracę
+
+        Returns:
+            dict: Wynik importu
+        """
+        importer = SubscriberImporter(
+            newsletter_consent=job.newsletter_consent,
+            groups=job.groups.all(),
+            partners=job.partners.all(),
+            duplicate_action=job.duplicate_action,
+            user=job.created_by,
+        )
+
+        def save_progress(processed, result):
+            SubscriberImportJob.objects.filter(pk=job.pk).update(
+                processed_rows=processed, updated_at=timezone.now(), **result)
+            if should_stop and should_stop():
+                raise ImportInterrupted()
+
+        try:
+            with job.file.open('rb') as file_obj:
+                total_rows = count_file_rows(file_obj, job.file_name)
+            SubscriberImportJob.objects.filter(pk=job.pk).update(total_rows=total_rows)
+
+            with job.file.open('rb') as file_obj:
+                result = importer.import_file(
+                    file_obj, file_name=job.file_name, progress=save_progress)
+
+        except ImportInterrupted:
+            logger.warning(f"Subscriber import job {job.pk} interrupted, requeued")
+            SubscriberImportJob.objects.filter(pk=job.pk).update(
+                status='pending', worker_id='', started_at=None, updated_at=timezone.now())
+            raise
+
+        except Exception as e:
+            logger.error(f"Subscriber import job {job.pk} failed: {str(e)}", exc_info=True)
+            SubscriberImportJob.objects.filter(pk=job.pk).update(
+                status='failed', error=str(e), finished_at=timezone.now(),
+                updated_at=timezone.now())
+            return None
+
+        SubscriberImportJob.objects.filter(pk=job.pk).update(
+            status='done', finished_at=timezone.now(), updated_at=timezone.now(), **result)
+        # Plik nie jest już potrzebny
+        job.file.delete(save=False)
+
+        logger.info(f"Subscriber import job {job.pk} finished: {result}")
+        return result
+
+    @staticmethod
+    def recover_stale(lease_timeout=None):
+        """
+        Przywraca do kolejki zlecenia porzucone przez workery, które przestały działać
+
+        Import jest idempotentny (istniejący subskrybenci są pomijani lub
+        aktualizowani), więc zlecenie jest wykonywane ponownie od początku.
+
+        Returns:
+            int: Liczba przywróconych zleceń
+        """
+        lease_timeout = lease_timeout or SubscriberImportJobService.get_lease_timeout()
+        requeued = SubscriberImportJob.objects.filter(
+            status='running', updated_at__lt=timezone.now() - lease_timeout
+        ).update(status='pending', worker_id='', started_at=None)
+        if requeued:
+            logger.warning(f"Requeued {requeued} stale subscriber import jobs")
+        return requeued
+
+    @staticmethod
+    def get_progress(job):
+        """
+        Zwraca postęp zlecenia dla strony importu
+
+        Returns:
+            dict: Status, liczniki i szacowany czas do końca (eta_seconds)
+        """
+        percent = None
+        eta_seconds = None
+        if job.total_rows:
+            percent = min(100.0, round(job.processed_rows / job.total_rows * 100, 1))
+            if job.status == 'running' and job.started_at and job.processed_rows:
+                elapsed = (timezone.now() - job.started_at).total_seconds()
+                remaining = max(0, job.total_rows - job.processed_rows)
+                eta_seconds = round(elapsed / job.processed_rows * remaining)
+        if job.status == 'done':
+            percent = 100.0
+            eta_seconds = 0
+
+        return {
+            'id': job.pk,
+            'status': job.status,
+            'file_name': job.file_name,
+            'total_rows': job.total_rows,
+            'processed_rows': job.processed_rows,
+            'percent': percent,
+            'imported': job.imported,
+            'updated': job.updated,
+            'skipped': job.skipped,
+            'invalid': job.invalid,
+            'error': job.error,
+            'eta_seconds': eta_seconds,
+        }
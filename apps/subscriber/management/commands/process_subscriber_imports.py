@@ -0,0 +1,70 @@
+# apps/subscriber/management/commands/process_subscriber_imports.py
+
+import logging
+import os
+import signal
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from apps.subscriber.importer import ImportInterrupted, SubscriberImportJobService
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Wykonuje zlecone w tle importy subskrybentów z plików"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=getattr(settings, 'SUBSCRIBER_IMPORT_POLL_SECONDS', 2.0),
+            help="Odstęp (w sekundach) między sprawdzeniami kolejki, gdy jest pusta")
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Wykonaj oczekujące zlecenia i zakończ działanie")
+
+    def handle(self, *args, **options):
+        self.stop_event = threading.Event()
+        signal.signal(signal.SIGINT, self._handle_signal)
+        signal.signal(signal.SIGTERM, self._handle_signal)
+
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.stdout.write(f"Subscriber import worker {worker_id} started")
+
+        processed = 0
+        while not self.stop_event.is_set():
+            close_old_connections()
+            SubscriberImportJobService.recover_stale()
+
+            job = SubscriberImportJobService.claim_next(worker_id)
+            if job is None:
+                if options['once']:
+                    break
+                self.stop_event.wait(options['poll_interval'])
+                continue
+
+            self.stdout.write(f"Importing {job.file_name} (job {job.pk})")
+            try:
+                result = SubscriberImportJobService.run(job, should_stop=self.stop_event.is_set)
+            except ImportInterrupted:
+                break
+
+            processed += 1
+            if result is None:
+                self.stdout.write(self.style.ERROR(f"Job {job.pk} failed"))
+            else:
+                self.stdout.write(
+                    f"Job {job.pk}: imported {result['imported']}, updated {result['updated']}, "
+                    f"skipped {result['skipped']} ({result['invalid']} invalid)")
+
+        connection.close()
+        self.stdout.write(self.style.SUCCESS(
+            f"Subscriber import worker stopped, {processed} jobs processed"))
+
+    def _handle_signal(self, signum, frame):
+        self.stdout.write("Stopping subscriber import worker...")
+        self.stop_event.set()
@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-18 01:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partner', '0009_partner_is_active_partneremail_is_active_and_more'),
+        ('subscriber', '0004_subscriber_is_active_subscribergroup_is_active'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubscriberImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Data utworzenia')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Data aktualizacji')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Aktywny')),
+                ('file', models.FileField(upload_to='subscriber_imports/%Y/%m/', verbose_name='File')),
+                ('file_name', models.CharField(max_length=255, verbose_name='File name')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10, verbose_name='Status')),
+                ('newsletter_consent', models.BooleanField(default=True, verbose_name='Email consent')),
+                ('duplicate_action', models.CharField(default='skip', max_length=10, verbose_name='Duplicate action')),
+                ('total_rows', models.PositiveIntegerField(blank=True, null=True, verbose_name='Total rows')),
+                ('processed_rows', models.PositiveIntegerField(default=0, verbose_name='Processed rows')),
+                ('imported', models.PositiveIntegerField(default=0, verbose_name='Imported')),
+                ('updated', models.PositiveIntegerField(default=0, verbose_name='Updated')),
+                ('skipped', models.PositiveIntegerField(default=0, verbose_name='Skipped')),
+                ('invalid', models.PositiveIntegerField(default=0, verbose_name='Invalid')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('worker_id', models.CharField(blank=True, max_length=100, verbose_name='Worker')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Started at')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finished at')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(app_label)s_%(class)s_created', to=settings.AUTH_USER_MODEL, verbose_name='Utworzony przez')),
+                ('groups', models.ManyToManyField(blank=True, related_name='import_jobs', to='subscriber.subscribergroup', verbose_name='Groups')),
+                ('partners', models.ManyToManyField(blank=True, related_name='subscriber_import_jobs', to='partner.partner', verbose_name='Partners')),
+                ('updated_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(app_label)s_%(class)s_updated', to=settings.AUTH_USER_MODEL, verbose_name='Zaktualizowany przez')),
+            ],
+            options={
+                'verbose_name': 'Import subskrybentów',
+                'verbose_name_plural': 'Importy subskrybentów',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='subscriber_import_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2 on 2026-10-18 02:03
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def create_trigram_index(apps, schema_editor):
+    # Indeks GIN z trigramami obsługuje LIKE '%...%' - tylko PostgreSQL
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS subscriber_search_trgm_idx '
+        'ON subscriber_subscriber USING gin (search_document gin_trgm_ops)')
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS subscriber_search_trgm_idx')
+
+
+def fill_search_documents(apps, schema_editor):
+    Subscriber = apps.get_model('subscriber', 'Subscriber')
+    PartnerEmail = apps.get_model('partner', 'PartnerEmail')
+    through = Subscriber.group_affiliation.through
+
+    last_pk = 0
+    while True:
+        rows = list(
+            Subscriber.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+                'pk', 'email', 'first_name', 'last_name', 'common_name')[:BATCH_SIZE])
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        batch = [row[0] for row in rows]
+
+        terms = {}
+        for subscriber_id, name, vat_number in PartnerEmail.objects.filter(
+                subscriber_id__in=batch).values_list(
+                    'subscriber_id', 'partner__name', 'partner__vat_number'):
+            terms.setdefault(subscriber_id, []).extend((name, vat_number))
+        for subscriber_id, group_name in through.objects.filter(
+                subscriber_id__in=batch).values_list('subscriber_id', 'subscribergroup__group_name'):
+            terms.setdefault(subscriber_id, []).append(group_name)
+
+        Subscriber.objects.bulk_update(
+            [
+                Subscriber(pk=pk, search_document=' '.join(
+                    str(value) for value in (email, first_name, last_name, common_name,
+                                             *terms.get(pk, ())) if value).lower())
+                for pk, email, first_name, last_name, common_name in rows
+            ],
+            ['search_document'],
+            batch_size=BATCH_SIZE
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partner', '0009_partner_is_active_partneremail_is_active_and_more'),
+        ('subscriber', '0005_subscriberimportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriber',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Search document'),
+        ),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 14:20
+
+from django.db import migrations
+
+
+def create_email_lower_index(apps, schema_editor):
+    # Indeks na LOWER(email) w collation "C" obsługuje zarówno LIKE 'abc%'
+    # (niezależnie od wielkości liter), jak i ORDER BY tego samego wyrażenia
+    # - text_pattern_ops nie nadaje się do sortowania. Tylko PostgreSQL
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS subscriber_email_lower_idx '
+        'ON subscriber_subscriber ((LOWER(email) COLLATE "C"))')
+
+
+def drop_email_lower_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS subscriber_email_lower_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriber', '0006_subscriber_search_document'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_email_lower_index, drop_email_lower_index),
+    ]
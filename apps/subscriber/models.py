@@ -18,6 +18,10 @@ class Subscriber(CoreModel):
         default=True, verbose_name='Email consent')
     group_affiliation = models.ManyToManyField(
         'SubscriberGroup', related_name='subscriber', blank=True, verbose_name='Group affiliation')
+    # Zdenormalizowany tekst do wyszukiwania (email, imię, nazwisko, partnerzy,
+    # grupy), utrzymywany przez apps.subscriber.search.refresh_search_documents
+    search_document = models.TextField(
+        blank=True, default='', editable=False, verbose_name='Search document')
 
     def __str__(self):
         return f"{self.id} {self.email} {self.first_name} {self.last_name} {self.newsletter_consent}"
@@ -40,3 +44,63 @@ class SubscriberGroup(CoreModel):
     class Meta:
         verbose_name = ('Grupa subskrybenta')
         verbose_name_plural = ('Grupy subskrybentów')
+
+
+class SubscriberImportJob(CoreModel):
+    """
+    Zlecenie importu subskrybentów z pliku przetwarzane w tle przez komendę
+    ``process_subscriber_imports``. Przesłany plik jest zapisywany na dysku,
+    a postęp importu jest aktualizowany po każdej paczce wierszy.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    file = models.FileField(
+        upload_to='subscriber_imports/%Y/%m/', verbose_name='File')
+    file_name = models.CharField(max_length=255, verbose_name='File name')
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name='Status')
+
+    # Opcje importu z formularza
+    newsletter_consent = models.BooleanField(
+        default=True, verbose_name='Email consent')
+    duplicate_action = models.CharField(
+        max_length=10, default='skip', verbose_name='Duplicate action')
+    groups = models.ManyToManyField(
+        SubscriberGroup, blank=True, related_name='import_jobs', verbose_name='Groups')
+    partners = models.ManyToManyField(
+        'partner.Partner', blank=True, related_name='subscriber_import_jobs',
+        verbose_name='Partners')
+
+    # Postęp
+    total_rows = models.PositiveIntegerField(
+        null=True, blank=True, verbose_name='Total rows')
+    processed_rows = models.PositiveIntegerField(
+        default=0, verbose_name='Processed rows')
+    imported = models.PositiveIntegerField(default=0, verbose_name='Imported')
+    updated = models.PositiveIntegerField(default=0, verbose_name='Updated')
+    skipped = models.PositiveIntegerField(default=0, verbose_name='Skipped')
+    invalid = models.PositiveIntegerField(default=0, verbose_name='Invalid')
+    error = models.TextField(blank=True, verbose_name='Error')
+    worker_id = models.CharField(
+        max_length=100, blank=True, verbose_name='Worker')
+    started_at = models.DateTimeField(
+        null=True, blank=True, verbose_name='Started at')
+    finished_at = models.DateTimeField(
+        null=True, blank=True, verbose_name='Finished at')
+
+    def __str__(self):
+        return f"{self.file_name} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = ('Import subskrybentów')
+        verbose_name_plural = ('Importy subskrybentów')
+        indexes = [
+            models.Index(fields=['status', 'created_at'],
+                         name='subscriber_import_queue_idx'),
+        ]
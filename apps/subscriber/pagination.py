@@ -0,0 +1,178 @@
+# apps/subscriber/pagination.py
+
+import base64
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+logger = logging.getLogger(__name__)
+
+
+def _planner_estimate(model):
+    """Liczba wierszy tabeli według statystyk planera PostgreSQL (None gdy niedostępna)"""
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [model._meta.db_table])
+        row = cursor.fetchone()
+    # -1 oznacza tabelę, która nie była jeszcze analizowana
+    return row[0] if row and row[0] >= 0 else None
+
+
+def estimate_count(model):
+    """
+    Zwraca przybliżoną liczbę wierszy tabeli
+
+    Na PostgreSQL korzysta ze statystyk planera, a dla małych tabel
+    (poniżej ``LIST_EXACT_COUNT_BELOW``) oraz innych baz liczy dokładnie.
+    Wynik jest trzymany w cache przez ``LIST_COUNT_CACHE_SECONDS``.
+
+    Returns:
+        int: Liczba wierszy
+    """
+    cache_key = f"row_count_estimate:{model._meta.db_table}"
+    count = cache.get(cache_key)
+    if count is not None:
+        return count
+
+    count = _planner_estimate(model)
+    if count is None or count < getattr(settings, 'LIST_EXACT_COUNT_BELOW', 10000):
+        count = model._default_manager.count()
+
+    cache.set(cache_key, count, getattr(settings, 'LIST_COUNT_CACHE_SECONDS', 300))
+    return count
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator dla dużych niefiltrowanych list, który zamiast
+    ``COUNT(DISTINCT ...)`` na każdym wyświetleniu używa szacowanej
+    liczby wierszy z ``estimate_count``.
+    """
+
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list.model)
+
+
+def encode_cursor(values):
+    """Koduje wartości klucza ostatniego wiersza jako parametr URL"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Dekoduje parametr URL na wartości klucza
+
+    Returns:
+        list | None: Wartości klucza lub None dla nieprawidłowego kursora
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+class KeysetPage:
+    """Strona wyników stronicowania po kluczu"""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        return self.paginator.cursor_for(self.object_list[-1]) if self.object_list else None
+
+    @property
+    def previous_cursor(self):
+        return self.paginator.cursor_for(self.object_list[0]) if self.object_list else None
+
+
+class KeysetPaginator:
+    """
+    Stronicowanie po kluczu (seek) zamiast ``OFFSET``.
+
+    Kolejna strona to wiersze za ostatnim wierszem poprzedniej
+    (``WHERE (email, id) > (...)``), więc koszt strony nie zależy od jej
+    numeru. Kursor zawiera wartości pól klucza ostatniego/pierwszego wiersza.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('email', 'id'), count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = ordering
+        self._count = count
+
+    @cached_property
+    def count(self):
+        return self._count() if callable(self._count) else (
+            self._count if self._count is not None else self.queryset.count())
+
+    def cursor_for(self, obj):
+        return encode_cursor([getattr(obj, field) for field in self.ordering])
+
+    def _seek(self, values, lookup):
+        """Warunek (a, b) > (x, y) zapisany jako a > x OR (a = x AND b > y)"""
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            equal = {name: value for name, value in zip(self.ordering[:index], values)}
+            condition |= Q(**equal, **{f"{field}__{lookup}": values[index]})
+        return condition
+
+    def page(self, after=None, before=None):
+        """
+        Zwraca stronę za kursorem ``after`` lub przed kursorem ``before``
+
+        Returns:
+            KeysetPage: Strona wyników
+        """
+        after = decode_cursor(after) if after else None
+        before = decode_cursor(before) if before else None
+        if after is not None and len(after) != len(self.ordering):
+            after = None
+        if before is not None and len(before) != len(self.ordering):
+            before = None
+
+        if before is not None:
+            # Strona poprzednia - odczyt wstecz i odwrócenie kolejności
+            queryset = self.queryset.filter(self._seek(before, 'lt')).order_by(
+                *[f"-{field}" for field in self.ordering])
+            rows = list(queryset[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            return KeysetPage(
+                list(reversed(rows[:self.per_page])), self, True, has_previous)
+
+        queryset = self.queryset.order_by(*self.ordering)
+        if after is not None:
+            queryset = queryset.filter(self._seek(after, 'gt'))
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return KeysetPage(rows[:self.per_page], self, has_next, after is not None)
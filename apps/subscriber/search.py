@@ -0,0 +1,116 @@
+# apps/subscriber/search.py
+
+import logging
+import threading
+from contextlib import contextmanager
+from itertools import islice
+
+from apps.partner.models import PartnerEmail
+from .models import Subscriber
+
+logger = logging.getLogger(__name__)
+
+SEARCH_REFRESH_BATCH_SIZE = 1000
+
+_refresh_state = threading.local()
+
+
+@contextmanager
+def signal_refresh_suspended():
+    """
+    Wyłącza odświeżanie dokumentów wyszukiwania przez sygnały
+
+    Operacje masowe, które same wywołują ``refresh_search_documents`` dla
+    całej paczki, używają go, żeby usuwanie powiązań nie odświeżało
+    dokumentów wiersz po wierszu.
+    """
+    previous = getattr(_refresh_state, 'suspended', False)
+    _refresh_state.suspended = True
+    try:
+        yield
+    finally:
+        _refresh_state.suspended = previous
+
+
+def is_signal_refresh_suspended():
+    return getattr(_refresh_state, 'suspended', False)
+
+
+def build_search_document(email, first_name='', last_name='', common_name='',
+                          partner_terms=(), group_names=()):
+    """
+    Składa dokument wyszukiwania subskrybenta
+
+    Dokument zawiera wszystkie wartości przeszukiwane na liście
+    subskrybentów (email, imię, nazwisko, nazwa, nazwy i NIP-y partnerów,
+    nazwy grup) zapisane małymi literami, więc wyszukiwanie to jeden
+    warunek ``LIKE`` na jednej kolumnie bez złączeń.
+
+    Returns:
+        str: Dokument wyszukiwania
+    """
+    values = [email, first_name, last_name, common_name, *partner_terms, *group_names]
+    return ' '.join(str(value) for value in values if value).lower()
+
+
+def refresh_search_documents(subscriber_ids, batch_size=SEARCH_REFRESH_BATCH_SIZE):
+    """
+    Przelicza dokumenty wyszukiwania wskazanych subskrybentów
+
+    Dla każdej paczki dane subskrybentów, partnerów i grup są pobierane
+    jednym zapytaniem każde, a zapisywane są tylko zmienione dokumenty.
+
+    Args:
+        subscriber_ids (iterable): Identyfikatory subskrybentów
+
+    Returns:
+        int: Liczba zmienionych dokumentów
+    """
+    through = Subscriber.group_affiliation.through
+    subscriber_ids = iter(sorted(set(subscriber_ids)))
+    updated = 0
+
+    while True:
+        batch = list(islice(subscriber_ids, batch_size))
+        if not batch:
+            return updated
+
+        partner_terms = {}
+        for subscriber_id, name, vat_number in PartnerEmail.objects.filter(
+                subscriber_id__in=batch).values_list(
+                    'subscriber_id', 'partner__name', 'partner__vat_number'):
+            partner_terms.setdefault(subscriber_id, []).extend((name, vat_number))
+
+        group_names = {}
+        for subscriber_id, group_name in through.objects.filter(
+                subscriber_id__in=batch).values_list('subscriber_id', 'subscribergroup__group_name'):
+            group_names.setdefault(subscriber_id, []).append(group_name)
+
+        changed = []
+        for pk, email, first_name, last_name, common_name, document in (
+                Subscriber.objects.filter(pk__in=batch).values_list(
+                    'pk', 'email', 'first_name', 'last_name', 'common_name', 'search_document')):
+            new_document = build_search_document(
+                email, first_name, last_name, common_name,
+                partner_terms.get(pk, ()), group_names.get(pk, ()))
+            if new_document != document:
+                changed.append(Subscriber(pk=pk, search_document=new_document))
+
+        if changed:
+            Subscriber.objects.bulk_update(changed, ['search_document'], batch_size=batch_size)
+            updated += len(changed)
+
+
+def search_subscribers(queryset, search_query):
+    """
+    Filtruje subskrybentów po dokumencie wyszukiwania
+
+    Na PostgreSQL warunek ``LIKE '%...%'`` korzysta z indeksu GIN
+    z trigramami (``subscriber_search_trgm_idx``), na SQLite jest to
+    przeszukanie jednej kolumny bez złączeń z partnerami i grupami.
+    """
+    terms = search_query.lower().split()
+    for term in terms:
+        queryset = queryset.filter(search_document__contains=term)
+    return queryset
+
@@ -0,0 +1,89 @@
+# apps/subscriber/signals.py
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from apps.partner.models import Partner, PartnerEmail
+from .models import Subscriber, SubscriberGroup
+from .filter_options import invalidate_group_options, invalidate_partner_options
+from .search import is_signal_refresh_suspended, refresh_search_documents
+
+# Dokument wyszukiwania jest odświeżany przy zmianach przez ORM (formularze,
+# admin). Operacje masowe bez sygnałów (bulk_create, update) wywołują
+# refresh_search_documents samodzielnie.
+
+
+@receiver(post_save, sender=Subscriber)
+def subscriber_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or is_signal_refresh_suspended() or (
+            update_fields and set(update_fields) <= {'search_document'}):
+        return
+    refresh_search_documents([instance.pk])
+
+
+@receiver(m2m_changed, sender=Subscriber.group_affiliation.through)
+def subscriber_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if is_signal_refresh_suspended():
+        return
+    if action == 'pre_clear' and reverse:
+        # Członkowie czyszczonej grupy - po wyczyszczeniu nie da się ich już pobrać
+        instance._search_member_ids = list(
+            instance.subscriber.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        refresh_search_documents([instance.pk])
+    elif action == 'post_clear':
+        refresh_search_documents(getattr(instance, '_search_member_ids', []))
+    else:
+        refresh_search_documents(pk_set or [])
+
+
+@receiver(post_save, sender=PartnerEmail)
+@receiver(post_delete, sender=PartnerEmail)
+def partner_email_changed(sender, instance, raw=False, origin=None, **kwargs):
+    # Przy usuwaniu samych subskrybentów nie ma czego odświeżać
+    if raw or is_signal_refresh_suspended() or getattr(
+            origin, 'model', type(origin)) is Subscriber:
+        return
+    refresh_search_documents([instance.subscriber_id])
+
+
+@receiver(post_save, sender=Partner)
+def partner_saved(sender, instance, created, raw=False, **kwargs):
+    # Nazwa lub NIP partnera są częścią dokumentów jego subskrybentów
+    if raw or created or is_signal_refresh_suspended():
+        return
+    refresh_search_documents(
+        PartnerEmail.objects.filter(partner=instance).values_list('subscriber_id', flat=True))
+
+
+@receiver(post_save, sender=SubscriberGroup)
+def subscriber_group_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or created or is_signal_refresh_suspended():
+        return
+    refresh_search_documents(instance.subscriber.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=SubscriberGroup)
+def subscriber_group_deleting(sender, instance, **kwargs):
+    instance._search_member_ids = list(instance.subscriber.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=SubscriberGroup)
+def subscriber_group_deleted(sender, instance, **kwargs):
+    refresh_search_documents(getattr(instance, '_search_member_ids', []))
+
+
+@receiver(post_save, sender=SubscriberGroup)
+@receiver(post_delete, sender=SubscriberGroup)
+def group_options_changed(sender, **kwargs):
+    invalidate_group_options()
+
+
+@receiver(post_save, sender=Partner)
+@receiver(post_delete, sender=Partner)
+def partner_options_changed(sender, **kwargs):
+    invalidate_partner_options()
@@ -1,3 +1,263 @@
-from django.test import TestCase
+import io
+import tempfile
 
-# Create your tests here.
+import openpyxl
+import pandas as pd
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from apps.partner.models import PartnerEmail
+from .bulk_actions import SubscriberBulkActionService
+from .importer import SubscriberImporter, SubscriberImportJobService
+from .models import Subscriber, SubscriberGroup
+from .filters import filter_subscribers
+from .pagination import KeysetPaginator
+
+
+class SubscriberImporterTestCase(TestCase):
+    def setUp(self):
+        self.group = SubscriberGroup.objects.create(group_name='Import')
+        Subscriber.objects.create(
+            email='stary@example.com', first_name='Stary', newsletter_consent=False)
+
+    def _frame(self):
+        return SubscriberImporter.normalize_columns(pd.DataFrame({
+            'Email': ['nowy@example.com', 'stary@example.com', 'zly-adres', None,
+                      'nowy@example.com'],
+            'Imię': ['Jan', 'Anna', 'X', 'Y', 'Janek'],
+            'Zgoda': ['tak', 'tak', None, None, 'nie'],
+        }))
+
+    def test_import_skips_existing(self):
+        importer = SubscriberImporter(groups=[self.group], duplicate_action='skip')
+        result = importer.import_frame(self._frame())
+
+        # Pusty wiersz i powtórzony adres są pomijane razem z istniejącym
+        self.assertEqual(result, {'imported': 1, 'updated': 0, 'skipped': 3, 'invalid': 1})
+
+        new = Subscriber.objects.get(email='nowy@example.com')
+        self.assertEqual((new.first_name, new.newsletter_consent), ('Jan', True))
+        self.assertEqual(list(new.group_affiliation.all()), [self.group])
+        self.assertFalse(Subscriber.objects.get(
+            email='stary@example.com').group_affiliation.exists())
+
+    def test_import_updates_existing(self):
+        importer = SubscriberImporter(groups=[self.group], duplicate_action='update')
+        result = importer.import_frame(self._frame())
+        self.assertEqual(result, {'imported': 1, 'updated': 2, 'skipped': 1, 'invalid': 1})
+
+        # Przy aktualizacji obowiązuje ostatnie wystąpienie adresu w pliku
+        new = Subscriber.objects.get(email='nowy@example.com')
+        self.assertEqual((new.first_name, new.newsletter_consent), ('Janek', False))
+
+        old = Subscriber.objects.get(email='stary@example.com')
+        self.assertEqual((old.first_name, old.newsletter_consent), ('Anna', True))
+        self.assertEqual(self.group.subscriber.count(), 2)
+
+    def test_import_emails_links_partners(self):
+        from apps.partner.models import Partner
+        partner = Partner.objects.create(country='PL', vat_number='5260250274', name='Partner')
+
+        importer = SubscriberImporter(
+            newsletter_consent=False, partners=[partner], duplicate_action='update')
+        result = importer.import_emails(['a@example.com', 'stary@example.com', 'a@example.com'])
+        self.assertEqual(result, {'imported': 1, 'updated': 2, 'skipped': 0, 'invalid': 0})
+
+        # Ponowny import nie dubluje powiązań z partnerem
+        importer.import_emails(['a@example.com'])
+        self.assertEqual(PartnerEmail.objects.filter(partner=partner).count(), 2)
+
+    def test_import_file_in_chunks(self):
+        csv_file = io.BytesIO(
+            'email,nazwisko\n'.encode() +
+            ''.join(f'u{i}@example.com,Nowak\n' for i in range(7)).encode())
+        csv_file.name = 'import.csv'
+
+        progress = []
+        importer = SubscriberImporter(chunk_size=3)
+        result = importer.import_file(
+            csv_file, progress=lambda processed, result: progress.append(processed))
+        self.assertEqual(result['imported'], 7)
+        self.assertEqual(progress, [3, 6, 7])
+
+        workbook = openpyxl.Workbook()
+        workbook.active.append(['Email', 'Zgoda'])
+        for i in range(5):
+            workbook.active.append([f'x{i}@example.com', 'nie'])
+        xlsx_file = io.BytesIO()
+        workbook.save(xlsx_file)
+        xlsx_file.seek(0)
+
+        result = importer.import_file(xlsx_file, file_name='import.xlsx')
+        self.assertEqual(result['imported'], 5)
+        self.assertFalse(Subscriber.objects.filter(
+            email__startswith='x', newsletter_consent=True).exists())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class SubscriberImportJobTestCase(TestCase):
+    def test_job_runs_in_background_with_progress(self):
+        group = SubscriberGroup.objects.create(group_name='Import')
+        upload = SimpleUploadedFile(
+            'import.csv',
+            b'email\n' + ''.join(f'u{i}@example.com\n' for i in range(5)).encode())
+
+        job = SubscriberImportJobService.submit(upload, True, [group], [], 'skip')
+        self.assertEqual(job.status, 'pending')
+
+        claimed = SubscriberImportJobService.claim_next('worker-1')
+        self.assertEqual(claimed.pk, job.pk)
+        # Zlecenie w trakcie nie jest wydawane innemu workerowi
+        self.assertIsNone(SubscriberImportJobService.claim_next('worker-2'))
+
+        SubscriberImportJobService.run(claimed)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual((job.total_rows, job.processed_rows, job.imported), (5, 5, 5))
+        self.assertEqual(group.subscriber.count(), 5)
+
+        progress = SubscriberImportJobService.get_progress(job)
+        self.assertEqual((progress['percent'], progress['eta_seconds']), (100.0, 0))
+
+
+class SubscriberBulkActionServiceTestCase(TestCase):
+    def setUp(self):
+        self.group = SubscriberGroup.objects.create(group_name='Akcja')
+        self.subscribers = [
+            Subscriber.objects.create(email=f's{i}@example.com') for i in range(3)]
+        self.subscribers[0].group_affiliation.add(self.group)
+
+    def test_actions_use_constant_number_of_queries(self):
+        selected = SubscriberBulkActionService.selected(
+            [str(subscriber.pk) for subscriber in self.subscribers] + ['x', '999999'])
+
+        # Jeden UPDATE (plus savepoint transakcji w teście)
+        with self.assertNumQueries(3):
+            self.assertEqual(SubscriberBulkActionService.set_consent(selected, False), 3)
+        self.assertFalse(Subscriber.objects.filter(newsletter_consent=True).exists())
+
+        # Istniejące powiązanie z grupą nie powoduje błędu i nie jest liczone
+        self.assertEqual(SubscriberBulkActionService.add_to_groups(selected, [self.group]), 2)
+        self.assertEqual(self.group.subscriber.count(), 3)
+        self.assertEqual(SubscriberBulkActionService.add_to_groups(selected, [self.group]), 0)
+        self.assertEqual(SubscriberBulkActionService.remove_from_groups(selected, [self.group]), 3)
+        self.assertFalse(self.group.subscriber.exists())
+        self.assertEqual(SubscriberBulkActionService.remove_from_groups(selected, [self.group]), 0)
+
+        self.assertEqual(SubscriberBulkActionService.delete(selected), 3)
+        self.assertFalse(Subscriber.objects.exists())
+
+    def test_action_on_all_subscribers_matching_filter(self):
+        user = get_user_model().objects.create_user('admin', password='x')
+        self.client.force_login(user)
+        Subscriber.objects.create(email='inny@example.org')
+
+        # Bez identyfikatorów - akcja obejmuje wszystkich pasujących do filtra
+        with self.settings(SUBSCRIBER_BULK_ACTION_BATCH_SIZE=2):
+            self.client.post(reverse('subscribers:subscriber_bulk_action'), {
+                'bulk_action': 'add_to_groups',
+                'group_ids': [self.group.pk],
+                'select_all_matching': '1',
+                'filter_query': 'search=example.com&page=2',
+            })
+
+        self.assertEqual(self.group.subscriber.count(), 3)
+        self.assertFalse(self.group.subscriber.filter(email='inny@example.org').exists())
+
+    def test_update_sheet_writes_only_changes(self):
+        first, second, third = self.subscribers
+        other_group = SubscriberGroup.objects.create(group_name='Inna')
+
+        result = SubscriberBulkActionService.update_sheet({
+            first.pk: {'email': first.email, 'first_name': 'Jan', 'group_ids': {other_group.pk}},
+            # Adres zajęty przez innego subskrybenta - wiersz jest pomijany
+            second.pk: {'email': third.email, 'first_name': 'Anna', 'group_ids': {other_group.pk}},
+            third.pk: {'email': third.email, 'first_name': '', 'group_ids': set()},
+        }, ['email', 'first_name', 'group_ids'])
+
+        self.assertEqual(result, {'updated': 1, 'conflicts': [third.email]})
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.first_name, 'Jan')
+        self.assertEqual(list(first.group_affiliation.all()), [other_group])
+        self.assertEqual((second.first_name, second.group_affiliation.count()), ('', 0))
+
+
+class KeysetPaginatorTestCase(TestCase):
+    def test_pages_forward_and_back(self):
+        for i in range(5):
+            Subscriber.objects.create(email=f'k{i}@example.com')
+        paginator = KeysetPaginator(Subscriber.objects.all(), 2)
+
+        first = paginator.page()
+        self.assertEqual([s.email for s in first], ['k0@example.com', 'k1@example.com'])
+        self.assertEqual((first.has_previous(), first.has_next()), (False, True))
+
+        second = paginator.page(after=first.next_cursor)
+        third = paginator.page(after=second.next_cursor)
+        self.assertEqual([s.email for s in third], ['k4@example.com'])
+        self.assertFalse(third.has_next())
+
+        back = paginator.page(before=third.previous_cursor)
+        self.assertEqual([s.pk for s in back], [s.pk for s in second])
+        self.assertEqual(paginator.count, 5)
+
+        # Nieprawidłowy kursor daje pierwszą stronę
+        self.assertEqual(len(paginator.page(after='%%%')), 2)
+
+
+class SubscriberSearchTestCase(TestCase):
+    def test_search_document_follows_links(self):
+        from apps.partner.models import Partner
+        subscriber = Subscriber.objects.create(email='Ola@Example.com', last_name='Nowak')
+        group = SubscriberGroup.objects.create(group_name='VIP')
+        partner = Partner.objects.create(country='PL', vat_number='5260250274', name='Firma')
+
+        def found(term):
+            return list(filter_subscribers(
+                Subscriber.objects.all(), {'search': term}).values_list('pk', flat=True))
+
+        subscriber.group_affiliation.add(group)
+        PartnerEmail.objects.create(partner=partner, subscriber=subscriber)
+        self.assertEqual(found('ola@example'), [subscriber.pk])
+        self.assertEqual(found('nowak vip'), [subscriber.pk])
+        self.assertEqual(found('5260250274'), [subscriber.pk])
+
+        # Zmiana nazwy grupy i usunięcie powiązań aktualizują dokument
+        group.group_name = 'Stali klienci'
+        group.save()
+        self.assertEqual(found('stali'), [subscriber.pk])
+        SubscriberBulkActionService.remove_from_partners(
+            Subscriber.objects.filter(pk=subscriber.pk), [partner])
+        self.assertEqual(found('firma'), [])
+
+        # Import tworzy dokumenty razem z powiązaniami z importu
+        SubscriberImporter(groups=[group]).import_emails(['nowy@example.com'])
+        self.assertEqual(len(found('stali')), 2)
+
+
+class FilterOptionsTestCase(TestCase):
+    def test_options_are_cached_until_models_change(self):
+        from django.core.cache import cache
+        from apps.partner.models import Partner
+        from .filter_options import get_group_options, get_partner_cities, get_partner_options
+        cache.clear()
+        SubscriberGroup.objects.create(group_name='B')
+        Partner.objects.create(country='PL', vat_number='5260250274', name='Firma', city='Warszawa')
+
+        self.assertEqual([group['group_name'] for group in get_group_options()], ['B'])
+        self.assertEqual([partner['name'] for partner in get_partner_options()], ['Firma'])
+        self.assertEqual(get_partner_cities(), ['Warszawa'])
+        with self.assertNumQueries(0):
+            get_group_options()
+            get_partner_options()
+            get_partner_cities()
+
+        # Zapis grupy lub partnera unieważnia cache
+        SubscriberGroup.objects.create(group_name='A')
+        Partner.objects.create(country='PL', vat_number='7740001454', name='Druga', city='Warszawa')
+        self.assertEqual([group['group_name'] for group in get_group_options()], ['A', 'B'])
+        self.assertEqual([partner['name'] for partner in get_partner_options()], ['Druga', 'Firma'])
+        self.assertEqual(get_partner_cities(), ['Warszawa'])
@@ -43,6 +43,8 @@ urlpatterns = [
     path('bulk-action/', views.SubscriberBulkActionView.as_view(),
          name='subscriber_bulk_action'),
     path('import/', views.SubscriberImportView.as_view(), name='subscriber_import'),
+    path('import/jobs/<int:pk>/', views.SubscriberImportJobStatusView.as_view(),
+         name='subscriber_import_status'),
 
 
 
@@ -1,8 +1,10 @@
 from django.views import View
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView, FormView
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse, QueryDict
 from django.urls import reverse, reverse_lazy
 from django.contrib import messages
+from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.mixins import LoginRequiredMixin
 from .forms import SubscriberForm, SubscriberGroupForm, SubscriberImportForm
@@ -16,8 +18,13 @@ import io
 import re
 
 
-from .models import Subscriber, SubscriberGroup
+from .models import Subscriber, SubscriberGroup, SubscriberImportJob
 from .forms import SubscriberForm, SubscriberGroupForm
+from .bulk_actions import SubscriberBulkActionService
+from .filter_options import get_group_options, get_partner_options
+from .filters import filter_subscribers, has_subscriber_filters
+from .pagination import EstimatedCountPaginator, KeysetPage, KeysetPaginator, estimate_count
+from .importer import SubscriberImporter, SubscriberImportJobService
 
 # At the top of your views.py file
 DEFAULT_PAGE_SIZE = 100
@@ -117,44 +124,70 @@ class SubscriberListView(LoginRequiredMixin, ListView):
 
     def get_queryset(self):
         """Filtrowanie wyników"""
-        queryset = super().get_queryset()
-
-        # Get filter parameters
-        search_query = self.request.GET.get('search', '')
-        group_id = self.request.GET.get('group', '')
-        partner_id = self.request.GET.get('partner', '')
-        consent = self.request.GET.get('consent', '')
-
-        # Apply search filter
-        if search_query:
-            queryset = queryset.filter(
-                models.Q(email__icontains=search_query) |
-                models.Q(first_name__icontains=search_query) |
-                models.Q(last_name__icontains=search_query) |
-                models.Q(common_name__icontains=search_query) |
-                models.Q(partnered_with__name__icontains=search_query) |
-                models.Q(group_affiliation__group_name__icontains=search_query) |
-                models.Q(partnered_with__vat_number__icontains=search_query)
-            )
-
-        # Apply group filter
-        if group_id:
-            queryset = queryset.filter(group_affiliation__id=group_id)
-
-        # Apply partner filter
-        if partner_id:
-            queryset = queryset.filter(partnered_with__id=partner_id)
+        return filter_subscribers(super().get_queryset(), self.request.GET)
+
+    def use_keyset_pagination(self):
+        """Stronicowanie po kluczu (email, id) - z ustawień lub parametru URL"""
+        params = self.request.GET
+        return (
+            getattr(settings, 'SUBSCRIBER_LIST_PAGINATION', 'offset') == 'keyset'
+            or params.get('pagination') == 'keyset'
+            or 'after' in params or 'before' in params
+        )
 
-        # Apply consent filter
-        if consent in ['0', '1']:
-            queryset = queryset.filter(newsletter_consent=(consent == '1'))
+    def use_estimated_count(self):
+        """Szacowana liczba wierszy tylko dla listy bez filtrów"""
+        return (
+            getattr(settings, 'SUBSCRIBER_LIST_ESTIMATE_COUNT', False)
+            and not has_subscriber_filters(self.request.GET)
+        )
 
-        # Return distinct results to avoid duplicates due to joins
-        return queryset.distinct()
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        if self.use_estimated_count():
+            return EstimatedCountPaginator(
+                queryset, per_page, orphans=orphans,
+                allow_empty_first_page=allow_empty_first_page, **kwargs)
+        return super().get_paginator(
+            queryset, per_page, orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page, **kwargs)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_keyset_pagination():
+            return super().paginate_queryset(queryset, page_size)
+
+        # Koszt strony nie zależy od jej numeru - brak OFFSET i COUNT przy odczycie
+        if self.use_estimated_count():
+            count = lambda: estimate_count(Subscriber)
+        else:
+            count = queryset.count
+        paginator = KeysetPaginator(queryset, page_size, count=count)
+        page = paginator.page(
+            after=self.request.GET.get('after'), before=self.request.GET.get('before'))
+        return (paginator, page, page.object_list, page.has_other_pages())
 
     def get_context_data(self, **kwargs):
         """Dodatkowe dane kontekstowe"""
         context = super().get_context_data(**kwargs)
+
+        # Linki do sąsiednich stron przy stronicowaniu po kluczu
+        context['keyset_pagination'] = isinstance(context.get('page_obj'), KeysetPage)
+        if context['keyset_pagination']:
+            page = context['page_obj']
+            keyset_params = self.request.GET.copy()
+            for key in ('page', 'after', 'before'):
+                keyset_params.pop(key, None)
+            keyset_params['pagination'] = 'keyset'
+            base_url = reverse('subscribers:subscriber_list')
+            if page.has_next():
+                keyset_params['after'] = page.next_cursor
+                context['next_page_url'] = f"{base_url}?{keyset_params.urlencode()}"
+                keyset_params.pop('after')
+            if page.has_previous():
+                keyset_params['before'] = page.previous_cursor
+                context['previous_page_url'] = f"{base_url}?{keyset_params.urlencode()}"
+                keyset_params.pop('before')
+            context['first_page_url'] = f"{base_url}?{keyset_params.urlencode()}"
+
         # Pass the default page size to the template
         context['default_page_size'] = str(DEFAULT_PAGE_SIZE)
         context['selected_page_size'] = self.request.GET.get(
@@ -180,13 +213,9 @@ class SubscriberListView(LoginRequiredMixin, ListView):
 
         )
 
-        # Add all groups and partners for filters
-        context['subscriber_groups'] = SubscriberGroup.objects.all().order_by(
-            'group_name')
-
-        # Add partners for filters - assuming you have Partner model
-        from apps.partner.models import Partner
-        context['all_partners'] = Partner.objects.all().order_by('name')
+        # Add all groups and partners for filters (z cache, unieważniane sygnałami)
+        context['subscriber_groups'] = get_group_options()
+        context['all_partners'] = get_partner_options()
 
         # Create URLs for removing each filter
         base_url = reverse('subscribers:subscriber_list')
@@ -980,154 +1009,46 @@ class SubscriberBulkUpdateView(LoginRequiredMixin, View):
                 request, "Nie wybrano żadnych pól do aktualizacji.")
             return redirect('subscribers:subscriber_list')
 
-        # Licznik aktualizacji
-        update_count = 0
-        error_count = 0
-
-        # Aktualizuj każdego subskrybenta osobno
+        # Wartości z arkusza dla każdego subskrybenta
+        changes = {}
         for subscriber_id in subscriber_ids:
-            try:
-                subscriber = Subscriber.objects.get(id=subscriber_id)
-                field_updated = False  # Track if any field was updated for this subscriber
-
-                # Aktualizuj email - Dodaj sprawdzenie unikalności
-                if 'email' in fields_to_update:
-                    new_email = request.POST.get(f'email_{subscriber_id}')
-                    if new_email and new_email != subscriber.email:
-                        # Sprawdź, czy email jest unikalny
-                        if not Subscriber.objects.filter(email=new_email).exclude(id=subscriber_id).exists():
-                            subscriber.email = new_email
-                            field_updated = True
-                            print(
-                                f"Email updated from {subscriber.email} to {new_email}")
-                        else:
-                            # Email istnieje już w bazie
-                            error_count += 1
-                            print(
-                                f"Error: Email {new_email} already exists in database")
-                            messages.error(
-                                request, f"Email {new_email} jest już używany przez innego subskrybenta.")
-                            continue  # Skip this subscriber
-
-                # Aktualizuj common_name
-                if 'common_name' in fields_to_update:
-                    new_common_name = request.POST.get(
-                        f'common_name_{subscriber_id}')
-                    if new_common_name != subscriber.common_name:
-                        subscriber.common_name = new_common_name
-                        field_updated = True
-                        print(f"Common name updated to {new_common_name}")
-
-                # Aktualizuj first_name
-                if 'first_name' in fields_to_update:
-                    new_first_name = request.POST.get(
-                        f'first_name_{subscriber_id}')
-                    if new_first_name != subscriber.first_name:
-                        subscriber.first_name = new_first_name
-                        field_updated = True
-                        print(f"First name updated to {new_first_name}")
-
-                # Aktualizuj last_name
-                if 'last_name' in fields_to_update:
-                    new_last_name = request.POST.get(
-                        f'last_name_{subscriber_id}')
-                    if new_last_name != subscriber.last_name:
-                        subscriber.last_name = new_last_name
-                        field_updated = True
-                        print(f"Last name updated to {new_last_name}")
-
-                # Aktualizuj newsletter_consent
-                if 'newsletter_consent' in fields_to_update:
-                    raw_value = request.POST.get(
-                        f'newsletter_consent_{subscriber_id}')
-                    new_consent = (raw_value == 'true')
-
-                    if bool(new_consent) != bool(subscriber.newsletter_consent):
-                        print(
-                            f"Changing newsletter consent from {subscriber.newsletter_consent} to {new_consent}")
-                        subscriber.newsletter_consent = new_consent
-                        field_updated = True
-
-                # Save if basic fields were updated
-                if field_updated:
-                    subscriber.save()
-                    update_count += 1
-
-                # Aktualizuj powiązania z partnerami
-                if 'partner_ids' in fields_to_update:
-                    partner_ids = request.POST.getlist(
-                        f'partner_ids_{subscriber_id}')
-                    # Convert empty strings to empty list
-                    if not partner_ids or (len(partner_ids) == 1 and partner_ids[0] == ''):
-                        partner_ids = []
-
-                    partners = Partner.objects.filter(id__in=partner_ids)
-
-                    # Pobierz aktualnych partnerów
-                    current_partners = set(
-                        subscriber.partnered_with.all().values_list('id', flat=True))
-                    new_partners = set(int(id)
-                                       for id in partner_ids if id.isdigit())
-
-                    # Jeśli partnerzy się zmienili, zaktualizuj
-                    if current_partners != new_partners:
-                        # Aktualizacja relacji M2M
-                        from apps.partner.models import PartnerEmail
-
-                        # Usuń istniejące powiązania
-                        PartnerEmail.objects.filter(
-                            subscriber=subscriber).delete()
-
-                        # Dodaj nowe powiązania
-                        for partner in partners:
-                            PartnerEmail.objects.create(
-                                partner=partner, subscriber=subscriber)
-
-                        update_count += 1
-                        print(
-                            f"Partners updated for subscriber {subscriber_id}")
-
-                # Aktualizuj grupy - fixed indentation!
-                if 'group_ids' in fields_to_update:
-                    group_ids = request.POST.getlist(
-                        f'group_ids_{subscriber_id}')
-                    # Convert empty strings to empty list
-                    if not group_ids or (len(group_ids) == 1 and group_ids[0] == ''):
-                        group_ids = []
-
-                    groups = SubscriberGroup.objects.filter(id__in=group_ids)
-
-                    # Pobierz aktualne grupy
-                    current_groups = set(
-                        subscriber.group_affiliation.all().values_list('id', flat=True))
-                    new_groups = set(int(id)
-                                     for id in group_ids if id.isdigit())
-
-                    # Jeśli grupy się zmieniły, zaktualizuj
-                    if current_groups != new_groups:
-                        subscriber.group_affiliation.set(groups)
-                        update_count += 1
-                        print(
-                            f"Groups updated for subscriber {subscriber_id}, from {current_groups} to {new_groups}")
-
-            except Subscriber.DoesNotExist:
-                continue
-            except Exception as e:
-                error_count += 1
-                print(f"Error updating subscriber {subscriber_id}: {str(e)}")
-                messages.error(
-                    request, f"Błąd podczas aktualizacji subskrybenta {subscriber_id}: {str(e)}")
+            values = {}
+            for field in ('email', 'common_name', 'first_name', 'last_name'):
+                if field in fields_to_update:
+                    values[field] = request.POST.get(f'{field}_{subscriber_id}')
+            if 'newsletter_consent' in fields_to_update:
+                values['newsletter_consent'] = request.POST.get(
+                    f'newsletter_consent_{subscriber_id}') == 'true'
+            for field in ('partner_ids', 'group_ids'):
+                if field in fields_to_update:
+                    values[field] = {
+                        int(id) for id in request.POST.getlist(f'{field}_{subscriber_id}')
+                        if id.isdigit()}
+            changes[subscriber_id] = values
+
+        # Zapis tylko zmienionych wierszy i pól, powiązania zmieniane różnicowo
+        try:
+            result = SubscriberBulkActionService.update_sheet(
+                changes, fields_to_update, user=request.user)
+        except Exception as e:
+            messages.error(
+                request, f"Błąd podczas aktualizacji subskrybentów: {str(e)}")
+            return redirect('subscribers:subscriber_list')
+
+        for email in result['conflicts']:
+            messages.error(
+                request, f"Email {email} jest już używany przez innego subskrybenta.")
 
         # Wyświetl komunikat o aktualizacji
-        if update_count > 0:
+        if result['updated'] > 0:
             messages.success(
-                request, f"Pomyślnie zaktualizowano {update_count} subskrybentów.")
+                request, f"Pomyślnie zaktualizowano {result['updated']} subskrybentów.")
         else:
             messages.info(request, "Nie wprowadzono żadnych zmian.")
 
-        if error_count > 0:
+        if result['conflicts']:
             messages.warning(
-                request, f"Wystąpiły błędy podczas aktualizacji {error_count} subskrybentów.")
+                request, f"Wystąpiły błędy podczas aktualizacji {len(result['conflicts'])} subskrybentów.")
 
         return redirect('subscribers:subscriber_list')
 
@@ -1237,29 +1158,30 @@ class SubscriberBulkActionView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         # Get selected subscriber IDs
         subscriber_ids = request.POST.getlist('subscriber_ids', [])
+        # Akcja na wszystkich subskrybentach pasujących do filtra listy
+        self.select_all_matching = request.POST.get('select_all_matching') == '1'
 
-        if not subscriber_ids:
+        if not subscriber_ids and not self.select_all_matching:
             messages.error(request, "Nie wybrano żadnych subskrybentów.")
             return redirect('subscribers:subscriber_list')
 
         # Get the selected action
         bulk_action = request.POST.get('bulk_action', '')
 
-        # Count of affected subscribers
-        affected_count = 0
+        # Każda akcja to stała liczba zapytań, niezależnie od liczby zaznaczonych
+        if self.select_all_matching:
+            subscribers = filter_subscribers(
+                Subscriber.objects.all(), QueryDict(request.POST.get('filter_query', '')))
+        else:
+            subscribers = SubscriberBulkActionService.selected(subscriber_ids)
 
         # Process according to the selected action
         if bulk_action == 'consent_yes' or bulk_action == 'consent_no':
             # Set newsletter consent
             new_consent = (bulk_action == 'consent_yes')
-            for subscriber_id in subscriber_ids:
-                try:
-                    subscriber = Subscriber.objects.get(id=subscriber_id)
-                    subscriber.newsletter_consent = new_consent
-                    subscriber.save()
-                    affected_count += 1
-                except Subscriber.DoesNotExist:
-                    continue
+            affected_count = self._apply(
+                SubscriberBulkActionService.set_consent, subscribers, new_consent,
+                user=request.user)
 
             consent_text = "TAK" if new_consent else "NIE"
             messages.success(
@@ -1275,22 +1197,16 @@ class SubscriberBulkActionView(LoginRequiredMixin, View):
 
             groups = SubscriberGroup.objects.filter(id__in=group_ids)
 
-            for subscriber_id in subscriber_ids:
-                try:
-                    subscriber = Subscriber.objects.get(id=subscriber_id)
-
-                    if bulk_action == 'add_to_groups':
-                        subscriber.group_affiliation.add(*groups)
-                    else:
-                        subscriber.group_affiliation.remove(*groups)
-
-                    affected_count += 1
-                except Subscriber.DoesNotExist:
-                    continue
+            if bulk_action == 'add_to_groups':
+                affected_count = self._apply(
+                    SubscriberBulkActionService.add_to_groups, subscribers, groups)
+            else:
+                affected_count = self._apply(
+                    SubscriberBulkActionService.remove_from_groups, subscribers, groups)
 
-            action_text = "dodano do" if bulk_action == 'add_to_groups' else "usunięto z"
+            action_text = "Dodano" if bulk_action == 'add_to_groups' else "Usunięto"
             messages.success(
-                request, f"{affected_count} subskrybentów {action_text} wybranych grup.")
+                request, f"{action_text} {affected_count} przypisań do wybranych grup.")
 
         elif bulk_action in ['add_to_partners', 'remove_from_partners']:
             # Process partner assignment
@@ -1302,31 +1218,17 @@ class SubscriberBulkActionView(LoginRequiredMixin, View):
 
             partners = Partner.objects.filter(id__in=partner_ids)
 
-            for subscriber_id in subscriber_ids:
-                try:
-                    subscriber = Subscriber.objects.get(id=subscriber_id)
-
-                    if bulk_action == 'add_to_partners':
-                        # Add partners
-                        for partner in partners:
-                            PartnerEmail.objects.get_or_create(
-                                partner=partner,
-                                subscriber=subscriber
-                            )
-                    else:
-                        # Remove partners
-                        PartnerEmail.objects.filter(
-                            subscriber=subscriber,
-                            partner__in=partners
-                        ).delete()
-
-                    affected_count += 1
-                except Subscriber.DoesNotExist:
-                    continue
-
-            action_text = "dodano do" if bulk_action == 'add_to_partners' else "usunięto z"
+            if bulk_action == 'add_to_partners':
+                affected_count = self._apply(
+                    SubscriberBulkActionService.add_to_partners, subscribers, partners,
+                    user=request.user)
+            else:
+                affected_count = self._apply(
+                    SubscriberBulkActionService.remove_from_partners, subscribers, partners)
+
+            action_text = "Dodano" if bulk_action == 'add_to_partners' else "Usunięto"
             messages.success(
-                request, f"{affected_count} subskrybentów {action_text} wybranych firm.")
+                request, f"{action_text} {affected_count} powiązań z wybranymi firmami.")
 
         # Nowa sekcja do obsługi masowego usuwania
         elif bulk_action == 'delete':
@@ -1338,32 +1240,26 @@ class SubscriberBulkActionView(LoginRequiredMixin, View):
                     request, "Wymagane jest potwierdzenie usunięcia subskrybentów.")
                 return redirect('subscribers:subscriber_list')
 
-            # Lista emaili usuniętych subskrybentów do logowania
-            deleted_emails = []
-
-            for subscriber_id in subscriber_ids:
-                try:
-                    subscriber = Subscriber.objects.get(id=subscriber_id)
-                    email = subscriber.email  # Zapisz email przed usunięciem
-                    deleted_emails.append(email)
-                    subscriber.delete()
-                    affected_count += 1
-                except Subscriber.DoesNotExist:
-                    continue
-                except Exception as e:
-                    messages.error(
-                        request, f"Błąd podczas usuwania subskrybenta: {str(e)}")
+            try:
+                affected_count = self._apply(
+                    SubscriberBulkActionService.delete, subscribers)
+            except Exception as e:
+                messages.error(
+                    request, f"Błąd podczas usuwania subskrybentów: {str(e)}")
+                return redirect('subscribers:subscriber_list')
 
             messages.success(
                 request, f"Pomyślnie usunięto {affected_count} subskrybentów.")
 
-            # Opcjonalnie zapisz usunięte emaile do logów systemowych
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.info(f"Deleted subscribers: {', '.join(deleted_emails)}")
-
         return redirect('subscribers:subscriber_list')
 
+    def _apply(self, action, subscribers, *args, **kwargs):
+        """Wykonuje akcję od razu lub paczkami, gdy dotyczy całego filtra"""
+        if self.select_all_matching:
+            return SubscriberBulkActionService.apply_in_batches(
+                subscribers, action, *args, **kwargs)
+        return action(subscribers, *args, **kwargs)
+
 
 class SubscriberImportView(LoginRequiredMixin, FormView):
     """View for importing subscribers"""
@@ -1402,23 +1298,30 @@ class SubscriberImportView(LoginRequiredMixin, FormView):
             from apps.partner.models import Partner
             partners = Partner.objects.filter(id__in=partner_ids)
 
-        # Import based on type
-        if import_type == 'text':
-            result = self._import_from_text(
-                form.cleaned_data.get('email_list', ''),
-                newsletter_consent,
-                groups,
-                partners,
-                duplicate_action
-            )
-        else:  # file import
-            result = self._import_from_file(
+        if import_type != 'text':
+            # Plik jest importowany w tle, strona importu pokazuje postęp
+            job = SubscriberImportJobService.submit(
                 form.cleaned_data.get('file'),
                 newsletter_consent,
                 groups,
                 partners,
-                duplicate_action
+                duplicate_action,
+                user=getattr(self.request, 'user', None)
+            )
+            messages.info(
+                self.request,
+                f"Plik {job.file_name} został przyjęty do importu. "
+                f"Postęp jest widoczny poniżej."
             )
+            return redirect(f"{reverse('subscribers:subscriber_import')}?job={job.pk}")
+
+        result = self._import_from_text(
+            form.cleaned_data.get('email_list', ''),
+            newsletter_consent,
+            groups,
+            partners,
+            duplicate_action
+        )
 
         # Display results
         messages.success(
@@ -1430,6 +1333,13 @@ class SubscriberImportView(LoginRequiredMixin, FormView):
 
         return super().form_valid(form)
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        job_id = self.request.GET.get('job', '')
+        if job_id.isdigit():
+            context['import_job'] = SubscriberImportJob.objects.filter(pk=job_id).first()
+        return context
+
     def _import_from_text(self, email_text, newsletter_consent, groups, partners, duplicate_action):
         """Import subscribers from text input"""
         # Split by newlines and/or commas
@@ -1442,235 +1352,25 @@ class SubscriberImportView(LoginRequiredMixin, FormView):
 
         return self._process_emails(emails, newsletter_consent, groups, partners, duplicate_action)
 
-    def _import_from_file(self, file_obj, newsletter_consent, groups, partners, duplicate_action):
-        """Import subscribers from Excel file"""
-        try:
-            # Read file based on extension
-            file_ext = file_obj.name.split('.')[-1].lower()
-
-            if file_ext == 'csv':
-                df = pd.read_csv(file_obj, encoding='utf-8')
-            else:  # xlsx, xls, ods
-                df = pd.read_excel(file_obj)
-
-            # Ujednolicenie nagłówków kolumn - wszystkie małymi literami
-            df.columns = [col.lower() for col in df.columns]
-
-            # Sprawdź, czy istnieje kolumna email (niezależnie od wielkości liter)
-            email_col = None
-            for col in df.columns:
-                if col.lower() == 'email':
-                    email_col = col
-                    break
-
-            if not email_col:
-                messages.error(
-                    self.request, "Plik musi zawierać kolumnę z adresami email (nazwa kolumny powinna zawierać 'email')")
-                return {'imported': 0, 'updated': 0, 'skipped': 0, 'invalid': 0}
-
-            # Process each row
-            result = {'imported': 0, 'updated': 0, 'skipped': 0, 'invalid': 0}
-
-            # Znajdź odpowiednie kolumny (jeśli istnieją)
-            name_col = next((col for col in df.columns if col.lower() in [
-                            'nazwa', 'common_name', 'name']), None)
-            first_name_col = next((col for col in df.columns if col.lower() in [
-                                  'imię', 'imie', 'first_name']), None)
-            last_name_col = next((col for col in df.columns if col.lower() in [
-                                 'nazwisko', 'last_name']), None)
-            consent_col = next((col for col in df.columns if col.lower() in [
-                               'zgoda', 'newsletter_consent', 'consent']), None)
-
-            for _, row in df.iterrows():
-                email = str(row.get(email_col, '')).strip()
-
-                if not email or email.lower() == 'nan':
-                    result['skipped'] += 1
-                    continue
-
-                try:
-                    validate_email(email)
-                except ValidationError:
-                    result['invalid'] += 1
-                    continue
-
-                # Check if subscriber exists
-                subscriber_exists = Subscriber.objects.filter(
-                    email=email).exists()
-
-                # Jeśli subskrybent już istnieje i wybrano opcję pomijania
-                if subscriber_exists and duplicate_action == 'skip':
-                    result['skipped'] += 1
-                    continue
-
-                # Get or create subscriber
-                if subscriber_exists:
-                    subscriber = Subscriber.objects.get(email=email)
-                    if duplicate_action == 'update':
-                        # Aktualizuj tylko gdy wybrano opcję aktualizacji
-                        # Aktualizuj dane tylko jeśli odpowiednie kolumny istnieją i wartości nie są puste lub NaN
-                        if name_col:
-                            value = row.get(name_col, '')
-                            # Sprawdź czy wartość nie jest NaN i nie jest pusta
-                            if pd.notna(value) and str(value).strip() and str(value).lower() != 'nan':
-                                subscriber.common_name = str(value).strip()
-                            # Jeśli wartość jest NaN lub pusta, ustaw jako pusty ciąg znaków
-                            elif duplicate_action == 'update':
-                                subscriber.common_name = ''
-
-                        if first_name_col:
-                            value = row.get(first_name_col, '')
-                            if pd.notna(value) and str(value).strip() and str(value).lower() != 'nan':
-                                subscriber.first_name = str(value).strip()
-                            elif duplicate_action == 'update':
-                                subscriber.first_name = ''
-
-                        if last_name_col:
-                            value = row.get(last_name_col, '')
-                            if pd.notna(value) and str(value).strip() and str(value).lower() != 'nan':
-                                subscriber.last_name = str(value).strip()
-                            elif duplicate_action == 'update':
-                                subscriber.last_name = ''
-
-                        # Ustaw zgodę tylko jeśli kolumna istnieje i wartość nie jest pusta
-                        if consent_col and pd.notna(row.get(consent_col)):
-                            consent_value = row.get(consent_col)
-                            # Obsługuje różne formaty wartości zgody
-                            if isinstance(consent_value, bool):
-                                subscriber.newsletter_consent = consent_value
-                            elif isinstance(consent_value, str):
-                                consent_lower = consent_value.lower().strip()
-                                if consent_lower in ['tak', 'yes', 't', 'y', 'true', '1']:
-                                    subscriber.newsletter_consent = True
-                                elif consent_lower in ['nie', 'no', 'n', 'false', '0']:
-                                    subscriber.newsletter_consent = False
-                            elif isinstance(consent_value, (int, float)):
-                                subscriber.newsletter_consent = bool(
-                                    consent_value)
-
-                        subscriber.save()
-                        result['updated'] += 1
-                    else:
-                        result['skipped'] += 1
-                else:
-                    # Utwórz nowego subskrybenta
-                    # Dla każdego pola sprawdź czy wartość nie jest NaN i nie jest równa ciągowi "nan"
-                    common_name = ''
-                    if name_col and pd.notna(row.get(name_col)) and str(row.get(name_col)).lower() != 'nan':
-                        common_name = str(row.get(name_col)).strip()
-
-                    first_name = ''
-                    if first_name_col and pd.notna(row.get(first_name_col)) and str(row.get(first_name_col)).lower() != 'nan':
-                        first_name = str(row.get(first_name_col)).strip()
-
-                    last_name = ''
-                    if last_name_col and pd.notna(row.get(last_name_col)) and str(row.get(last_name_col)).lower() != 'nan':
-                        last_name = str(row.get(last_name_col)).strip()
-
-                    # Domyślna wartość zgody
-                    consent = False
-
-                    # Sprawdź, czy kolumna zgody istnieje i ma wartość
-                    if consent_col and pd.notna(row.get(consent_col)):
-                        consent_value = row.get(consent_col)
-                        # Obsługuje różne formaty wartości zgody
-                        if isinstance(consent_value, bool):
-                            consent = consent_value
-                        elif isinstance(consent_value, str):
-                            consent_lower = consent_value.lower().strip()
-                            if consent_lower in ['tak', 'yes', 't', 'y', 'true', '1']:
-                                consent = True
-                            # Wszystkie inne wartości = False (domyślnie)
-                        elif isinstance(consent_value, (int, float)):
-                            consent = bool(consent_value)
-                    else:
-                        # Jeśli kolumna zgody nie istnieje lub jest pusta, użyj wartości domyślnej
-                        consent = newsletter_consent
-
-                    subscriber = Subscriber.objects.create(
-                        email=email,
-                        common_name=common_name,
-                        first_name=first_name,
-                        last_name=last_name,
-                        newsletter_consent=consent,
-                        created_by=self.request.user if hasattr(
-                            self.request, 'user') else None
-                    )
-                    result['imported'] += 1
-
-                # Add to groups
-                if groups:
-                    subscriber.group_affiliation.add(*groups)
-
-                # Add to partners
-                if partners:
-                    from apps.partner.models import PartnerEmail
-                    for partner in partners:
-                        PartnerEmail.objects.get_or_create(
-                            partner=partner,
-                            subscriber=subscriber
-                        )
-
-            return result
-
-        except Exception as e:
-            messages.error(
-                self.request, f"Błąd podczas importu pliku: {str(e)}")
-            return {'imported': 0, 'updated': 0, 'skipped': 0, 'invalid': 0}
+    def _get_importer(self, newsletter_consent, groups, partners, duplicate_action):
+        return SubscriberImporter(
+            newsletter_consent=newsletter_consent,
+            groups=groups,
+            partners=partners,
+            duplicate_action=duplicate_action,
+            user=getattr(self.request, 'user', None)
+        )
 
     def _process_emails(self, emails, newsletter_consent, groups, partners, duplicate_action):
         """Process a list of email addresses"""
-        result = {'imported': 0, 'updated': 0, 'skipped': 0, 'invalid': 0}
+        importer = self._get_importer(
+            newsletter_consent, groups, partners, duplicate_action)
+        return importer.import_emails(email.strip() for email in emails)
 
-        for email in emails:
-            email = email.strip()
-            if not email:
-                result['skipped'] += 1
-                continue
 
-            try:
-                validate_email(email)
-            except ValidationError:
-                result['invalid'] += 1
-                continue
-
-            # Check if subscriber exists
-            subscriber_exists = Subscriber.objects.filter(email=email).exists()
-
-            # Jeśli subskrybent już istnieje i wybrano opcję pomijania
-            if subscriber_exists and duplicate_action == 'skip':
-                result['skipped'] += 1
-                continue
-
-            # Get or create based on duplicate action
-            if subscriber_exists:
-                subscriber = Subscriber.objects.get(email=email)
-                if duplicate_action == 'update':
-                    subscriber.newsletter_consent = newsletter_consent
-                    subscriber.save()
-                    result['updated'] += 1
-                else:
-                    result['skipped'] += 1
-            else:
-                subscriber = Subscriber.objects.create(
-                    email=email,
-                    newsletter_consent=newsletter_consent,
-                    created_by=self.request.user if hasattr(
-                        self.request, 'user') else None
-                )
-                result['imported'] += 1
-
-            # Add to groups
-            if groups:
-                subscriber.group_affiliation.add(*groups)
-
-            # Add to partners
-            if partners:
-                from apps.partner.models import PartnerEmail
-                for partner in partners:
-                    PartnerEmail.objects.get_or_create(
-                        partner=partner,
-                        subscriber=subscriber
-                    )
+class SubscriberImportJobStatusView(LoginRequiredMixin, View):
+    """Postęp zlecenia importu subskrybentów (JSON odpytywany przez stronę importu)"""
 
-        return result
+    def get(self, request, pk):
+        job = get_object_or_404(SubscriberImportJob, pk=pk)
+        return JsonResponse(SubscriberImportJobService.get_progress(job))